@@ -0,0 +1,100 @@
+"""
+断句对齐基准
+
+生成一份字级时间戳的模拟转录（默认 60 分钟、每分钟 150 词），按 split_by_sentences 的方式
+分成约 500 词的批次，并按真实句子边界构造 LLM 断句结果，分别用词元对齐和旧的滑动窗口
+把句子映射回分段，报告耗时、加速比以及与真实边界一致的句子比例。
+
+用法:
+    python benchmarks/bench_alignment.py [--minutes 60] [--seed 0]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# SubtitleConfig 在创建时校验 API 配置，基准不发请求，填入占位值即可
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1/v1")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from subtitle_processor.data import SubtitleData, SubtitleSegment  # noqa: E402
+from subtitle_processor.spliter import (  # noqa: E402
+    merge_by_sliding_window, merge_segments_based_on_sentences, split_by_sentences
+)
+from utils.logger import setup_logger  # noqa: E402
+
+VOCAB = (
+    "the a to of and in that is it you we this for on with be are have not but they so what can do "
+    "just like about machine learning model data network python really important going think"
+).split()
+WORDS_PER_MINUTE = 150
+
+
+def make_transcript(minutes, rng):
+    """返回 (字级分段, 句子列表, 每个句子的真实时间区间)"""
+    segments = []
+    sentences = []
+    truth = {}
+    t = 0
+    remaining = minutes * WORDS_PER_MINUTE
+    while remaining > 0:
+        length = min(rng.randint(4, 14), remaining)
+        words = [rng.choice(VOCAB) for _ in range(length)]
+        words[-1] += "."
+        start = t
+        for word in words:
+            # 一半的字级分段带前导空格，与常见 ASR 输出一致
+            segments.append(SubtitleSegment(f" {word}" if rng.random() < 0.5 else word, t, t + 300))
+            t += 400
+        sentence = " ".join(words).capitalize()
+        sentences.append(sentence)
+        truth[(start, t - 100)] = sentence
+        t += rng.choice([100, 100, 100, 2000])
+        remaining -= length
+    return segments, sentences, truth
+
+
+def batch_sentences(batch, sentences_by_start):
+    """取出起始时间落在批次中的真实句子，作为该批次的 LLM 断句结果"""
+    return [sentences_by_start[seg.start_time] for seg in batch if seg.start_time in sentences_by_start]
+
+
+def run(label, func, batches, truth):
+    start = time.perf_counter()
+    merged = []
+    for segments, sentences in batches:
+        merged.extend(func(segments, sentences))
+    elapsed = time.perf_counter() - start
+    correct = sum(1 for seg in merged if truth.get((seg.start_time, seg.end_time)) == seg.text)
+    print(f"{label:<10} {elapsed:>9.3f} s   与真实边界一致: {correct}/{len(truth)}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="断句对齐基准")
+    parser.add_argument("--minutes", type=int, default=60, help="模拟转录时长（分钟）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # 两种算法都会对未匹配句子打印警告，基准中只关心汇总结果
+    setup_logger("subtitle_spliter").disabled = True
+
+    rng = random.Random(args.seed)
+    segments, sentences, truth = make_transcript(args.minutes, rng)
+    sentences_by_start = {start: sentence for (start, _), sentence in truth.items()}
+    batches = [
+        (list(batch.segments), batch_sentences(batch, sentences_by_start))
+        for batch in split_by_sentences(SubtitleData(segments), word_threshold=500)
+    ]
+    print(f"转录时长 {args.minutes} 分钟: {len(segments)} 个字级分段, {len(sentences)} 句, {len(batches)} 个批次")
+
+    new = run("词元对齐", merge_segments_based_on_sentences, batches, truth)
+    old = run("滑动窗口", merge_by_sliding_window, batches, truth)
+    print(f"加速比: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
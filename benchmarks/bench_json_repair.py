@@ -0,0 +1,105 @@
+"""
+JSON 修复解析基准
+
+用 benchmarks/json_repair_corpus.jsonl 中损坏的批次响应（被截断、字符串中的引号未转义、
+多余的逗号、三引号或代码块包裹、记录之间缺少逗号，以及几种情况的组合；翻译和反思翻译
+两种格式）对比 JSONParser 的两条路径：
+- 逐字符扫描（文件输入使用的路径，也是快速扫描之前的实现）
+- 快速扫描（字符串正文、空白和数字用 str.find / 正则整段扫描）
+
+先检查两条路径对每条响应的解析结果和修复日志完全一致，再报告各类响应的耗时和加速比。
+
+用法:
+    python benchmarks/bench_json_repair.py [--rounds 20]
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.json_repair import JSONParser, clean_llm_response  # noqa: E402
+
+CORPUS_PATH = Path(__file__).parent / "json_repair_corpus.jsonl"
+
+
+def load_corpus(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parse(text, fast, logging=False):
+    parser = JSONParser(text, None, logging)
+    parser.fast_scan = fast
+    return parser.parse()
+
+
+def check_equivalence(entries):
+    """两条路径的结果和修复日志必须一致，返回不一致的条目"""
+    mismatches = []
+    for i, entry in enumerate(entries):
+        text = clean_llm_response(entry["reply"])
+        if parse(text, fast=False, logging=True) != parse(text, fast=True, logging=True):
+            mismatches.append((i, entry["kind"], entry["mode"]))
+    return mismatches
+
+
+def measure(texts, fast, rounds, repeat=3):
+    """解析 rounds 轮的耗时，取 repeat 次中最快的一次以减少干扰"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                parse(text, fast)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 修复解析基准")
+    parser.add_argument("--corpus", default=str(CORPUS_PATH), help="损坏响应语料（JSON Lines）")
+    parser.add_argument("--rounds", type=int, default=20, help="每条响应解析的轮数")
+    args = parser.parse_args()
+
+    entries = load_corpus(args.corpus)
+    total_chars = sum(len(entry["reply"]) for entry in entries)
+    print(f"语料: {len(entries)} 条响应, {total_chars / 1024:.0f} KB")
+
+    mismatches = check_equivalence(entries)
+    if mismatches:
+        for i, kind, mode in mismatches:
+            print(f"结果不一致: 第{i + 1}条 ({kind}, {mode})")
+        sys.exit(1)
+    print("两条路径的解析结果和修复日志一致")
+
+    # 按损坏类型、按响应格式分组，最后是全部响应
+    kinds = defaultdict(list)
+    modes = defaultdict(list)
+    for entry in entries:
+        text = clean_llm_response(entry["reply"])
+        kinds[entry["kind"]].append(text)
+        modes[entry["mode"]].append(text)
+    groups = {**kinds, **{f"mode:{mode}": texts for mode, texts in modes.items()}}
+    groups["全部"] = [text for texts in kinds.values() for text in texts]
+    # 预热，避免第一组的计时包含正则编译和内存分配
+    measure(groups["全部"], False, 1, repeat=1)
+    measure(groups["全部"], True, 1, repeat=1)
+
+    print(f"\n{'类别':<20} {'条数':>4} {'逐字符 ms/条':>12} {'快速 ms/条':>12} {'加速比':>8}")
+    for kind, texts in groups.items():
+        slow = measure(texts, False, args.rounds)
+        fast = measure(texts, True, args.rounds)
+        count = len(texts) * args.rounds
+        print(f"{kind:<20} {len(texts):>4} {slow / count * 1000:>12.2f} {fast / count * 1000:>12.2f} "
+              f"{slow / fast:>7.1f}x")
+        if kind == "全部":
+            chars = sum(len(text) for text in texts) * args.rounds
+            print(f"吞吐: 逐字符 {chars / slow / 1024 / 1024:.2f} MB/s, 快速 {chars / fast / 1024 / 1024:.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
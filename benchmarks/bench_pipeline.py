@@ -0,0 +1,168 @@
+"""
+端到端吞吐基准
+
+启动本地模拟服务（benchmarks/mock_server.py），生成固定随机种子的字幕语料，
+通过 translator.SubtitleTranslator.translate 完整处理每个文件（断句、总结、翻译、保存），
+报告每分钟处理文件数、各阶段请求数、重试数、注入的错误以及 p50/p95 耗时。
+
+用法:
+    python benchmarks/bench_pipeline.py --corpus mixed --files 6 --minutes 5 \\
+        --latency translate=lognormal:0.8:0.4 --rate-429 0.05 --thread-num 18 --batch-size 20
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mock_server import STAGES, add_server_arguments, percentile, server_from_args  # noqa: E402
+
+VOCAB = (
+    "the a to of and in that is it you we this for on with be are have not but they so what can do "
+    "just like about machine learning model data network python really important going think"
+).split()
+WORDS_PER_MINUTE = 150
+
+
+def _ts(ms: int) -> str:
+    hours, rest = divmod(ms, 3600000)
+    minutes, rest = divmod(rest, 60000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02}:{minutes:02}:{seconds:02},{millis:03}"
+
+
+def write_corpus_file(path: Path, minutes: int, word_level: bool, rng: random.Random) -> None:
+    """生成一份字幕文件：字级时间戳（每个词一条）或句子级（每条约 10 个词）"""
+    entries = []
+    t = 0
+    remaining = minutes * WORDS_PER_MINUTE
+    while remaining > 0:
+        length = min(rng.randint(6, 14), remaining)
+        words = [rng.choice(VOCAB) for _ in range(length)]
+        words[-1] += "."
+        if word_level:
+            for word in words:
+                entries.append((t, t + 300, word))
+                t += 400
+        else:
+            entries.append((t, t + length * 400, " ".join(words).capitalize()))
+            t += length * 400
+        t += rng.choice([100, 100, 600])
+        remaining -= length
+    with open(path, "w", encoding="utf-8") as f:
+        for index, (start, end, text) in enumerate(entries, 1):
+            f.write(f"{index}\n{_ts(start)} --> {_ts(end)}\n{text}\n\n")
+
+
+def build_corpus(directory: Path, corpus: str, files: int, minutes: int, seed: int):
+    rng = random.Random(seed)
+    paths = []
+    for index in range(files):
+        word_level = corpus == "words" or (corpus == "mixed" and index % 2 == 0)
+        path = directory / f"{corpus}_{index:02}.srt"
+        write_corpus_file(path, minutes, word_level, rng)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端吞吐基准（本地模拟服务）")
+    parser.add_argument("--corpus", choices=["sentences", "words", "mixed"], default="mixed",
+                        help="语料类型：句子级、字级或两者交替")
+    parser.add_argument("--files", type=int, default=4, help="文件数")
+    parser.add_argument("--minutes", type=int, default=5, help="每个文件的时长（分钟）")
+    parser.add_argument("--jobs", type=int, default=1, help="同时处理的文件数")
+    parser.add_argument("--thread-num", type=int, default=None, help="覆盖 thread_num")
+    parser.add_argument("--batch-size", type=int, default=None, help="覆盖 batch_size")
+    parser.add_argument("--reflect", action="store_true", help="使用反思翻译")
+    parser.add_argument("--verbose", action="store_true", help="显示处理日志")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args)
+    base_url = server.start()
+    workdir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+
+    # 配置在导入时读取环境变量，必须在导入 translator 之前设置
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "benchmark",
+        "LLM_MODEL": "mock-model",
+        "TRANSLATION_CACHE_PATH": str(workdir / "cache.db"),
+    })
+    if args.thread_num:
+        os.environ["LLM_THREAD_NUM"] = str(args.thread_num)
+    if args.batch_size:
+        os.environ["TRANSLATE_BATCH_SIZE"] = str(args.batch_size)
+
+    from captioner_translate import translator as translator_module
+    from subtitle_processor.llm_client import get_latency_stats
+
+    if not args.verbose:
+        for name in list(logging.root.manager.loggerDict):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    paths = build_corpus(workdir, args.corpus, args.files, args.minutes, args.seed)
+    translator = translator_module.SubtitleTranslator()
+    print(f"模拟服务: {base_url}  语料: {args.corpus} x {args.files} 个文件, 每个 {args.minutes} 分钟")
+    print(f"thread_num={translator.config.thread_num} batch_size={translator.config.batch_size} "
+          f"jobs={args.jobs} reflect={args.reflect}")
+
+    def translate_one(path: Path):
+        en, zh, _ = translator_module.get_output_paths(str(path))
+        start = time.perf_counter()
+        try:
+            translator.translate(str(path), en, zh, reflect=args.reflect, use_cache=False)
+            return path.name, time.perf_counter() - start, None
+        except Exception as e:
+            return path.name, time.perf_counter() - start, e
+
+    # 只统计翻译期间的请求（包括各文件的端点探测）
+    server.reset_stats()
+    wall_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(translate_one, paths))
+    finally:
+        wall = time.perf_counter() - wall_start
+        translator.close()
+        server.stop()
+
+    failed = [(name, error) for name, _, error in results if error is not None]
+    print()
+    for name, elapsed, error in results:
+        print(f"  {name:<20} {elapsed:>7.2f} s{'  失败: ' + str(error) if error else ''}")
+    done = len(results) - len(failed)
+    print(f"\n完成 {done}/{len(results)} 个文件, 总耗时 {wall:.2f} s, {done / wall * 60:.1f} 文件/分钟")
+
+    stats = server.stats()
+    print(f"\n{'阶段':<10}{'请求':>8}{'重试':>8}{'429':>6}{'5xx':>6}{'坏JSON':>8}{'p50(s)':>9}{'p95(s)':>9}")
+    totals = {"requests": 0, "retries": 0}
+    for stage in STAGES:
+        # 探测请求也计入，合计与客户端观测的请求数一致
+        if stage not in stats:
+            continue
+        data = stats[stage]
+        totals["requests"] += data["requests"]
+        totals["retries"] += data["retries"]
+        print(f"{stage:<10}{data['requests']:>8}{data['retries']:>8}{data['429']:>6}{data['5xx']:>6}"
+              f"{data['malformed']:>8}{percentile(data['latencies'], 0.5):>9.3f}{percentile(data['latencies'], 0.95):>9.3f}")
+    print(f"{'total':<10}{totals['requests']:>8}{totals['retries']:>8}")
+
+    client = get_latency_stats()
+    if client["count"]:
+        print(f"\n客户端观测的成功请求耗时: p50 {client['p50']:.3f}s, p95 {client['p95']:.3f}s "
+              f"({client['count']} 次)")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
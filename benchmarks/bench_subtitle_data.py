@@ -0,0 +1,159 @@
+"""
+SubtitleData 内存与耗时基准
+
+对比列式存储的 SubtitleData 与之前“对象列表 + 每次构造都过滤排序”的实现：
+- 构造 N 个字级字幕段的内存峰值与耗时
+- 切片分批，以及完整的 split_by_sentences（旧实现每个批次都会重新构造、过滤、排序）
+
+构造比旧实现稍慢（20 万段约多 20 ms，另有生成器逐个创建 SubtitleSegment 的开销）：
+旧实现只过滤一遍，列式还要生成三列并驻留短文本，换来更低的内存峰值和零复制的切片。
+
+用法:
+    python benchmarks/bench_subtitle_data.py [-n 200000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# SubtitleConfig 在创建时校验 API 配置，基准不发请求，填入占位值即可
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1/v1")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from subtitle_processor.data import SubtitleData, SubtitleSegment  # noqa: E402
+from subtitle_processor.spliter import count_words, preprocess_segments, split_by_sentences  # noqa: E402
+
+WORDS = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog,", "and", "runs", "away."]
+
+
+class LegacySegment:
+    """之前的字幕段：普通对象，每个实例带 __dict__"""
+    def __init__(self, text, start_time, end_time):
+        self.text = text
+        self.start_time = start_time
+        self.end_time = end_time
+
+
+class LegacyData:
+    """之前的容器：每次构造都过滤空文本并按开始时间重新排序"""
+    def __init__(self, segments):
+        filtered = [seg for seg in segments if seg.text and seg.text.strip()]
+        filtered.sort(key=lambda x: x.start_time)
+        self.segments = filtered
+
+
+def legacy_split_by_sentences(segments, word_threshold=500):
+    """之前的 split_by_sentences：按对象列表分组，每个批次重新构造 LegacyData（过滤、排序）"""
+    sentence_end_markers = ['.', '!', '?', '。', '！', '？', '…']
+    split_markers = [',', '，', ';', '；', '、']
+    segments = preprocess_segments(segments)
+
+    sentence_segments = []
+    current_sentence_segments = []
+    for seg in segments:
+        current_sentence_segments.append(seg)
+        text = seg.text.strip()
+        if any(text.endswith(marker) for marker in sentence_end_markers):
+            sentence_segments.append(current_sentence_segments)
+            current_sentence_segments = []
+    if current_sentence_segments:
+        sentence_segments.append(current_sentence_segments)
+
+    def split_long_sentence(sentence_segs):
+        result = []
+        temp_segs = []
+        temp_word_count = 0
+        for seg in sentence_segs:
+            seg_text = seg.text.strip()
+            seg_word_count = count_words(seg_text)
+            if (temp_word_count + seg_word_count > word_threshold and
+                    any(seg_text.endswith(marker) for marker in split_markers)):
+                if temp_segs:
+                    result.append(temp_segs)
+                    temp_segs = []
+                    temp_word_count = 0
+            temp_segs.append(seg)
+            temp_word_count += seg_word_count
+            if temp_word_count >= word_threshold * 1.2:
+                result.append(temp_segs)
+                temp_segs = []
+                temp_word_count = 0
+        if temp_segs:
+            result.append(temp_segs)
+        return result
+
+    batched_data = []
+    current_segments = []
+    current_word_count = 0
+    for sentence in sentence_segments:
+        sentence_word_count = count_words(" ".join([seg.text for seg in sentence]))
+        if sentence_word_count >= word_threshold:
+            if current_segments:
+                batched_data.append(LegacyData(current_segments))
+                current_segments = []
+                current_word_count = 0
+            for part in split_long_sentence(sentence):
+                batched_data.append(LegacyData(part))
+            continue
+        if current_word_count + sentence_word_count > word_threshold and current_segments:
+            batched_data.append(LegacyData(current_segments))
+            current_segments = []
+            current_word_count = 0
+        current_segments.extend(sentence)
+        current_word_count += sentence_word_count
+    if current_segments:
+        batched_data.append(LegacyData(current_segments))
+    return batched_data
+
+
+def make_rows(n):
+    # 逐个拼接生成字符串，模拟解析文件时每个字幕段都是独立的字符串对象
+    return [("".join(WORDS[i % len(WORDS)]), i * 300, i * 300 + 250) for i in range(n)]
+
+
+def measure(label, func):
+    # 耗时单独测量：tracemalloc 跟踪每次分配，会让分配多的实现慢上数倍
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<36} {elapsed * 1000:>9.1f} ms   峰值 {peak / 1024 / 1024:>8.1f} MB")
+    return result
+
+
+def legacy_batches(data, batch_size):
+    # 旧实现中 split_by_sentences 对每个批次调用 SubtitleData(current_segments)
+    segments = data.segments
+    return [LegacyData(segments[i:i + batch_size]) for i in range(0, len(segments), batch_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SubtitleData 基准")
+    parser.add_argument("-n", type=int, default=200000, help="字幕段数量")
+    args = parser.parse_args()
+
+    rows = make_rows(args.n)
+    print(f"字幕段数量: {args.n}")
+
+    legacy = measure("旧实现: 构造", lambda: LegacyData([LegacySegment(*r) for r in rows]))
+    data = measure("列式: 构造", lambda: SubtitleData(SubtitleSegment(*r) for r in rows))
+
+    # 每个批次约 50 个句子，与 500 词阈值下的字级输入相当
+    batch_size = 500
+    measure("旧实现: 分批（每批重新过滤排序）", lambda: legacy_batches(legacy, batch_size))
+    measure("列式: 切片视图分批", lambda: [data[i:i + batch_size] for i in range(0, len(data), batch_size)])
+    legacy_batches_ = measure("旧实现: split_by_sentences",
+                              lambda: legacy_split_by_sentences(legacy.segments, word_threshold=500))
+    batches = measure("列式: split_by_sentences", lambda: split_by_sentences(data, word_threshold=500))
+    assert [len(batch) for batch in batches] == [len(batch.segments) for batch in legacy_batches_]
+    print(f"split_by_sentences 批次数: {len(batches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+本地模拟的 OpenAI 兼容服务
+
+实现 POST /chat/completions（以及 GET /models），根据提示词识别请求所属阶段并返回固定格式的回答：
+- split: 把用户文本按词数切分，用 <br> 连接
+- summary: 固定的摘要文本
+- translate / reflect: 解析 <input_subtitle> 中的字幕字典，返回对应结构的 JSON
+- single: 单行翻译
+- probe: 启动时的连通性测试
+
+可按阶段配置延迟分布，并按比例注入 429、5xx 和不完整的 JSON。
+服务端按阶段统计请求数、重试数（请求体与之前的某次请求完全相同）、注入的错误和处理耗时。
+
+单独运行:
+    python benchmarks/mock_server.py --port 8765 --latency translate=lognormal:1.0:0.4 --rate-429 0.05
+"""
+import argparse
+import ast
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+STAGES = ("probe", "split", "summary", "translate", "reflect", "single", "other")
+
+
+class LatencyDistribution:
+    """
+    延迟分布，规格字符串格式:
+        fixed:秒 | uniform:最小:最大 | lognormal:中位数:sigma | exp:均值
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "lognormal", "exp"):
+            raise ValueError(f"未知的延迟分布: {spec}")
+        self.spec = spec
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(self.params[0], self.params[1])
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(self.params[0]), self.params[1])
+        return rng.expovariate(1 / self.params[0])
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def classify(messages: List[Dict]) -> str:
+    """根据系统提示词和用户消息判断请求阶段"""
+    system = messages[0].get("content", "") if messages else ""
+    user = messages[-1].get("content", "") if messages else ""
+    if "<input_subtitle>" in user:
+        return "reflect" if "revise_suggestions" in system else "translate"
+    if "segmentation expert" in system:
+        return "split"
+    if "video analyst" in system or "subtitle summarizer" in system:
+        return "summary"
+    if "Return the translation result directly" in system:
+        return "single"
+    if system == "You are a helpful assistant.":
+        return "probe"
+    return "other"
+
+
+def canned_answer(stage: str, messages: List[Dict]) -> str:
+    """为各阶段生成格式正确的回答"""
+    system = messages[0].get("content", "")
+    user = messages[-1].get("content", "")
+    if stage == "split":
+        text = user.split("\n", 1)[1] if "\n" in user else user
+        match = re.search(r"maximum (\d+) words", system)
+        limit = max(3, int(match.group(1)) - 4) if match else 10
+        words = text.split()
+        return "<br>".join(" ".join(words[i:i + limit]) for i in range(0, len(words), limit))
+    if stage == "summary":
+        return "This is a mock summary of the video content for benchmarking."
+    if stage in ("translate", "reflect"):
+        subtitles = ast.literal_eval(re.search(r"<input_subtitle>(.*?)</input_subtitle>", user, re.S).group(1))
+        result = {}
+        for key, text in subtitles.items():
+            item = {"optimized_subtitle": text, "translation": f"译:{text}"}
+            if stage == "reflect":
+                item["revise_suggestions"] = "ok"
+                item["revised_translation"] = f"改:{text}"
+            result[key] = item
+        return json.dumps(result, ensure_ascii=False)
+    if stage == "single":
+        return f"译:{user}"
+    return "Hello! How can I help you today?"
+
+
+class MockLLMServer:
+    """在后台线程中运行的模拟服务"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: Optional[Dict[str, str]] = None,
+                 rate_429: float = 0.0, rate_5xx: float = 0.0, rate_malformed: float = 0.0,
+                 retry_after: float = 1.0, seed: Optional[int] = None):
+        """
+        Args:
+            latency: 阶段 -> 延迟分布规格，键 "default" 用于未指定的阶段
+            rate_429: 返回 429 的比例
+            rate_5xx: 返回 503 的比例
+            rate_malformed: translate/reflect 阶段返回被截断 JSON 的比例
+            retry_after: 429 响应中的 Retry-After 秒数
+        """
+        latency = latency or {}
+        default = LatencyDistribution(latency.get("default", "fixed:0.05"))
+        self.latency = {stage: LatencyDistribution(latency[stage]) if stage in latency else default
+                        for stage in STAGES}
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.rate_malformed = rate_malformed
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._seen = set()
+            self._stats = defaultdict(lambda: {"requests": 0, "retries": 0, "429": 0, "5xx": 0,
+                                               "malformed": 0, "latencies": []})
+
+    def stats(self) -> Dict[str, Dict]:
+        """按阶段返回统计，latencies 为服务端处理耗时（秒）"""
+        with self._lock:
+            return {stage: {**data, "latencies": list(data["latencies"])}
+                    for stage, data in self._stats.items()}
+
+    def _decide(self, stage: str, body_hash: str):
+        """在锁内记录请求并决定本次的延迟和注入的故障"""
+        with self._lock:
+            stats = self._stats[stage]
+            stats["requests"] += 1
+            # 每个文件的探测请求内容相同，不算重试
+            if body_hash in self._seen and stage != "probe":
+                stats["retries"] += 1
+            self._seen.add(body_hash)
+            delay = self.latency[stage].sample(self._rng)
+            roll = self._rng.random()
+            fault = None
+            if stage != "probe":
+                if roll < self.rate_429:
+                    fault = "429"
+                elif roll < self.rate_429 + self.rate_5xx:
+                    fault = "5xx"
+                elif stage in ("translate", "reflect") and roll < self.rate_429 + self.rate_5xx + self.rate_malformed:
+                    fault = "malformed"
+            if fault:
+                stats[fault] += 1
+            return delay, fault
+
+    def _record_latency(self, stage: str, latency: float) -> None:
+        with self._lock:
+            self._stats[stage]["latencies"].append(latency)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._send(200, {"object": "list", "data": []})
+
+            def do_POST(self):
+                started = time.monotonic()
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "not found"}})
+                    return
+                body = json.loads(raw)
+                messages = body.get("messages", [])
+                stage = classify(messages)
+                body_hash = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+                delay, fault = server._decide(stage, body_hash)
+                time.sleep(delay)
+
+                if fault == "429":
+                    self._send(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                               {"Retry-After": str(server.retry_after)})
+                elif fault == "5xx":
+                    self._send(503, {"error": {"message": "Service temporarily unavailable"}})
+                else:
+                    content = canned_answer(stage, messages)
+                    if fault == "malformed":
+                        content = content[:max(1, int(len(content) * 0.6))]
+                    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+                    completion_tokens = len(content) // 4
+                    self._send(200, {
+                        "id": "chatcmpl-mock",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "mock"),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                  "total_tokens": prompt_tokens + completion_tokens},
+                    })
+                server._record_latency(stage, time.monotonic() - started)
+
+        return Handler
+
+
+def parse_latency_args(values: List[str]) -> Dict[str, str]:
+    """解析 阶段=规格 形式的参数，不带阶段名时作为默认分布"""
+    latency = {}
+    for value in values or []:
+        stage, sep, spec = value.partition("=")
+        if sep:
+            latency[stage] = spec
+        else:
+            latency["default"] = value
+    return latency
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", action="append", metavar="[STAGE=]SPEC",
+                        help="延迟分布，例如 fixed:0.05、translate=lognormal:1.0:0.4，可重复")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="返回 503 的比例")
+    parser.add_argument("--rate-malformed", type=float, default=0.0, help="翻译请求返回不完整 JSON 的比例")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After 秒数")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def server_from_args(args: argparse.Namespace, port: int = 0) -> MockLLMServer:
+    return MockLLMServer(port=port, latency=parse_latency_args(args.latency),
+                         rate_429=args.rate_429, rate_5xx=args.rate_5xx,
+                         rate_malformed=args.rate_malformed, retry_after=args.retry_after,
+                         seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容服务")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = server_from_args(args, port=args.port)
+    print(f"模拟服务地址: {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
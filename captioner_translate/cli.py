@@ -49,6 +49,22 @@ def main(
         Optional[Path],
         typer.Option("--project-root", help="Path to Captioner_Translate project root")
     ] = None,
+    in_process: Annotated[
+        bool,
+        typer.Option("--in-process", help="Translate all files in this process, reusing clients and thread pools")
+    ] = False,
+    no_cache: Annotated[
+        bool,
+        typer.Option("--no-cache", help="Bypass the persistent translation cache")
+    ] = False,
+    trace: Annotated[
+        Optional[Path],
+        typer.Option("--trace", help="Write a Chrome trace-event timeline to this JSON file (implies --in-process)")
+    ] = None,
+    jobs: Annotated[
+        int,
+        typer.Option("-j", "--jobs", min=1, help="Number of files to translate concurrently (implies --in-process)")
+    ] = 1,
     show_version: Annotated[
         Optional[bool],
         typer.Option("--version", "-v", callback=version_callback, help="Show version and exit")
@@ -77,6 +93,12 @@ def main(
         # Use specific model and enable debug
         uv run translate -m gpt-4 -d
 
+        # Process all files in one long-lived process
+        uv run translate --in-process
+
+        # Translate 4 files at a time, sharing one LLM request limit
+        uv run translate -j 4
+
         # Translate with all options
         uv run translate -r -m gpt-4o -d
     """
@@ -85,6 +107,11 @@ def main(
     if debug:
         os.environ['DEBUG'] = 'true'
 
+    # Concurrent files share one in-process translator and its request limit;
+    # tracing records spans from the library calls, so it also needs in-process mode
+    if jobs > 1 or trace:
+        in_process = True
+
     # Use current working directory
     directory = Path.cwd()
 
@@ -96,10 +123,13 @@ def main(
         translator_args.extend(["-m", llm_model])
     if debug:
         translator_args.extend(["-d", "--debug"])
+    if no_cache:
+        translator_args.append("--no-cache")
 
+    translator = None
     try:
         # Initialize translator
-        translator = SubtitleTranslator(project_root=project_root)
+        translator = SubtitleTranslator(project_root=project_root, in_process=in_process, trace_path=trace)
 
         # Discover subtitle files in current directory
         files = translator.discover_files(directory)
@@ -124,6 +154,14 @@ def main(
             startup_info.append(f"🤖 Model: {llm_model}\n", style="magenta")
         if debug:
             startup_info.append("🐛 Debug mode: enabled\n", style="red")
+        if in_process:
+            startup_info.append("⚡ In-process mode: enabled\n", style="green")
+        if no_cache:
+            startup_info.append("🚫 Translation cache: bypassed\n", style="yellow")
+        if jobs > 1:
+            startup_info.append(f"🧵 Concurrent files: {jobs}\n", style="green")
+        if trace:
+            startup_info.append(f"⏱️  Trace: {trace}\n", style="green")
 
         console.print(Panel(startup_info, title="Configuration", border_style="blue"))
 
@@ -143,7 +181,8 @@ def main(
         processed_count = translator.translate_directory(
             directory=directory,
             max_count=-1,  # Process all files
-            translator_args=translator_args
+            translator_args=translator_args,
+            jobs=jobs
         )
         
         # Show completion summary
@@ -172,6 +211,9 @@ def main(
             import traceback
             console.print(traceback.format_exc())
         raise typer.Exit(1)
+    finally:
+        if translator is not None:
+            translator.close()
 
 
 
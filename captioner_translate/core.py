@@ -5,6 +5,8 @@ Core translation logic converted from the shell script.
 import os
 import sys
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Optional, Tuple
 import glob
@@ -23,22 +25,37 @@ class TranslationError(Exception):
 class SubtitleTranslator:
     """Main class that handles the subtitle translation workflow"""
     
-    def __init__(self, project_root: Optional[Path] = None):
+    def __init__(self, project_root: Optional[Path] = None, in_process: bool = False,
+                 trace_path: Optional[Path] = None):
         """
         Initialize the translator
         
         Args:
             project_root: Path to the Captioner_Translate project root
+            in_process: Run translation and ASS generation as library calls in this
+                process instead of spawning a subprocess per file
+            trace_path: Write a Chrome trace-event timeline of the run to this file
+                on close (in-process mode only)
         """
         if project_root is None:
             # Try to find the project root
             project_root = self._find_project_root()
         
         self.project_root = Path(project_root)
-        self.use_uv = self._check_uv_availability()
+        self.in_process = in_process
+        self.trace_path = trace_path
+        self.use_uv = False if in_process else self._check_uv_availability()
         
         if not self.project_root.exists():
             raise TranslationError(f"Project root not found: {self.project_root}")
+
+        # Lazily created library objects for in-process mode, shared by all files
+        self._translator_module = None
+        self._inprocess_translator = None
+        self._merge_srt_to_ass = None
+        self._tracing = None
+        # (file, seconds) wall time of every translated file
+        self.file_timings: List[Tuple[str, float]] = []
     
     def _find_project_root(self) -> Path:
         """Find the Captioner_Translate project root"""
@@ -224,7 +241,77 @@ class SubtitleTranslator:
             True if successful, False otherwise
         """
         args = [str(input_file)] + translator_args
-        return self.run_python_script("captioner_translate/translator.py", args)
+        start = time.perf_counter()
+        if self.in_process:
+            success = self._translate_in_process(args)
+        else:
+            success = self.run_python_script("captioner_translate/translator.py", args)
+        elapsed = time.perf_counter() - start
+        self.file_timings.append((Path(input_file).name, elapsed))
+        console.print(f"[dim]INFO: {Path(input_file).name} took {elapsed:.1f}s[/dim]")
+        return success
+
+    def _load_in_process_modules(self) -> None:
+        """Import the translator and ASS converter once and keep them for all files"""
+        if self._inprocess_translator is not None:
+            return
+
+        # The processing packages live in the project root, next to captioner_translate
+        root = str(self.project_root)
+        if root not in sys.path:
+            sys.path.insert(0, root)
+
+        # The config reads the environment at import time, so load .env first
+        import dotenv
+        dotenv.load_dotenv(self.project_root / ".env")
+
+        from . import translator as translator_module
+        from utils.srt2ass import merge_srt_to_ass
+        from utils import tracing
+
+        if self.trace_path:
+            tracing.enable_tracing()
+        self._tracing = tracing
+        self._translator_module = translator_module
+        self._inprocess_translator = translator_module.SubtitleTranslator()
+        self._merge_srt_to_ass = merge_srt_to_ass
+
+    def _translate_in_process(self, args: List[str]) -> bool:
+        """Translate one file with the shared in-process translator"""
+        try:
+            self._load_in_process_modules()
+            parsed_args = self._translator_module.build_arg_parser().parse_args(args)
+            self._translator_module.run(self._inprocess_translator, parsed_args)
+            return True
+        except SystemExit as e:
+            # argparse reports bad arguments through SystemExit
+            console.print(f"[red]Invalid translator arguments: {args} ({e})[/red]")
+            return False
+        except Exception as e:
+            console.print(f"[red]Exception translating {args[0]}: {e}[/red]")
+            return False
+
+    def close(self) -> None:
+        """Release resources held by the in-process translator"""
+        if self._inprocess_translator is not None:
+            self._inprocess_translator.close()
+            self._inprocess_translator = None
+        if self.trace_path and self._tracing is not None:
+            self._tracing.save_trace(str(self.trace_path))
+            console.print(f"[blue]Trace written to {self.trace_path} (open in https://ui.perfetto.dev)[/blue]")
+
+    def print_timing_summary(self, wall_time: Optional[float] = None) -> None:
+        """Print per-file wall time collected during this run"""
+        if not self.file_timings:
+            return
+        total = sum(elapsed for _, elapsed in self.file_timings)
+        console.print(
+            f"[blue]Per-file translation time: {total:.1f}s for {len(self.file_timings)} files "
+            f"(avg {total / len(self.file_timings):.1f}s per file, "
+            f"{'in-process' if self.in_process else 'subprocess'} mode)[/blue]"
+        )
+        if wall_time is not None:
+            console.print(f"[blue]Total wall time: {wall_time:.1f}s[/blue]")
     
     def generate_ass_file(self, base_name: str, directory: Path) -> bool:
         """
@@ -246,12 +333,19 @@ class SubtitleTranslator:
             return False
         
         # Prepare arguments for srt2ass.py
-        if self.use_uv:
-            args = [str(zh_file), str(en_file)]
+        args = [str(zh_file), str(en_file)]
+
+        if self.in_process:
+            try:
+                self._load_in_process_modules()
+                with self._tracing.span("srt2ass", cat="io", file=ass_file.name):
+                    self._merge_srt_to_ass(*args)
+                success = True
+            except Exception as e:
+                console.print(f"[red]Exception generating {ass_file.name}: {e}[/red]")
+                success = False
         else:
-            args = [str(zh_file), str(en_file)]
-        
-        success = self.run_python_script("utils/srt2ass.py", args, cwd=directory)
+            success = self.run_python_script("utils/srt2ass.py", args, cwd=directory)
         
         if success and ass_file.exists():
             console.print(f"[green]INFO: {base_name}.ass done.[/green]")
@@ -265,7 +359,8 @@ class SubtitleTranslator:
         
         return False
 
-    def translate_directory(self, directory: Path, max_count: int = -1, translator_args: Optional[List[str]] = None) -> int:
+    def translate_directory(self, directory: Path, max_count: int = -1, translator_args: Optional[List[str]] = None,
+                            jobs: int = 1) -> int:
         """
         Translate all subtitle files in a directory
 
@@ -273,6 +368,7 @@ class SubtitleTranslator:
             directory: Directory containing subtitle files
             max_count: Maximum number of files to process (-1 for unlimited)
             translator_args: Additional arguments for the translator
+            jobs: Number of files translated at the same time (requires in-process mode)
 
         Returns:
             Number of files processed
@@ -284,80 +380,157 @@ class SubtitleTranslator:
         if not directory.exists():
             raise TranslationError(f"Directory not found: {directory}")
 
+        if jobs > 1 and not self.in_process:
+            raise TranslationError("Concurrent file processing (--jobs) requires in-process mode")
+
         # Discover files to process
         files = self.discover_files(directory)
         if not files:
             return 0
 
         console.print("[blue]Translation starting...[/blue]")
-
-        if self.use_uv:
-            console.print("[green]Using uv for Python execution...[/green]")
-        else:
-            console.print("[green]Using virtual environment for Python execution...[/green]")
-
-        processed_count = 0
+        self._print_execution_mode()
+        start = time.perf_counter()
 
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             console=console,
         ) as progress:
+            if jobs > 1:
+                processed_count = self._translate_files_concurrently(
+                    files, directory, max_count, translator_args, jobs, progress
+                )
+            else:
+                processed_count = self._translate_files_sequentially(
+                    files, directory, max_count, translator_args, progress
+                )
 
-            for file_base in files:
-                # Check if we've reached the limit
-                if max_count != -1 and processed_count >= max_count:
-                    console.print(f"[yellow]Reached maximum execution limit ({max_count})[/yellow]")
-                    break
-
-                task = progress.add_task(f"Processing {file_base}...", total=None)
-
-                # Check if file should be skipped
-                should_skip, reason = self.should_skip_file(file_base, directory)
-
-                if should_skip:
-                    console.print(f"[yellow]INFO: {reason}[/yellow]")
-                    progress.remove_task(task)
-                    continue
-
-                # Handle case where both zh and en exist - generate ass directly
-                if reason == "ready_for_ass_generation":
-                    progress.update(task, description=f"Generating ASS for {file_base}...")
-                    self.generate_ass_file(file_base, directory)
-                    progress.remove_task(task)
-                    continue
-
-                # Determine input file for translation
-                input_file = self.determine_input_file(file_base, directory)
-                if input_file is None:
-                    progress.remove_task(task)
-                    continue
-
-                # Perform translation
-                progress.update(task, description=f"Translating {file_base}...")
-                console.print(f"\n[bold blue]=================== Translating {file_base} ===================[/bold blue]\n")
-
-                success = self.translate_file(input_file, translator_args)
-                if not success:
-                    console.print(f"[red]Failed to translate {file_base}[/red]")
-                    progress.remove_task(task)
-                    continue
+        self.print_timing_summary(time.perf_counter() - start)
+        console.print(f"[green]Translation completed. Processed {processed_count} files.[/green]")
+        return processed_count
 
-                processed_count += 1
+    def _translate_files_sequentially(self, files: List[str], directory: Path, max_count: int,
+                                      translator_args: List[str], progress: Progress) -> int:
+        """Translate files one after another in discovery order"""
+        processed_count = 0
 
-                # Generate ASS file if both zh and en now exist
-                progress.update(task, description=f"Generating ASS for {file_base}...")
-                zh_file = directory / f"{file_base}_zh.srt"
-                en_file = directory / f"{file_base}_en.srt"
+        for file_base in files:
+            # Check if we've reached the limit
+            if max_count != -1 and processed_count >= max_count:
+                console.print(f"[yellow]Reached maximum execution limit ({max_count})[/yellow]")
+                break
+
+            task = progress.add_task(f"Processing {file_base}...", total=None)
 
-                if zh_file.exists() and en_file.exists():
-                    self.generate_ass_file(file_base, directory)
+            # Check if file should be skipped
+            should_skip, reason = self.should_skip_file(file_base, directory)
 
+            if should_skip:
+                console.print(f"[yellow]INFO: {reason}[/yellow]")
                 progress.remove_task(task)
+                continue
+
+            # Handle case where both zh and en exist - generate ass directly
+            if reason == "ready_for_ass_generation":
+                progress.update(task, description=f"Generating ASS for {file_base}...")
+                self.generate_ass_file(file_base, directory)
+                progress.remove_task(task)
+                continue
+
+            # Determine input file for translation
+            input_file = self.determine_input_file(file_base, directory)
+            if input_file is None:
+                progress.remove_task(task)
+                continue
+
+            if self._translate_and_generate_ass(file_base, input_file, directory, translator_args, progress, task):
+                processed_count += 1
+
+        return processed_count
+
+    def _translate_files_concurrently(self, files: List[str], directory: Path, max_count: int,
+                                      translator_args: List[str], jobs: int, progress: Progress) -> int:
+        """
+        Translate several files at once. All files share the in-process translator, so
+        their LLM requests draw from one global concurrency limit. Short files are
+        scheduled first so that long files do not hold back the rest of the queue.
+        """
+        pending = []
+        for file_base in files:
+            should_skip, reason = self.should_skip_file(file_base, directory)
+
+            if should_skip:
+                console.print(f"[yellow]INFO: {reason}[/yellow]")
+                continue
+
+            if reason == "ready_for_ass_generation":
+                self.generate_ass_file(file_base, directory)
+                continue
+
+            input_file = self.determine_input_file(file_base, directory)
+            if input_file is not None:
+                pending.append((file_base, input_file))
+
+        if max_count != -1 and len(pending) > max_count:
+            console.print(f"[yellow]Reached maximum execution limit ({max_count})[/yellow]")
+            pending = pending[:max_count]
+
+        # Shortest files first: their tails overlap with the bulk of the long files
+        pending.sort(key=lambda item: item[1].stat().st_size)
+
+        # Load the shared translator once before the workers start using it
+        self._load_in_process_modules()
+
+        processed_count = 0
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = []
+            for file_base, input_file in pending:
+                task = progress.add_task(f"Queued {file_base}...", total=None)
+                futures.append(executor.submit(
+                    self._translate_and_generate_ass,
+                    file_base, input_file, directory, translator_args, progress, task
+                ))
+
+            for future in as_completed(futures):
+                if future.result():
+                    processed_count += 1
 
-        console.print(f"[green]Translation completed. Processed {processed_count} files.[/green]")
         return processed_count
 
+    def _translate_and_generate_ass(self, file_base: str, input_file: Path, directory: Path,
+                                    translator_args: List[str], progress: Progress, task) -> bool:
+        """Translate one file and build its ASS output; returns True if translation succeeded"""
+        # Perform translation
+        progress.update(task, description=f"Translating {file_base}...")
+        console.print(f"\n[bold blue]=================== Translating {file_base} ===================[/bold blue]\n")
+
+        success = self.translate_file(input_file, translator_args)
+        if not success:
+            console.print(f"[red]Failed to translate {file_base}[/red]")
+            progress.remove_task(task)
+            return False
+
+        # Generate ASS file if both zh and en now exist
+        progress.update(task, description=f"Generating ASS for {file_base}...")
+        zh_file = directory / f"{file_base}_zh.srt"
+        en_file = directory / f"{file_base}_en.srt"
+
+        if zh_file.exists() and en_file.exists():
+            self.generate_ass_file(file_base, directory)
+
+        progress.remove_task(task)
+        return True
+
+    def _print_execution_mode(self) -> None:
+        """Tell the user how the translator is going to be executed"""
+        if self.in_process:
+            console.print("[green]Running translation in-process...[/green]")
+        elif self.use_uv:
+            console.print("[green]Using uv for Python execution...[/green]")
+        else:
+            console.print("[green]Using virtual environment for Python execution...[/green]")
+
     def translate_single_file(self, file_path: Path, translator_args: Optional[List[str]] = None) -> int:
         """
         Translate a single subtitle file
@@ -389,11 +562,8 @@ class SubtitleTranslator:
             base_name = base_name[:-3]
 
         console.print("[blue]Translation starting...[/blue]")
-
-        if self.use_uv:
-            console.print("[green]Using uv for Python execution...[/green]")
-        else:
-            console.print("[green]Using virtual environment for Python execution...[/green]")
+        self._print_execution_mode()
+        start = time.perf_counter()
 
         with Progress(
             SpinnerColumn(),
@@ -438,5 +608,6 @@ class SubtitleTranslator:
 
             progress.remove_task(task)
 
+        self.print_timing_summary(time.perf_counter() - start)
         console.print(f"[green]Translation completed. Processed 1 file.[/green]")
         return 1
@@ -6,17 +6,34 @@ import dotenv
 dotenv.load_dotenv()
 
 import argparse
+import dataclasses
 import os
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from subtitle_processor.optimizer import SubtitleOptimizer
+from subtitle_processor.batch_budget import BatchBudget
 from subtitle_processor.summarizer import SubtitleSummarizer
-from subtitle_processor.spliter import merge_segments
-from subtitle_processor.config import get_default_config
+from subtitle_processor.spliter import iter_merge_segments, merge_segments
+from subtitle_processor.config import SubtitleConfig, get_default_config
 from subtitle_processor.data import load_subtitle, SubtitleData
+from subtitle_processor.llm_client import (
+    configure_rate_limiter, enable_async_engine, get_client, close_clients, get_latency_stats,
+    observe_next_request, warm_up
+)
+from subtitle_processor.cache import TranslationCache
+from subtitle_processor.journal import BatchJournal, journal_path_for
+from subtitle_processor.retry_policy import configure_retry_policy, get_retry_policy
+from subtitle_processor.probe import (
+    ProbeCache, ProbeResult, check_json_mode, error_message, result_from_request, send_probe_request
+)
+from subtitle_processor.usage_ledger import file_scope, get_ledger, propagate
 from utils.test_opanai import test_openai
+from utils import tracing
 from utils.logger import setup_logger
 
 class OpenAIAPIError(Exception):
@@ -33,11 +50,72 @@ logger = setup_logger("subtitle_translator_cli")
 class SubtitleTranslator:
     def __init__(self):
         self.config = get_default_config()
-        self.summarizer = SubtitleSummarizer(config=self.config)
+        # 所有文件和阶段共享同一个LLM限流器，并发从 thread_num 起步，按服务端反馈自适应调整
+        max_concurrency = max(self.config.max_concurrency, self.config.thread_num)
+        configure_rate_limiter(
+            max_concurrency,
+            initial_concurrency=self.config.thread_num,
+            requests_per_minute=self.config.requests_per_minute,
+            tokens_per_minute=self.config.tokens_per_minute
+        )
+        # 所有LLM请求共享同一个重试策略，重试预算按本次运行计算
+        configure_retry_policy(self.config.retry_attempts, self.config.retry_budget)
+        if self.config.async_engine:
+            enable_async_engine(True)
+        # 客户端（连接池按并发上限配置）与线程池在多个文件之间复用，由 close() 统一释放
+        self.client = get_client(self.config)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        # 翻译批次的 token 预算在多个文件之间共享，按整个运行中观测到的截断和失败调整
+        self.batch_budget = None
+        if self.config.batch_token_budget > 0:
+            self.batch_budget = BatchBudget(self.config.batch_token_budget)
+        self.cache = None
+        if self.config.cache_enabled:
+            self.cache = TranslationCache(
+                path=self.config.cache_path or None,
+                max_bytes=self.config.cache_max_mb * 1024 * 1024
+            )
+        # 摘要也缓存在翻译缓存中，重新运行时摘要不变，批次缓存键才能命中
+        self.summarizer = SubtitleSummarizer(config=self.config, client=self.client, cache=self.cache)
+        # 端点探测结果缓存在翻译缓存旁边，有效期内不再对每个文件做连通性测试
+        probe_path = Path(self.config.cache_path).with_name("endpoint_probe.json") if self.config.cache_path else None
+        self.probe_cache = ProbeCache(path=probe_path, ttl=self.config.probe_ttl)
+        # 本进程内已确认可用的端点
+        self._probes: Dict[str, ProbeResult] = {}
+        self._probe_lock = threading.Lock()
+
+    def close(self) -> None:
+        """释放复用的线程池、异步引擎和客户端连接池"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self.config.async_engine:
+            enable_async_engine(False)
+        stats = get_latency_stats()
+        if stats["count"]:
+            logger.info(
+                f"LLM请求耗时: {stats['count']} 次, 平均 {stats['mean']:.2f}s, "
+                f"p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s, {get_retry_policy().describe()}"
+            )
+        self._report_usage()
+        close_clients()
+
+    def _report_usage(self, input_file: Optional[str] = None) -> None:
+        """输出LLM用量报告（指定文件时只统计该文件），并把新记录追加到用量账本"""
+        ledger = get_ledger()
+        records = ledger.records(input_file)
+        # 只处理了一个文件时，运行汇总与该文件的报告相同，不再重复输出
+        if input_file or len({r.file for r in records}) > 1:
+            title = Path(input_file).name if input_file else "本次运行"
+            report = ledger.format_report(input_file, self.config.price_input_per_mtok,
+                                          self.config.price_output_per_mtok)
+            logger.info(f"LLM用量（{title}）:\n{report}")
+        if self.config.usage_ledger_path:
+            ledger.flush(self.config.usage_ledger_path)
 
     def translate(self, input_file: str, en_output: str, zh_output: str, 
                  llm_model: str = None, reflect: bool = False, 
-                 save_split: Optional[str] = None) -> None:
+                 save_split: Optional[str] = None, use_cache: bool = True) -> None:
         """翻译字幕文件
         
         Args:
@@ -47,122 +125,359 @@ class SubtitleTranslator:
             llm_model: 使用的语言模型
             reflect: 是否启用反思翻译
             save_split: 保存断句结果的文件路径
+            use_cache: 是否使用批次翻译缓存
         """
         try:
-            logger.info("字幕处理任务开始...")     
-            # 初始化翻译环境
-            self._init_translation_env(llm_model)
+            with file_scope(input_file), tracing.span("translate_file", cat="pipeline", file=Path(input_file).name):
+                logger.info("字幕处理任务开始...")     
+                # 本文件使用的配置，--jobs 并发处理时不修改其他文件共享的配置
+                config = self._file_config(llm_model)
+                # 初始化翻译环境，连接预热与字幕解析并行
+                probe = self._init_translation_env(config)
             
-            # 加载字幕文件
-            asr_data = load_subtitle(input_file)
-            logger.debug(f"字幕内容: {asr_data.to_txt()[:100]}...")  
+                # 断点日志：记录已完成的断句和翻译批次，中断后重新运行只处理剩余批次
+                journal = BatchJournal(journal_path_for(input_file))
+
+                # 加载字幕文件
+                with tracing.span("load_subtitle", cat="io"):
+                    asr_data = load_subtitle(input_file)
+                get_ledger().set_media_duration(
+                    input_file, max((seg.end_time for seg in asr_data.segments), default=0) / 1000
+                )
+                logger.debug(f"字幕内容: {asr_data.to_txt()[:100]}...")  
             
-            # 检查是否需要重新断句
-            if asr_data.is_word_timestamp():
-                model = os.getenv("LLM_MODEL")
-                logger.info(f"正在使用{model} 断句")
-                logger.info(f"句子限制长度为{self.config.max_word_count_english}字")
-                asr_data = merge_segments(asr_data, model=model, 
-                                       num_threads=self.config.thread_num, 
-                                       save_split=save_split)
+                # 检查是否需要重新断句
+                need_split = asr_data.is_word_timestamp()
+                if need_split:
+                    model = os.getenv("LLM_MODEL")
+                    logger.info(f"正在使用{model} 断句")
+                    logger.info(f"句子限制长度为{self.config.max_word_count_english}字")
+
+                # 摘要只依赖原始文本，与断句并行请求，翻译开始前才等待结果
+                timings: Dict[str, float] = {}
+                stage_start = time.perf_counter()
+                summary_future = self._submit_summary(asr_data, input_file, timings, config, use_cache)
+                # 探测缓存未命中时，确认端点可用后再开始断句
+                self._confirm_endpoint(probe, config)
+
+                if need_split and self.config.streaming:
+                    # 断句批次完成后其中的字幕立即进入翻译
+                    with tracing.span("split_translate", cat="pipeline"):
+                        segment_batches = iter_merge_segments(asr_data, model=model,
+                                                              num_threads=self.config.thread_num,
+                                                              executor=self.executor,
+                                                              journal=journal)
+                        asr_data, translate_result = self._translate_subtitles_stream(
+                            _timed(segment_batches, timings, "split", stage_start),
+                            summary_future, config, reflect, use_cache, journal, timings
+                        )
+                    timings["split_translate"] = time.perf_counter() - stage_start
+                else:
+                    if need_split:
+                        with tracing.span("split", cat="split"):
+                            asr_data = merge_segments(asr_data, model=model, 
+                                                   num_threads=self.config.thread_num, 
+                                                   save_split=save_split,
+                                                   executor=self.executor,
+                                                   journal=journal)
+                        timings["split"] = time.perf_counter() - stage_start
             
-            # 获取字幕摘要
-            summarize_result = self._get_subtitle_summary(asr_data, input_file)
+                    # 等待字幕摘要
+                    wait_start = time.perf_counter()
+                    summarize_result = summary_future.result()
+                    timings["summary_wait"] = time.perf_counter() - wait_start
             
-            # 翻译字幕
-            translate_result = self._translate_subtitles(asr_data, summarize_result, reflect)
+                    # 翻译字幕
+                    translate_start = time.perf_counter()
+                    translate_result = self._translate_subtitles(asr_data, summarize_result, config,
+                                                                 reflect, use_cache, journal)
+                    timings["translate"] = time.perf_counter() - translate_start
             
-            # 保存字幕
-            asr_data.save_translations_to_files(
-                translate_result,
-                en_output,
-                zh_output
-            )
+                # 保存字幕
+                save_start = time.perf_counter()
+                asr_data.save_translations_to_files(
+                    translate_result,
+                    en_output,
+                    zh_output
+                )
+                timings["save"] = time.perf_counter() - save_start
+                _log_stage_timings(timings, time.perf_counter() - stage_start)
+
+                # 结果已保存，断点日志不再需要
+                journal.remove()
+                self._report_usage(input_file)
                 
         except OpenAIAPIError as e:
             error_msg = f"\n{'='*50}\n错误: {str(e)}\n{'='*50}\n"
             # 只使用logger记录错误，不重复输出
             logger.error(error_msg)
-            sys.exit(1)
+            raise
             
         except Exception as e:
             error_msg = f"\n{'='*50}\n处理过程中发生错误: {str(e)}\n{'='*50}\n"
             # 记录异常堆栈到日志
             logger.exception(error_msg)
-            sys.exit(1)
+            raise
 
-    def _init_translation_env(self, llm_model: str) -> None:
-        """初始化翻译环境"""
-        if llm_model:
-            self.config.llm_model = llm_model
+    def _file_config(self, llm_model: Optional[str]) -> SubtitleConfig:
+        """一个文件使用的配置：指定了其他模型时使用副本，不修改多个文件共享的 self.config"""
+        if not llm_model or llm_model == self.config.llm_model:
+            return self.config
+        return dataclasses.replace(self.config, llm_model=llm_model)
 
-        logger.info(f"使用 {self.config.openai_base_url} 作为API端点")
-        logger.info(f"使用 {self.config.llm_model} 作为LLM模型")
-        
-        success, error_msg = test_openai(self.config.openai_base_url, self.config.openai_api_key, self.config.llm_model)
-        if not success:
-            raise OpenAIAPIError(error_msg)
-
-    def _get_subtitle_summary(self, asr_data: SubtitleData, input_file: str) -> Dict:
-        """获取字幕内容摘要"""
-        logger.info(f"正在使用 {self.config.llm_model} 总结字幕...")
-        summarize_result = self.summarizer.summarize(asr_data.to_txt(), input_file)
+    @tracing.traced("init_translation_env")
+    def _init_translation_env(self, config: SubtitleConfig) -> Optional[Future]:
+        """初始化翻译环境
+
+        Returns:
+            探测缓存未命中时返回等待第一个请求结果的 Future，命中时返回None
+        """
+        logger.info(f"使用 {config.openai_base_url} 作为API端点")
+        logger.info(f"使用 {config.llm_model} 作为LLM模型")
+
+        self.executor.submit(warm_up, self.client)
+        return self._begin_probe(config)
+
+    @staticmethod
+    def _probe_key(config: SubtitleConfig) -> str:
+        return ProbeCache.make_key(config.openai_base_url, config.llm_model, config.openai_api_key)
+
+    def _begin_probe(self, config: SubtitleConfig) -> Optional[Future]:
+        """查找探测结果；未命中时注册回调，让本文件接下来的第一个请求兼作探测"""
+        key = self._probe_key(config)
+        with self._probe_lock:
+            if key in self._probes:
+                return None
+            cached = self.probe_cache.get(config.openai_base_url, config.llm_model, config.openai_api_key)
+            if cached is not None:
+                self._probes[key] = cached
+                logger.info(f"使用 {(time.time() - cached.checked_at) / 60:.0f} 分钟前的端点探测结果"
+                            f"（延迟 {cached.latency:.2f}s），跳过连通性测试")
+                return None
+        # 回调只由本文件（file_scope）的请求触发，每个文件等待自己的探测结果
+        future = Future()
+        observe_next_request(lambda latency, error: self._on_first_request(future, latency, error))
+        return future
+
+    def _on_first_request(self, future: Future, latency: float, error: Optional[BaseException]) -> None:
+        if error is not None and not isinstance(error, Exception):
+            # 请求被中断，无法判断端点状态，继续等待下一个请求
+            observe_next_request(lambda latency, error: self._on_first_request(future, latency, error))
+            return
+        if not future.done():
+            future.set_result((latency, error))
+
+    def _confirm_endpoint(self, probe: Optional[Future], config: SubtitleConfig) -> None:
+        """
+        等待第一个完成的请求的结果作为端点探测，端点或模型不可用时抛出 OpenAIAPIError
+
+        摘要请求往往要十几秒，不等它完成：同时发一个只生成 1 个 token 的请求，
+        通常由它最先完成并兼作探测
+
+        Args:
+            probe: _init_translation_env 返回的 Future，为None时不需要探测
+            config: 本文件使用的配置
+        """
+        if probe is None:
+            return
+        with tracing.span("probe_wait", cat="llm"):
+            probe_request = self.executor.submit(propagate(send_probe_request), self.client, config.llm_model)
+            wait([probe, probe_request], return_when=FIRST_COMPLETED)
+            if not probe.done():
+                # 探测请求被中断，没有得到结果，单独做一次连通性测试
+                start = time.monotonic()
+                success, error_msg = test_openai(config.openai_base_url, config.openai_api_key,
+                                                 config.llm_model,
+                                                 client=self.client.with_options(timeout=15))
+                if not success:
+                    raise OpenAIAPIError(error_msg)
+                if not probe.done():
+                    probe.set_result((time.monotonic() - start, None))
+            latency, error = probe.result()
+        try:
+            result = result_from_request(latency, error)
+        except Exception as e:
+            raise OpenAIAPIError(error_message(e)) from e
+
+        key = self._probe_key(config)
+        with self._probe_lock:
+            if key in self._probes:
+                return
+            self._probes[key] = result
+        logger.info(f"端点可用，首个请求耗时 {latency:.2f}s")
+        self.probe_cache.put(config.openai_base_url, config.llm_model, config.openai_api_key, result)
+        # JSON 模式支持情况在后台检测，不阻塞翻译
+        self.executor.submit(propagate(self._check_json_mode), result, config)
+
+    def _check_json_mode(self, result: ProbeResult, config: SubtitleConfig) -> None:
+        result.json_mode = check_json_mode(self.client, config.llm_model)
+        logger.debug(f"JSON 模式支持: {result.json_mode}")
+        self.probe_cache.put(config.openai_base_url, config.llm_model, config.openai_api_key, result)
+
+    def _submit_summary(self, asr_data: SubtitleData, input_file: str, timings: Dict[str, float],
+                        config: SubtitleConfig, use_cache: bool = True) -> Future:
+        """在线程池中请求摘要，文本和分段在提交前取出，之后断句修改 asr_data 不影响摘要"""
+        text = asr_data.to_txt()
+        sections = self.summarizer.plan_sections(asr_data)
+        task = propagate(tracing.queued(self._get_subtitle_summary, "summary"))
+        return self.executor.submit(task, text, input_file, config, timings, sections, use_cache)
+
+    @tracing.traced("summary", cat="summary")
+    def _get_subtitle_summary(self, text: str, input_file: str, config: SubtitleConfig,
+                              timings: Optional[Dict[str, float]] = None,
+                              sections: Optional[List[Dict]] = None, use_cache: bool = True) -> Dict:
+        """获取字幕内容摘要，字幕过长时分段总结"""
+        start = time.perf_counter()
+        logger.info(f"正在使用 {config.llm_model} 总结字幕...")
+        summarizer = self.summarizer
+        if config is not self.config or not use_cache:
+            summarizer = SubtitleSummarizer(config=config, client=self.client,
+                                            cache=self.cache if use_cache else None)
+        summarize_result = summarizer.summarize(text, input_file, sections=sections)
         logger.info(f"总结字幕内容:\n{summarize_result.get('summary')}\n")
+        if timings is not None:
+            timings["summary"] = time.perf_counter() - start
         return summarize_result
 
-    def _translate_subtitles(self, asr_data: SubtitleData, summarize_result: str, reflect: bool = False) -> List[Dict]:
+    def _create_optimizer(self, config: SubtitleConfig, reflect: bool, use_cache: bool,
+                          journal: Optional[BatchJournal]) -> SubtitleOptimizer:
+        return SubtitleOptimizer(
+            config=config,
+            need_reflect=reflect,
+            client=self.client,
+            executor=self.executor,
+            cache=self.cache if use_cache else None,
+            journal=journal,
+            batch_budget=self.batch_budget
+        )
+
+    @tracing.traced("translate", cat="translate")
+    def _translate_subtitles(self, asr_data: SubtitleData, summarize_result: str, config: SubtitleConfig,
+                             reflect: bool = False, use_cache: bool = True,
+                             journal: Optional[BatchJournal] = None) -> List[Dict]:
         """翻译字幕内容"""
-        logger.info(f"正在使用 {self.config.llm_model} 翻译字幕...")
+        logger.info(f"正在使用 {config.llm_model} 翻译字幕...")
         try:
-            translator = SubtitleOptimizer(
-                config=self.config,
-                need_reflect=reflect
-            )
+            translator = self._create_optimizer(config, reflect, use_cache, journal)
             translate_result = translator.translate(asr_data, summarize_result)
+            if translator.cache:
+                stats = translator.cache.stats()
+                logger.info(f"翻译缓存（本次运行累计）: 命中 {stats['hits']} 批次, 未命中 {stats['misses']} 批次")
+            if translator.batch_budget:
+                logger.info(translator.batch_budget.describe())
+            streaming = translator.describe_streaming()
+            if streaming:
+                logger.info(streaming)
             return translate_result
         except Exception as e:
             logger.error(f"翻译失败: {str(e)}")
             raise
 
-def main():
+    def _translate_subtitles_stream(self, segment_batches, summary: Future, config: SubtitleConfig,
+                                    reflect: bool = False, use_cache: bool = True,
+                                    journal: Optional[BatchJournal] = None,
+                                    timings: Optional[Dict[str, float]] = None
+                                    ) -> Tuple[SubtitleData, List[Dict]]:
+        """边断句边翻译，第一个翻译批次提交前等待摘要，返回断句后的字幕数据和翻译结果"""
+        logger.info(f"正在使用 {config.llm_model} 边断句边翻译字幕...")
+        try:
+            translator = self._create_optimizer(config, reflect, use_cache, journal)
+            segments, translate_result = translator.translate_stream(segment_batches, summary)
+            if timings is not None:
+                timings["summary_wait"] = translator.summary_wait
+            if translator.cache:
+                stats = translator.cache.stats()
+                logger.info(f"翻译缓存（本次运行累计）: 命中 {stats['hits']} 批次, 未命中 {stats['misses']} 批次")
+            if translator.batch_budget:
+                logger.info(translator.batch_budget.describe())
+            streaming = translator.describe_streaming()
+            if streaming:
+                logger.info(streaming)
+            return SubtitleData(segments, presorted=True), translate_result
+        except Exception as e:
+            logger.error(f"翻译失败: {str(e)}")
+            raise
+
+STAGE_LABELS = {
+    "split": "断句",
+    "summary": "摘要",
+    "summary_wait": "等待摘要",
+    "translate": "翻译",
+    "split_translate": "断句+翻译",
+    "save": "保存",
+}
+
+
+def _timed(batches, timings: Dict[str, float], name: str, start: float):
+    """逐批转发，迭代结束时记录从 start 起的耗时"""
+    yield from batches
+    timings[name] = time.perf_counter() - start
+
+
+def _log_stage_timings(timings: Dict[str, float], total: float) -> None:
+    parts = [f"{STAGE_LABELS[name]} {timings[name]:.1f}s" for name in STAGE_LABELS if name in timings]
+    logger.info(f"阶段耗时: {', '.join(parts)}; 合计 {total:.1f}s")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
     parser = argparse.ArgumentParser(description="翻译字幕文件")
     parser.add_argument("input_file", help="输入的字幕文件路径")
     parser.add_argument("-r", "--reflect", action="store_true", help="启用反思翻译模式，提高翻译质量但会增加处理时间")
     parser.add_argument("-m", "--llm_model", help="指定使用的LLM模型，默认使用配置文件中的设置")
     parser.add_argument("-d", "--debug", action="store_true", help="启用调试日志级别，显示更详细的处理信息")
-    args = parser.parse_args()
+    parser.add_argument("--no-cache", action="store_true", help="不读取也不写入批次翻译缓存")
+    parser.add_argument("--trace", metavar="OUT_JSON", help="记录各阶段和LLM调用的时间线，保存为 Chrome trace-event JSON")
+    return parser
+
+def get_output_paths(input_file: str) -> Tuple[str, str, str]:
+    """根据输入文件计算英文字幕、中文字幕和断句结果的输出路径"""
+    base_path = Path(input_file)
+    base_name = base_path.stem
+    # 只移除末尾的 _en 或 _zh 后缀
+    if base_name.endswith('_en'):
+        base_name = base_name[:-3]
+    elif base_name.endswith('_zh'):
+        base_name = base_name[:-3]
+    output_dir = base_path.parent
+    en_output = str(output_dir / f"{base_name}_en.srt")
+    zh_output = str(output_dir / f"{base_name}_zh.srt")
+    # 设置断句结果保存路径
+    split_output = str(output_dir / f"{base_name}.txt")
+    return en_output, zh_output, split_output
+
+def run(translator: SubtitleTranslator, args: argparse.Namespace) -> None:
+    """使用已初始化的翻译器处理一个字幕文件，供命令行和进程内调用共用"""
+    en_output, zh_output, split_output = get_output_paths(args.input_file)
+    base_name = Path(en_output).stem[:-3]
+    print(f"\n=================== 正在翻译 {base_name} ===================\n")
+    translator.translate(
+        input_file=args.input_file,
+        en_output=en_output,
+        zh_output=zh_output,
+        llm_model=args.llm_model,
+        reflect=args.reflect,
+        save_split=split_output,
+        use_cache=not args.no_cache
+    )
+
+def main():
+    args = build_arg_parser().parse_args()
+    if args.trace:
+        tracing.enable_tracing()
     
     try:
-        # 处理文件名
-        base_path = Path(args.input_file)
-        base_name = base_path.stem
-        # 只移除末尾的 _en 或 _zh 后缀
-        if base_name.endswith('_en'):
-            base_name = base_name[:-3]
-        elif base_name.endswith('_zh'):
-            base_name = base_name[:-3]
-        output_dir = base_path.parent
-        en_output = str(output_dir / f"{base_name}_en.srt")
-        zh_output = str(output_dir / f"{base_name}_zh.srt")
-        
-        # 设置断句结果保存路径
-        split_output = str(output_dir / f"{base_name}.txt") 
-
         # 初始化翻译器并开始翻译
         translator = SubtitleTranslator()
-        print(f"\n=================== 正在翻译 {base_name} ===================\n")
-        translator.translate(
-            input_file=args.input_file,
-            en_output=en_output,
-            zh_output=zh_output,
-            llm_model=args.llm_model,
-            reflect=args.reflect,
-            save_split=split_output
-        )
+        try:
+            run(translator, args)
+        finally:
+            translator.close()
+            if args.trace:
+                tracing.save_trace(args.trace)
     except Exception as e:
         logger.error(f"发生错误: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
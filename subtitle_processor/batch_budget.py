@@ -0,0 +1,119 @@
+"""
+翻译批次的 token 预算
+
+批次大小按估计的输入 + 输出 token 计算，而不是固定的字幕条数：每条字幕的成本为
+原文 token 加上输出中优化后的字幕、译文和 JSON 结构的估计值，一个批次在累计成本
+达到预算或条数达到上限时结束。
+
+当前预算在运行中自适应调整（与限流器的 AIMD 并发控制相同的思路）：
+- 响应因输出长度限制被截断（finish_reason == "length"）时减半
+- 批次失败（解析失败、缺少字幕ID、请求异常）时乘以 0.75
+- 最近的批次失败率较低时，每个成功批次增加初始预算的 5%，最多到初始预算的 2 倍
+
+分批使用向下取整到固定档位（初始预算的 0.25/0.5/0.75/1/1.5/2 倍）的当前预算，
+预算小幅波动时批次不变，同一档位下同样的字幕总是切分出相同的批次（缓存和断点日志
+按批次内容生成键）。失败批次拆分的份数按未取整的当前预算计算。
+"""
+import threading
+from collections import deque
+from typing import Optional
+
+from .llm_client import estimate_tokens
+from utils.logger import setup_logger
+
+logger = setup_logger("batch_budget")
+
+# 输入中每条字幕的 ID、引号和分隔符
+INPUT_OVERHEAD_TOKENS = 6
+# 输出中每条字幕的 JSON 结构（ID、字段名、引号）
+OUTPUT_OVERHEAD_TOKENS = 20
+REFLECT_OUTPUT_OVERHEAD_TOKENS = 40
+# 译文相对原文的 token 比例，反思翻译还要输出修订译文和建议
+TRANSLATION_RATIO = 1.5
+REFLECT_TRANSLATION_RATIO = 4.0
+
+# 预算可下调到的最小值和可增长到的最大值（相对初始预算）
+MIN_BUDGET_RATIO = 0.25
+MAX_BUDGET_RATIO = 2.0
+# 分批使用的预算档位（相对初始预算），当前预算向下取整到其中之一
+PLANNING_LEVELS = (0.25, 0.5, 0.75, 1.0, 1.5, 2.0)
+# 失败率统计窗口和允许增长的失败率上限
+OUTCOME_WINDOW = 20
+GROWTH_FAILURE_RATE = 0.1
+
+
+def estimate_line_tokens(text: str, reflect: bool = False) -> int:
+    """估计一条字幕在批次中的成本：输入 token + 输出 token"""
+    tokens = estimate_tokens(text)
+    if reflect:
+        output = tokens + int(tokens * REFLECT_TRANSLATION_RATIO) + REFLECT_OUTPUT_OVERHEAD_TOKENS
+    else:
+        output = tokens + int(tokens * TRANSLATION_RATIO) + OUTPUT_OVERHEAD_TOKENS
+    return tokens + INPUT_OVERHEAD_TOKENS + output
+
+
+class BatchBudget:
+    """自适应的批次 token 预算，线程安全，可在多个文件之间共享"""
+
+    def __init__(self, budget: int):
+        self.initial = max(1, budget)
+        self.min_budget = max(1, int(self.initial * MIN_BUDGET_RATIO))
+        self.max_budget = int(self.initial * MAX_BUDGET_RATIO)
+        self.budget = float(self.initial)
+        self.truncated_count = 0
+        self.failed_count = 0
+        self.success_count = 0
+        self._outcomes = deque(maxlen=OUTCOME_WINDOW)
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        with self._lock:
+            return int(self.budget)
+
+    def planning_budget(self) -> int:
+        """分批使用的预算：当前预算向下取整到最近的档位"""
+        with self._lock:
+            return self._planning_budget()
+
+    def _planning_budget(self) -> int:
+        ratio = self.budget / self.initial
+        level = max((level for level in PLANNING_LEVELS if level <= ratio), default=PLANNING_LEVELS[0])
+        return max(1, int(self.initial * level))
+
+    def failure_rate(self) -> float:
+        """最近批次的失败率（截断也计为失败）"""
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return sum(not ok for ok in self._outcomes) / len(self._outcomes)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.success_count += 1
+            self._outcomes.append(True)
+            failures = sum(not ok for ok in self._outcomes)
+            if failures / len(self._outcomes) <= GROWTH_FAILURE_RATE:
+                self.budget = min(self.max_budget, self.budget + self.initial * 0.05)
+
+    def record_truncated(self, batch_size: Optional[int] = None) -> None:
+        """响应被截断：输出超出了模型的长度限制"""
+        self._shrink(0.5, truncated=True)
+        logger.warning(f"批次响应被截断（{batch_size or '?'}条字幕），批次预算降至 {self.current()} token")
+
+    def record_failure(self) -> None:
+        self._shrink(0.75, truncated=False)
+
+    def _shrink(self, factor: float, truncated: bool) -> None:
+        with self._lock:
+            if truncated:
+                self.truncated_count += 1
+            else:
+                self.failed_count += 1
+            self._outcomes.append(False)
+            self.budget = max(self.min_budget, self.budget * factor)
+
+    def describe(self) -> str:
+        """预算的当前状态，用于日志"""
+        with self._lock:
+            return (f"批次预算 {int(self.budget)}/{self.initial} token（分批按 {self._planning_budget()}）"
+                    f"（成功 {self.success_count}，截断 {self.truncated_count}，失败 {self.failed_count}）")
@@ -0,0 +1,166 @@
+"""
+批量翻译结果的持久化缓存
+
+以模型、提示词模板、目标语言、反思开关、摘要和批次字幕内容计算内容哈希作为键，
+把成功的批次结果保存在 SQLite（WAL 模式，可被多个进程同时使用）中。
+重新运行同一文件或处理重新编码的同一视频时，相同批次不再调用API。
+
+摘要是批次键的一部分，而摘要请求使用较高的 temperature，每次生成的文本都不同，
+因此摘要本身也按字幕全文、模型和提示词缓存在同一个数据库中，重新运行时复用，
+批次键保持不变。
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger("translation_cache")
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / "cache" / "translations.db"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_subtitles(subtitles: Dict[str, str]) -> List[str]:
+    """按字幕ID顺序取出文本并规范化空白，使键不依赖字幕编号"""
+    return [" ".join(subtitles[k].split()) for k in sorted(subtitles, key=int)]
+
+
+class TranslationCache:
+    """基于 SQLite 的批次翻译缓存，按总大小做 LRU 淘汰"""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 200 * 1024 * 1024):
+        self.path = Path(path) if path else DEFAULT_CACHE_PATH
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_batches_access ON batches(last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, prompt: str, target_language: str, reflect: bool,
+                 summary: str, subtitles: Dict[str, str]) -> str:
+        """计算批次的内容哈希键"""
+        payload = {
+            "model": model,
+            "prompt": _sha256(prompt),
+            "target_language": target_language,
+            "reflect": reflect,
+            "summary": _sha256(summary or ""),
+            "subtitles": normalize_subtitles(subtitles),
+        }
+        return _sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True))
+
+    @staticmethod
+    def make_summary_key(model: str, prompts: List[str], transcript: str,
+                         sections: Optional[List[Dict]] = None) -> str:
+        """计算摘要的键：字幕全文、模型、用到的提示词，以及分段总结时各分段的时间范围"""
+        payload = {
+            "kind": "summary",
+            "model": model,
+            "prompts": [_sha256(prompt) for prompt in prompts],
+            "transcript": _sha256(" ".join(transcript.split())),
+            "sections": [[s["start_time"], s["end_time"]] for s in sections or []],
+        }
+        return _sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True))
+
+    def _read(self, key: str):
+        """读取一个条目并更新访问时间，未命中或读取失败时返回None"""
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM batches WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                with conn:
+                    conn.execute("UPDATE batches SET last_access = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            logger.warning(f"读取翻译缓存失败: {e}")
+            row = None
+        return json.loads(row[0]) if row is not None else None
+
+    def get(self, key: str, expected_size: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        读取缓存，未命中返回None
+
+        Args:
+            expected_size: 批次的字幕条数，缓存的结果条数不一致时按未命中处理
+        """
+        value = self._read(key)
+        if value is not None and expected_size is not None and len(value) != expected_size:
+            value = None
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def get_summary(self, key: str) -> Optional[Dict]:
+        """读取缓存的摘要，不计入批次的命中统计"""
+        value = self._read(key)
+        return value if isinstance(value, dict) else None
+
+    def set_summary(self, key: str, summary: Dict) -> None:
+        """缓存摘要，与批次结果一起按 LRU 淘汰"""
+        self.set(key, summary)
+
+    def set(self, key: str, value: List[Dict]) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        data = json.dumps(value, ensure_ascii=False)
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO batches (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, data, len(data.encode("utf-8")), time.time())
+                )
+            self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"写入翻译缓存失败: {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM batches").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM batches ORDER BY last_access ASC"):
+            evicted.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        with conn:
+            conn.executemany("DELETE FROM batches WHERE key = ?", evicted)
+        logger.debug(f"翻译缓存超出容量，淘汰 {len(evicted)} 条")
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中与未命中次数"""
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
@@ -13,11 +13,46 @@ class SubtitleConfig:
     # 处理配置
     target_language: str = "简体中文"
     max_word_count_english: int = 14
-    thread_num: int = 18
-    batch_size: int = 20
+    thread_num: int = int(os.getenv('LLM_THREAD_NUM', '18'))
+    batch_size: int = int(os.getenv('TRANSLATE_BATCH_SIZE', '20'))
+    # 每个翻译批次估计的输入+输出 token 初始预算，运行中按批次结果自适应调整；
+    # 批次最多 2 倍 batch_size 条字幕，0 表示按 batch_size 固定条数分批
+    batch_token_budget: int = int(os.getenv('TRANSLATE_BATCH_TOKENS', '1500'))
+    # 翻译批次使用流式请求：每条字幕的结果在生成完成时立即解析，输出偏离 JSON 格式时提前中止
+    stream_translation: bool = os.getenv('TRANSLATE_STREAM', '').lower() in ('1', 'true', 'yes')
+
+    # 字幕全文估计超过该 token 数时分段并行总结再合并，0 表示始终整体总结
+    summary_chunk_tokens: int = int(os.getenv('SUMMARY_CHUNK_TOKENS', '16000'))
+
+    # 限流配置，0 表示不限制
+    requests_per_minute: int = int(os.getenv('LLM_RPM', '0'))
+    tokens_per_minute: int = int(os.getenv('LLM_TPM', '0'))
+    # 并发上限可自适应增长到的最大值，0 表示保持 thread_num
+    max_concurrency: int = int(os.getenv('LLM_MAX_CONCURRENCY', '0'))
+    # 每个请求最多尝试的次数（含第一次），以及整个运行最多重试的次数（0 表示不限制）
+    retry_attempts: int = int(os.getenv('LLM_RETRY_ATTEMPTS', '3'))
+    retry_budget: int = int(os.getenv('LLM_RETRY_BUDGET', '100'))
+    
+    # 用量账本：每次请求追加一条记录（.csv 或 .jsonl），为空时只输出汇总报告
+    usage_ledger_path: str = os.getenv('LLM_USAGE_LEDGER', '')
+    # 每百万 token 的价格，用于估算费用，0 表示不计算
+    price_input_per_mtok: float = float(os.getenv('LLM_PRICE_INPUT', '0'))
+    price_output_per_mtok: float = float(os.getenv('LLM_PRICE_OUTPUT', '0'))
     
     # 功能开关
     need_reflect: bool = False
+    # 字级字幕边断句边翻译：每个断句批次完成后立即提交其中可以确定边界的翻译批次，默认关闭
+    streaming: bool = os.getenv('PIPELINE_STREAMING', '').lower() in ('1', 'true', 'yes')
+    # 翻译、断句和分段总结的批次作为协程在单个事件循环中执行，请求使用 AsyncOpenAI
+    async_engine: bool = os.getenv('LLM_ASYNC_ENGINE', '').lower() in ('1', 'true', 'yes')
+
+    # 端点探测结果的有效期（秒），0 表示不缓存
+    probe_ttl: int = int(os.getenv('LLM_PROBE_TTL', '86400'))
+
+    # 翻译缓存配置
+    cache_enabled: bool = True
+    cache_path: str = os.getenv('TRANSLATION_CACHE_PATH', '')
+    cache_max_mb: int = 200
     
     def __post_init__(self):
         """验证配置"""
@@ -1,14 +1,40 @@
 import re
 import os
-from typing import List, Dict
+import sys
+import codecs
+import operator
+from array import array
+from collections.abc import Sequence
+from itertools import chain, islice
+from typing import Callable, List, Dict, Iterable, Iterator
 from pathlib import Path
 import logging
 
+from utils import tracing
+
 # 配置日志
 logger = logging.getLogger("subtitle_translator_cli")
 
+SRT_TIME_PATTERN = re.compile(
+    r'(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})\s-->\s(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})'
+)
+# 编码检测读取的文件前缀字节数
+ENCODING_SAMPLE_BYTES = 64 * 1024
+# 判断是否为双语字幕时抽样的字幕块数
+BILINGUAL_SAMPLE_BLOCKS = 500
+# 读取文件的缓冲区大小
+READ_BUFFER_SIZE = 1024 * 1024
+# 字级字幕中大量重复的短文本会被驻留以共享同一个字符串对象
+INTERN_MAX_LENGTH = 32
+
+
+def _is_sorted(values: array) -> bool:
+    return all(map(operator.le, values, islice(values, 1, None)))
+
 class SubtitleSegment:
     """单个字幕段的数据结构"""
+    __slots__ = ("text", "start_time", "end_time")
+
     def __init__(self, text: str, start_time: int, end_time: int):
         self.text = text
         self.start_time = start_time
@@ -35,23 +61,142 @@ class SubtitleSegment:
         return f"SubtitleSegment({self.text}, {self.start_time}, {self.end_time})"
 
 
+class SegmentList(Sequence):
+    """SubtitleData 的只读段序列，按需创建 SubtitleSegment 对象"""
+    __slots__ = ("_data",)
+
+    def __init__(self, data: 'SubtitleData'):
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._data._segment_at(i) for i in range(*index.indices(len(self._data)))]
+        return self._data[index]
+
+    def __iter__(self):
+        return iter(self._data)
+
+
 class SubtitleData:
-    """字幕数据的主要容器类"""
-    def __init__(self, segments: List[SubtitleSegment]):
-        # 去除 segments.text 为空的
-        filtered_segments = [seg for seg in segments if seg.text and seg.text.strip()]
-        filtered_segments.sort(key=lambda x: x.start_time)
-        self.segments = filtered_segments
+    """
+    字幕数据的主要容器类
+
+    按列存储：开始/结束时间使用 array('q')，文本使用字符串列表，SubtitleSegment 仅在访问时创建。
+    切片返回共享底层数组的视图，不会重新过滤和排序；视图和所有者任何一方修改时都先复制列，互不影响。
+    """
+    def __init__(self, segments: Iterable[SubtitleSegment] = (), presorted: bool = False):
+        """
+        Args:
+            segments: 字幕段，文本为空的段会被去除
+            presorted: 调用方保证已按开始时间排序时跳过排序检查
+        """
+        # 去除 segments.text 为空的；各列用推导式一次生成，比逐段 append 三列快
+        kept = [seg for seg in segments if seg.text and seg.text.strip()]
+        intern = sys.intern
+        texts = [intern(seg.text) if len(seg.text) <= INTERN_MAX_LENGTH else seg.text for seg in kept]
+        starts = array('q', [seg.start_time for seg in kept])
+        ends = array('q', [seg.end_time for seg in kept])
+        del kept
+        if not presorted and not _is_sorted(starts):
+            # 稳定排序，开始时间相同的段保持原有顺序
+            order = sorted(range(len(texts)), key=starts.__getitem__)
+            texts = [texts[i] for i in order]
+            starts = array('q', (starts[i] for i in order))
+            ends = array('q', (ends[i] for i in order))
+        self._set_columns(texts, starts, ends)
+
+    def _set_columns(self, texts: List[str], starts: array, ends: array,
+                     offset: int = 0, length: int = None) -> None:
+        self._texts = texts
+        self._starts = starts
+        self._ends = ends
+        self._offset = offset
+        self._length = len(texts) if length is None else length
+        # 视图与父对象共享列，修改前需要先复制
+        self._owns_columns = offset == 0 and self._length == len(texts)
+        # 列的所有者；所有者创建过视图后 _has_views 为True，修改前先换用一份副本，视图保留切片时的内容
+        self._owner = self
+        self._has_views = False
+
+    @classmethod
+    def _view(cls, parent: 'SubtitleData', start: int, stop: int) -> 'SubtitleData':
+        view = cls.__new__(cls)
+        view._set_columns(parent._texts, parent._starts, parent._ends,
+                          parent._offset + start, stop - start)
+        view._owns_columns = False
+        view._owner = parent._owner
+        view._owner._has_views = True
+        return view
+
+    def _materialize(self) -> None:
+        """修改前确保列不与其他对象共享：视图复制自己的部分，有视图的所有者复制全部列"""
+        if self._owns_columns and not self._has_views:
+            return
+        lo, hi = self._offset, self._offset + self._length
+        self._set_columns(self._texts[lo:hi], self._starts[lo:hi], self._ends[lo:hi])
+
+    def _segment_at(self, i: int) -> SubtitleSegment:
+        j = self._offset + i
+        return SubtitleSegment(self._texts[j], self._starts[j], self._ends[j])
+
+    @property
+    def segments(self) -> SegmentList:
+        """按需创建字幕段的只读序列"""
+        return SegmentList(self)
+
+    @segments.setter
+    def segments(self, segments: Iterable[SubtitleSegment]) -> None:
+        self.__init__(segments)
+
+    def where(self, keep: Callable[[str], bool]) -> 'SubtitleData':
+        """
+        只保留文本满足 keep 的段，直接在列上筛选，不创建 SubtitleSegment
+
+        Returns:
+            全部保留时返回覆盖全部段的视图（不复制），否则返回新的 SubtitleData
+        """
+        texts = self.texts
+        indices = [i for i, text in enumerate(texts) if keep(text)]
+        if len(indices) == len(texts):
+            return self[:]
+        data = SubtitleData.__new__(SubtitleData)
+        offset = self._offset
+        data._set_columns([texts[i] for i in indices],
+                          array('q', [self._starts[offset + i] for i in indices]),
+                          array('q', [self._ends[offset + i] for i in indices]))
+        return data
+
+    @property
+    def texts(self) -> List[str]:
+        """所有字幕文本"""
+        return self._texts[self._offset:self._offset + self._length]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step != 1:
+                raise ValueError("SubtitleData 切片不支持步长")
+            return SubtitleData._view(self, start, max(start, stop))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("字幕段索引超出范围")
+        return self._segment_at(index)
 
     def __iter__(self):
-        return iter(self.segments)
+        texts, starts, ends = self._texts, self._starts, self._ends
+        for j in range(self._offset, self._offset + self._length):
+            yield SubtitleSegment(texts[j], starts[j], ends[j])
     
     def __len__(self) -> int:
-        return len(self.segments)
+        return self._length
     
     def has_data(self) -> bool:
         """检查是否有字幕数据"""
-        return len(self.segments) > 0
+        return self._length > 0
     
     def is_word_timestamp(self) -> bool:
         """
@@ -61,14 +206,14 @@ class SubtitleData:
         2. 对于中文，每个segment应该只包含一个汉字
         3. 允许20%的误差率
         """
-        if not self.segments:
+        if not self._length:
             return False
             
         valid_segments = 0
-        total_segments = len(self.segments)
+        total_segments = self._length
         
-        for seg in self.segments:
-            text = seg.text.strip()
+        for text in self.texts:
+            text = text.strip()
             # 检查是否只包含一个英文单词或一个汉字
             if (len(text.split()) == 1 and text.isascii()) or len(text.strip()) <= 4:
                 valid_segments += 1
@@ -82,8 +227,8 @@ class SubtitleData:
         """
         # 过滤掉音效标记，并获取所有文本
         texts = []
-        for seg in self.segments:
-            text = seg.text.strip()
+        for text in self.texts:
+            text = text.strip()
             # 如果是标点符号，不需要前导空格
             if text and not text[0].isalnum() and texts:
                 texts[-1] = texts[-1].rstrip()
@@ -95,7 +240,7 @@ class SubtitleData:
     def to_srt(self, save_path=None) -> str:
         """转换为SRT字幕格式"""
         srt_lines = []
-        for n, seg in enumerate(self.segments, 1):
+        for n, seg in enumerate(self, 1):
             srt_lines.append(f"{n}\n{seg.to_srt_ts()}\n{seg.transcript}\n")
 
         srt_text = "\n".join(srt_lines)
@@ -107,7 +252,7 @@ class SubtitleData:
     def to_json(self) -> dict:
         """转换为JSON格式"""
         result_json = {}
-        for i, segment in enumerate(self.segments, 1):
+        for i, segment in enumerate(self, 1):
             # 检查是否有换行符
             if "\n" in segment.text:
                 original_subtitle, translated_subtitle = segment.text.split("\n", 1)
@@ -124,27 +269,29 @@ class SubtitleData:
 
     def merge_segments(self, start_index: int, end_index: int, merged_text: str = None):
         """合并从 start_index 到 end_index 的段（包含）"""
-        if start_index < 0 or end_index >= len(self.segments) or start_index > end_index:
+        if start_index < 0 or end_index >= self._length or start_index > end_index:
             raise IndexError("无效的段索引。")
-        merged_start_time = self.segments[start_index].start_time
-        merged_end_time = self.segments[end_index].end_time
+        self._materialize()
         if merged_text is None:
-            merged_text = ''.join(seg.text for seg in self.segments[start_index:end_index+1])
-        merged_seg = SubtitleSegment(merged_text, merged_start_time, merged_end_time)
-        # 替换 segments[start_index:end_index+1] 为 merged_seg
-        self.segments[start_index:end_index+1] = [merged_seg]
+            merged_text = ''.join(self._texts[start_index:end_index+1])
+        # 替换 segments[start_index:end_index+1] 为合并后的段
+        self._texts[start_index:end_index+1] = [merged_text]
+        self._starts[start_index:end_index+1] = array('q', [self._starts[start_index]])
+        self._ends[start_index:end_index+1] = array('q', [self._ends[end_index]])
+        self._length = len(self._texts)
 
     def merge_with_next_segment(self, index: int) -> None:
         """合并指定索引的段与下一个段"""
-        if index < 0 or index >= len(self.segments) - 1:
+        if index < 0 or index >= self._length - 1:
             raise IndexError("索引超出范围或没有下一个段可合并。")
-        current_seg = self.segments[index]
-        next_seg = self.segments[index + 1]
-        merged_text = f"{current_seg.text} {next_seg.text}"
-        merged_seg = SubtitleSegment(merged_text, current_seg.start_time, next_seg.end_time)
-        self.segments[index] = merged_seg
+        self._materialize()
+        self._texts[index] = f"{self._texts[index]} {self._texts[index + 1]}"
+        self._ends[index] = self._ends[index + 1]
         # 删除下一个段
-        del self.segments[index + 1]
+        del self._texts[index + 1]
+        del self._starts[index + 1]
+        del self._ends[index + 1]
+        self._length -= 1
 
     def save_translations(self, base_path: Path, translate_result: List[Dict], 
                         en_suffix: str = ".en.srt", zh_suffix: str = ".zh.srt") -> None:
@@ -171,7 +318,7 @@ class SubtitleData:
         self.save_translation(str(zh_path), translated_subtitles, "翻译")
 
         # 只在最后统一打印总体统计
-        total = len(self.segments)
+        total = len(self)
         valid = sum(1 for item in translate_result if item.get("optimized", "").strip())
         skipped = total - valid
         logger.info(f"总字幕数: {total}, 有效字幕数: {valid}, 跳过字幕数: {skipped}")
@@ -188,13 +335,13 @@ class SubtitleData:
 
         # 生成SRT格式的字幕内容
         srt_lines = []
-        logger.debug(f"{operation}字幕段落数: {len(self.segments)}")
+        logger.debug(f"{operation}字幕段落数: {len(self)}")
         # logger.debug(f"字幕字典内容: {subtitle_dict}")
         
         # 记录有效字幕数
         valid_subtitle_count = 0
         
-        for i, segment in enumerate(self.segments, 1):
+        for i, segment in enumerate(self, 1):
             if i not in subtitle_dict:
                 logger.warning(f"字幕 {i} 不在字典中")
                 continue
@@ -225,8 +372,9 @@ class SubtitleData:
         # 写入文件
         srt_content = "\n".join(srt_lines)
         logger.debug(f"{operation}字幕内容:\n{srt_content}")
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(srt_content)
+        with tracing.span("write_srt", cat="io", path=str(output_path)):
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(srt_content)
 
         # 检查文件是否成功保存
         if not Path(output_path).exists():
@@ -258,7 +406,7 @@ class SubtitleData:
         self.save_translation(zh_output, translated_subtitles, "翻译")
 
         # 只在最后统一打印总体统计
-        total = len(self.segments)
+        total = len(self)
         valid = sum(1 for item in translate_result if item.get("optimized", "").strip())
         skipped = total - valid
         logger.info(f"总字幕数: {total}, 有效字幕数: {valid}, 跳过字幕数: {skipped}")
@@ -288,67 +436,116 @@ def load_subtitle(file_path: str) -> 'SubtitleData':
     # 检查文件格式
     if not file_path.suffix.lower() == '.srt':
         raise ValueError("仅支持srt格式字幕文件")
-        
+
+    encoding = detect_encoding(file_path)
     try:
-        content = file_path.read_text(encoding='utf-8')
+        return SubtitleData(iter_srt_file(file_path, encoding))
     except UnicodeDecodeError:
-        content = file_path.read_text(encoding='gbk')
-        
-    return _parse_srt(content)
+        # 抽样前缀是合法的 UTF-8，但后面出现了非 UTF-8 内容
+        if encoding == 'gbk':
+            raise
+        logger.debug(f"{file_path.name} 不是完整的 UTF-8 文件，改用 GBK 解码")
+        return SubtitleData(iter_srt_file(file_path, 'gbk'))
 
-def _parse_srt(srt_str: str) -> 'SubtitleData':
+
+def detect_encoding(file_path: str) -> str:
     """
-    解析SRT格式的字符串
+    根据 BOM 和文件前缀判断编码，只读取一次前缀
 
-    Args:
-        srt_str: 包含SRT格式字幕的字符串
     Returns:
-        SubtitleData: 解析后的字幕数据实例
+        str: utf-8-sig / utf-16 / utf-8 / gbk
     """
-    segments = []
-    srt_time_pattern = re.compile(
-        r'(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})\s-->\s(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})'
-    )
-    blocks = re.split(r'\n\s*\n', srt_str.strip())
-
-    # 如果超过90%的块都超过4行，说明可能包含翻译文本
-    blocks_lines_count = [len(block.splitlines()) for block in blocks]
-    if all(count <= 4 for count in blocks_lines_count) and sum(count == 4 for count in blocks_lines_count) / len(blocks_lines_count) > 0.9:
-        has_translated_subtitle = True
-    else:
-        has_translated_subtitle = False
+    with open(file_path, 'rb') as f:
+        head = f.read(ENCODING_SAMPLE_BYTES)
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # 前缀末尾可能截断多字节字符，使用增量解码器且不要求结尾完整
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gbk'
 
+
+def iter_srt_file(file_path: str, encoding: str = None) -> Iterator[SubtitleSegment]:
+    """逐块读取SRT文件并依次生成字幕段，内存占用与单个字幕块成正比"""
+    encoding = encoding or detect_encoding(file_path)
+    with open(file_path, 'r', encoding=encoding, buffering=READ_BUFFER_SIZE) as f:
+        yield from iter_srt_segments(f)
+
+
+def iter_srt_blocks(lines: Iterable[str]) -> Iterator[List[str]]:
+    """按空行切分字幕块，每次生成一个块的行列表"""
+    block = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _is_bilingual(sample_blocks: List[List[str]]) -> bool:
+    """如果抽样块都不超过4行且超过90%的块正好4行，说明包含翻译文本"""
+    if not sample_blocks:
+        return False
+    counts = [len(block) for block in sample_blocks]
+    return all(count <= 4 for count in counts) and sum(count == 4 for count in counts) / len(counts) > 0.9
+
+
+def iter_srt_segments(lines: Iterable[str], sample_blocks: int = BILINGUAL_SAMPLE_BLOCKS) -> Iterator[SubtitleSegment]:
+    """
+    从SRT文本行流中解析字幕段
+
+    Args:
+        lines: 文本行的可迭代对象，例如打开的文件
+        sample_blocks: 用于判断是否为双语字幕的前置抽样块数
+    Returns:
+        Iterator[SubtitleSegment]: 依次生成的字幕段
+    """
+    blocks = iter_srt_blocks(lines)
+    sample = []
     for block in blocks:
-        lines = block.splitlines()
+        sample.append(block)
+        if len(sample) >= sample_blocks:
+            break
+    has_translated_subtitle = _is_bilingual(sample)
+
+    for lines in chain(sample, blocks):
         if len(lines) < 3:
             continue
 
-        match = srt_time_pattern.match(lines[1])
+        match = SRT_TIME_PATTERN.match(lines[1])
         if not match:
             continue
 
-        time_parts = list(map(int, match.groups()))
-        start_time = sum([
-            time_parts[0] * 3600000,
-            time_parts[1] * 60000,
-            time_parts[2] * 1000,
-            time_parts[3]
-        ])
-        end_time = sum([
-            time_parts[4] * 3600000,
-            time_parts[5] * 60000,
-            time_parts[6] * 1000,
-            time_parts[7]
-        ])
+        h1, m1, s1, ms1, h2, m2, s2, ms2 = map(int, match.groups())
+        start_time = h1 * 3600000 + m1 * 60000 + s1 * 1000 + ms1
+        end_time = h2 * 3600000 + m2 * 60000 + s2 * 1000 + ms2
 
         if has_translated_subtitle:
             text = '\n'.join(lines[2:]).strip()
         else:
             text = ' '.join(lines[2:])
 
-        segments.append(SubtitleSegment(text, start_time, end_time))
+        yield SubtitleSegment(text, start_time, end_time)
+
 
-    return SubtitleData(segments)
+def _parse_srt(srt_str: str) -> 'SubtitleData':
+    """
+    解析SRT格式的字符串
+
+    Args:
+        srt_str: 包含SRT格式字幕的字符串
+    Returns:
+        SubtitleData: 解析后的字幕数据实例
+    """
+    return SubtitleData(iter_srt_segments(srt_str.splitlines()))
 
 def save_split_results(text: str, split_results: List[str], output_path: str) -> None:
     """
@@ -0,0 +1,91 @@
+"""
+批次级断点日志
+
+每完成一个断句批次或翻译批次，就把结果追加写入与输入文件同目录的 JSON Lines 文件。
+进程中断后重新处理同一文件时，先读取日志，只提交尚未完成的批次，全部完成后删除日志。
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger("batch_journal")
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+
+
+def journal_path_for(input_file: str) -> Path:
+    """返回输入文件对应的断点日志路径"""
+    path = Path(input_file)
+    return path.with_name(f"{path.stem}{JOURNAL_SUFFIX}")
+
+
+class BatchJournal:
+    """追加写入的批次结果日志，按 (阶段, 批次键) 索引"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """根据批次内容计算批次键，批次划分或内容变化时键随之变化"""
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        count = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程在写入过程中被中断时，最后一行可能不完整
+                    logger.warning(f"忽略断点日志中不完整的记录: {self.path}")
+                    continue
+                self._entries.setdefault(record["stage"], {})[record["key"]] = record["result"]
+                count += 1
+        if count:
+            logger.info(f"读取断点日志 {self.path.name}，已完成 {count} 个批次")
+
+    def get(self, stage: str, key: str) -> Optional[Any]:
+        """读取已完成批次的结果，不存在时返回None"""
+        with self._lock:
+            return self._entries.get(stage, {}).get(key)
+
+    def count(self, stage: str) -> int:
+        """某个阶段已完成的批次数"""
+        with self._lock:
+            return len(self._entries.get(stage, {}))
+
+    def append(self, stage: str, key: str, result: Any) -> None:
+        """追加一个已完成批次，立即落盘"""
+        line = json.dumps({"stage": stage, "key": key, "result": result}, ensure_ascii=False)
+        with self._lock:
+            self._entries.setdefault(stage, {})[key] = result
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                logger.warning(f"写入断点日志失败: {e}")
+
+    def remove(self) -> None:
+        """任务完成后删除断点日志"""
+        with self._lock:
+            self._entries.clear()
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除断点日志失败: {e}")
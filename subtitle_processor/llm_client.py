@@ -0,0 +1,742 @@
+"""
+LLM 请求的统一入口
+
+所有阶段（断句、总结、翻译）都通过 chat_completion 发起请求，
+从而共享同一个进程级的自适应限流器（RPM/TPM 令牌桶 + AIMD 并发上限），
+多个文件同时处理时也不会超过服务商的限制。
+
+启用异步引擎后，请求由后台线程中的单个 asyncio 事件循环通过 AsyncOpenAI 发出；
+同步的 chat_completion 只是把整个请求流程（等待限流许可、发出请求、重试）提交到事件循环
+并等待结果的薄封装，调用方中断等待时对应的请求会被取消。
+翻译、断句和分段总结的批次在启用引擎时直接写成协程（achat_completion / astream_completion），
+由 AsyncLLMEngine.spawn 放到同一个事件循环中调度，不再各占一个线程。
+
+各阶段使用的 OpenAI 客户端都由 get_client 创建并在进程内复用，底层 httpx 连接池
+按并发上限设置大小（可选 HTTP/2），批次之间保持长连接，避免重复建立 TCP/TLS 连接。
+
+翻译批次可以用 stream_completion 流式请求，边生成边把输出交给调用方增量解析。
+
+每次请求的 token 用量、耗时和结果按调用方传入的 stage/batch_id 记入用量账本（usage_ledger）。
+
+接口错误（超时、连接错误、服务端错误、429）在这里按统一的重试策略（retry_policy）重试，
+SDK 自带的重试被关闭，调用方不再叠加自己的重试。
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import email.utils
+import re
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+
+from .config import SubtitleConfig
+from .rate_limiter import AdaptiveRateLimiter
+from .retry_policy import get_retry_policy
+from .usage_ledger import current_file, get_ledger
+from utils import tracing
+from utils.logger import setup_logger
+
+logger = setup_logger("llm_client")
+
+_slots_lock = threading.Lock()
+# 进程内所有LLM请求共用的限流器，为None时不限制
+_limiter: Optional[AdaptiveRateLimiter] = None
+_max_concurrency = 0
+# 进程内复用的同步客户端，按 (base_url, api_key) 索引
+_clients: Dict[Tuple[str, str], OpenAI] = {}
+_default_client: Optional[OpenAI] = None
+# 未设置并发上限时的连接池大小
+DEFAULT_POOL_SIZE = 32
+# 最近的请求耗时（秒），用于统计连接复用后的延迟
+_latencies: List[float] = []
+_latencies_lock = threading.Lock()
+MAX_LATENCY_SAMPLES = 10000
+# 空闲连接的保持时间（秒）
+KEEPALIVE_EXPIRY = 60
+# 最近一次请求完成的时间，用于判断连接池中是否还有可复用的连接
+_last_request_at = 0.0
+# 等待下一个请求结果的 (所属文件, 回调)，缓存未命中时让第一个实际请求兼作端点探测
+_request_observers: List[Tuple[Optional[str], Callable[[float, Optional[BaseException]], None]]] = []
+
+
+def _pool_limits() -> httpx.Limits:
+    """连接池大小与全局并发上限一致，保证每个进行中的请求都能复用长连接"""
+    size = _max_concurrency if _max_concurrency > 0 else DEFAULT_POOL_SIZE
+    return httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+def _http2_enabled() -> bool:
+    """设置 LLM_HTTP2 且安装了 h2 时启用 HTTP/2"""
+    if os.getenv('LLM_HTTP2', '').lower() not in ('1', 'true', 'yes'):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("未安装 h2，HTTP/2 不可用，继续使用 HTTP/1.1")
+        return False
+    return True
+
+
+def get_client(config: Optional[SubtitleConfig] = None) -> OpenAI:
+    """
+    获取进程内共享的 OpenAI 客户端
+
+    Args:
+        config: 提供 API 地址和密钥的配置，为None时使用默认配置
+
+    Returns:
+        相同地址和密钥共用同一个客户端及其连接池
+    """
+    global _default_client
+    if config is None:
+        if _default_client is not None:
+            return _default_client
+        config = SubtitleConfig()
+    key = (config.openai_base_url, config.openai_api_key)
+    with _slots_lock:
+        client = _clients.get(key)
+        if client is None:
+            http2 = _http2_enabled()
+            limits = _pool_limits()
+            client = OpenAI(
+                base_url=key[0],
+                api_key=key[1],
+                http_client=openai.DefaultHttpxClient(limits=limits, http2=http2)
+            )
+            _clients[key] = client
+            logger.debug(f"创建共享LLM客户端，连接池 {limits.max_connections}，HTTP/2: {http2}")
+        if _default_client is None:
+            _default_client = client
+    return client
+
+
+def close_clients() -> None:
+    """关闭所有共享客户端的连接池"""
+    global _default_client
+    with _slots_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _default_client = None
+    for client in clients:
+        client.close()
+
+
+def warm_up(client: OpenAI, timeout: float = 10) -> None:
+    """
+    预先建立到API的连接（TCP/TLS），可与字幕解析并行执行
+
+    最近有请求完成、连接池中仍有空闲连接时直接返回；失败只记录调试日志
+    """
+    if time.monotonic() - _last_request_at < KEEPALIVE_EXPIRY:
+        return
+    start = time.monotonic()
+    try:
+        client.with_options(max_retries=0, timeout=timeout).models.list()
+        logger.debug(f"连接预热完成，耗时 {time.monotonic() - start:.2f}s")
+    except Exception as e:
+        logger.debug(f"连接预热失败: {e}")
+
+
+def observe_next_request(callback: Callable[[float, Optional[BaseException]], None]) -> None:
+    """
+    注册回调，在下一个请求结束时以 (耗时, 异常或None) 调用一次
+
+    在 file_scope 内注册时只由同一文件的请求触发，--jobs 并发处理时不会取到其他文件的请求结果
+    """
+    with _slots_lock:
+        _request_observers.append((current_file(), callback))
+
+
+def _notify_request(latency: float, error: Optional[BaseException]) -> None:
+    global _last_request_at
+    _last_request_at = time.monotonic()
+    if not _request_observers:
+        return
+    file = current_file()
+    with _slots_lock:
+        observers = [callback for owner, callback in _request_observers if owner is None or owner == file]
+        if not observers:
+            return
+        _request_observers[:] = [(owner, callback) for owner, callback in _request_observers
+                                 if owner is not None and owner != file]
+    for callback in observers:
+        try:
+            callback(latency, error)
+        except Exception as e:
+            logger.warning(f"请求回调执行失败: {e}")
+
+
+def _record_latency(latency: float) -> None:
+    with _latencies_lock:
+        _latencies.append(latency)
+        if len(_latencies) > MAX_LATENCY_SAMPLES:
+            del _latencies[:len(_latencies) - MAX_LATENCY_SAMPLES]
+
+
+def get_latency_stats() -> Dict[str, float]:
+    """返回成功请求的耗时统计：次数、平均值、p50、p95（秒）"""
+    with _latencies_lock:
+        samples = sorted(_latencies)
+    if not samples:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0}
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+# 启用时所有请求都交给异步引擎执行
+_engine: Optional["AsyncLLMEngine"] = None
+
+
+class AsyncLLMEngine:
+    """在后台线程中运行事件循环，用 AsyncOpenAI 并发执行所有LLM请求"""
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str, int], AsyncOpenAI] = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="llm-event-loop", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _get_async_client(self, client) -> AsyncOpenAI:
+        """按同步客户端的地址、密钥和重试次数复用对应的 AsyncOpenAI 客户端"""
+        key = (str(client.base_url), client.api_key, client.max_retries)
+        async_client = self._clients.get(key)
+        if async_client is None:
+            async_client = AsyncOpenAI(
+                base_url=key[0],
+                api_key=key[1],
+                max_retries=key[2],
+                http_client=openai.DefaultAsyncHttpxClient(limits=_pool_limits(), http2=_http2_enabled())
+            )
+            self._clients[key] = async_client
+        return async_client
+
+    async def acreate(self, client, **kwargs):
+        """在引擎事件循环中执行一次 chat.completions.create，限流由调用方负责"""
+        async_client = self._get_async_client(client)
+        return await async_client.chat.completions.create(**kwargs)
+
+    async def astream(self, client, collector: "_StreamCollector", **kwargs) -> ChatCompletion:
+        """在引擎事件循环中执行一次流式请求，把各段输出交给 collector"""
+        async_client = self._get_async_client(client)
+        stream = await async_client.chat.completions.create(stream=True, **kwargs)
+        try:
+            async for chunk in stream:
+                if not collector.add(chunk):
+                    break
+        finally:
+            await stream.close()
+        return collector.completion(kwargs.get("model"))
+
+    def submit(self, client, **kwargs) -> concurrent.futures.Future:
+        """从任意线程提交请求，返回可取消的 Future"""
+        return asyncio.run_coroutine_threadsafe(self.acreate(client, **kwargs), self._loop)
+
+    async def arequest(self, client, **kwargs):
+        """在任意事件循环中等待一次请求，不在引擎事件循环中时转交给引擎执行"""
+        if asyncio.get_running_loop() is self._loop:
+            return await self.acreate(client, **kwargs)
+        return await asyncio.wrap_future(self.submit(client, **kwargs))
+
+    async def arequest_stream(self, client, collector: "_StreamCollector", **kwargs) -> ChatCompletion:
+        """arequest 的流式版本，输出交给 collector"""
+        if asyncio.get_running_loop() is self._loop:
+            return await self.astream(client, collector, **kwargs)
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self.astream(client, collector, **kwargs), self._loop))
+
+    def spawn(self, coro) -> concurrent.futures.Future:
+        """
+        把协程作为任务放到引擎事件循环中执行，返回可在任意线程中等待的 Future；取消 Future 时取消任务
+
+        协程继承调用线程的 contextvars（如用量账本当前记账的文件），
+        run_coroutine_threadsafe 不会复制调用方的上下文，这里自行在调用方上下文中创建任务
+        """
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def on_done(task: asyncio.Task) -> None:
+            if future.cancelled():
+                return
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start() -> None:
+            if future.cancelled():
+                coro.close()
+                return
+            task = self._loop.create_task(coro)
+            task.add_done_callback(on_done)
+            future.add_done_callback(
+                lambda f: f.cancelled() and self._loop.call_soon_threadsafe(task.cancel))
+
+        self._loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+        return future
+
+    def run(self, coro):
+        """在引擎事件循环中运行协程并同步等待结果；等待被中断时取消协程"""
+        future = self.spawn(coro)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def close(self) -> None:
+        """关闭异步客户端并停止事件循环"""
+        async def _close_clients():
+            for async_client in self._clients.values():
+                await async_client.close()
+            self._clients.clear()
+
+        if not self._loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(_close_clients(), self._loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"关闭异步客户端时发生错误: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop.close()
+
+
+def configure_rate_limiter(max_concurrency: int, initial_concurrency: Optional[int] = None,
+                           requests_per_minute: int = 0, tokens_per_minute: int = 0) -> None:
+    """
+    配置全局限流器
+
+    Args:
+        max_concurrency: 并发上限的最大值，AIMD 不会超过它；小于等于0表示不限制
+        initial_concurrency: 初始并发上限，默认等于 max_concurrency
+        requests_per_minute: 每分钟请求数上限，0表示不限制
+        tokens_per_minute: 每分钟 token 数上限，0表示不限制
+    """
+    global _limiter, _max_concurrency
+    with _slots_lock:
+        _max_concurrency = max(max_concurrency, 0)
+        if max_concurrency <= 0 and requests_per_minute <= 0 and tokens_per_minute <= 0:
+            _limiter = None
+        else:
+            _limiter = AdaptiveRateLimiter(
+                max_concurrency if max_concurrency > 0 else 1 << 16,
+                initial_concurrency=initial_concurrency,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+            )
+    logger.debug(
+        f"全局LLM限流: 并发 {initial_concurrency or max_concurrency}/{max_concurrency if max_concurrency > 0 else '不限制'}, "
+        f"RPM {requests_per_minute or '不限制'}, TPM {tokens_per_minute or '不限制'}"
+    )
+
+
+def set_max_concurrency(limit: int) -> None:
+    """
+    设置全局同时进行中的LLM请求数上限，不启用 RPM/TPM 限制
+
+    Args:
+        limit: 最大并发请求数，小于等于0表示不限制
+    """
+    if limit == _max_concurrency and (_limiter is None or _limiter.max_concurrency == limit):
+        return
+    configure_rate_limiter(limit)
+
+
+def get_max_concurrency() -> int:
+    """获取当前的全局并发上限，0表示不限制"""
+    return _max_concurrency
+
+
+def get_rate_limiter() -> Optional[AdaptiveRateLimiter]:
+    """返回当前的全局限流器，未配置时返回None"""
+    return _limiter
+
+
+def enable_async_engine(enabled: bool = True) -> None:
+    """
+    启用或关闭异步引擎
+
+    Args:
+        enabled: True 时所有请求改由异步引擎执行，False 时关闭引擎并回到线程内同步请求
+    """
+    global _engine
+    with _slots_lock:
+        engine = _engine
+        if enabled:
+            if engine is None:
+                _engine = AsyncLLMEngine()
+                logger.info("已启用异步LLM引擎")
+            return
+        _engine = None
+    if engine is not None:
+        engine.close()
+
+
+def get_async_engine() -> Optional[AsyncLLMEngine]:
+    """返回当前的异步引擎，未启用时返回None"""
+    return _engine
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的 token 数：中日韩字符按每字一个，其余按每4个字符一个"""
+    if not text:
+        return 0
+    cjk = len(re.findall(r'[\u3040-\u30ff\u4e00-\u9fff\uac00-\ud7af]', text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _estimate_request_tokens(kwargs: dict) -> int:
+    """估计一次请求消耗的 token 数（提示词 + 最大输出），用于 TPM 限制"""
+    prompt = sum(estimate_tokens(str(m.get("content", ""))) for m in kwargs.get("messages", []))
+    completion = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or prompt
+    return prompt + completion
+
+
+def _parse_retry_after(error: Exception) -> Optional[float]:
+    """从 429 响应头中读取 Retry-After（秒或 HTTP 日期，兼容 retry-after-ms）"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(retry_at.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def _pop_usage_tags(kwargs: dict) -> dict:
+    """取出只用于用量账本的参数，剩余参数原样传给接口"""
+    tags = {
+        "stage": kwargs.pop("stage", "other"),
+        "batch_id": kwargs.pop("batch_id", None),
+        "preamble_tokens": kwargs.pop("preamble_tokens", None),
+    }
+    if tags["preamble_tokens"] is None:
+        tags["preamble_tokens"] = sum(estimate_tokens(str(m.get("content", "")))
+                                      for m in kwargs.get("messages", []) if m.get("role") == "system")
+    return tags
+
+
+def _record_usage(tags: dict, model: Optional[str], start: float,
+                  response=None, error: Optional[BaseException] = None) -> None:
+    """把一次请求记入用量账本，失败的请求没有 usage，token 记为0"""
+    usage = getattr(response, "usage", None)
+    if error is None:
+        outcome = "ok"
+    elif isinstance(error, openai.RateLimitError):
+        outcome = "rate_limited"
+    else:
+        outcome = type(error).__name__
+    latency = time.monotonic() - start
+    get_ledger().record(
+        tags["stage"], tags["batch_id"], model,
+        prompt_tokens=getattr(usage, "prompt_tokens", None) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", None) or 0,
+        preamble_tokens=tags["preamble_tokens"],
+        latency=latency,
+        outcome=outcome,
+    )
+    _notify_request(latency, error)
+
+
+def _report_outcome(limiter: AdaptiveRateLimiter, estimated: int, start: float,
+                    response=None, error: Optional[BaseException] = None) -> None:
+    """把请求结果反馈给限流器，并记录成功请求的耗时"""
+    if error is None:
+        latency = time.monotonic() - start
+        _record_latency(latency)
+        limiter.release(latency, estimated, _usage_tokens(response))
+    elif isinstance(error, openai.RateLimitError):
+        limiter.on_overload(_parse_retry_after(error))
+    elif isinstance(error, (openai.InternalServerError, openai.APITimeoutError)):
+        limiter.on_overload(rate_limited=False)
+    else:
+        limiter.release_failed()
+
+
+def _retry_delay(error: BaseException, attempt: int, limiter: Optional[AdaptiveRateLimiter]) -> Optional[float]:
+    """按重试策略决定接口错误是否重试，返回重试前的等待秒数，不重试时返回None"""
+    rate_limited = isinstance(error, openai.RateLimitError)
+    delay = get_retry_policy().retry_delay(error, attempt, _parse_retry_after(error) if rate_limited else None)
+    if delay is None:
+        return None
+    if rate_limited and limiter is not None:
+        # 限流器已经按 Retry-After 暂停发放许可，由 acquire 等待
+        return 0.0
+    if not rate_limited:
+        logger.warning(f"LLM请求失败，{delay:.1f}s 后第{attempt}次重试: {error}")
+    return delay
+
+
+def _request_finished(limiter: Optional[AdaptiveRateLimiter], tags: dict, model: Optional[str],
+                      estimated: int, start: float, response=None,
+                      error: Optional[BaseException] = None) -> None:
+    """记录一次请求的用量和耗时，并把结果反馈给限流器"""
+    _record_usage(tags, model, start, response=response, error=error)
+    if limiter is not None:
+        _report_outcome(limiter, estimated, start, response=response, error=error)
+    elif error is None:
+        _record_latency(time.monotonic() - start)
+
+
+class StreamInterruptedError(Exception):
+    """流式请求在已经输出部分内容后中断，已交给回调的输出无法撤回，网关不再重试"""
+
+
+class _StreamCollector:
+    """拼接流式响应的各段输出，并把每段新输出交给回调"""
+
+    def __init__(self, on_delta: Callable[[str], Optional[bool]]):
+        self.on_delta = on_delta
+        self.parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.usage = None
+        self.aborted = False
+
+    def add(self, chunk) -> bool:
+        """处理一个流式分块，回调要求中止时返回False"""
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        for choice in chunk.choices or []:
+            if choice.index != 0:
+                continue
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+            text = choice.delta.content if choice.delta is not None else None
+            if not text:
+                continue
+            self.parts.append(text)
+            if self.on_delta(text) is False:
+                self.aborted = True
+                return False
+        return True
+
+    def completion(self, model: Optional[str]) -> ChatCompletion:
+        """拼接后的结果，用法与非流式请求返回的 ChatCompletion 相同；提前中止时 finish_reason 为None"""
+        message = ChatCompletionMessage.model_construct(role="assistant", content="".join(self.parts))
+        choice = Choice.model_construct(index=0, message=message,
+                                        finish_reason=None if self.aborted else self.finish_reason)
+        return ChatCompletion.model_construct(id="", object="chat.completion", created=int(time.time()),
+                                              model=model or "", choices=[choice], usage=self.usage)
+
+
+def _create_stream(client, collector: _StreamCollector, **kwargs) -> ChatCompletion:
+    """在当前线程中发出流式请求并读完（或在回调要求时提前关闭）"""
+    with client.chat.completions.create(stream=True, **kwargs) as stream:
+        for chunk in stream:
+            if not collector.add(chunk):
+                break
+    return collector.completion(kwargs.get("model"))
+
+
+def _complete(client, kwargs: dict, send: Callable[..., ChatCompletion]) -> ChatCompletion:
+    """在全局限流器的许可下执行 send(client, **kwargs)，接口错误按重试策略重试"""
+    limiter = _limiter
+    tags = _pop_usage_tags(kwargs)
+    model = kwargs.get("model")
+    # SDK 自带的重试会绕过限流器和重试预算，改为关闭后由这里统一处理
+    client = client.with_options(max_retries=0)
+    estimated = _estimate_request_tokens(kwargs) if limiter is not None else 0
+    attempt = 1
+    while True:
+        if limiter is not None:
+            with tracing.span("rate_limit_wait", cat="llm"):
+                limiter.acquire(estimated)
+        start = time.monotonic()
+        try:
+            with tracing.span("llm_request", cat="llm", model=model, stage=tags["stage"], attempt=attempt):
+                response = send(client, **kwargs)
+        except Exception as e:
+            _request_finished(limiter, tags, model, estimated, start, error=e)
+            delay = None if isinstance(e, StreamInterruptedError) else _retry_delay(e, attempt, limiter)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException as e:
+            _request_finished(limiter, tags, model, estimated, start, error=e)
+            raise
+        _request_finished(limiter, tags, model, estimated, start, response=response)
+        return response
+
+
+def chat_completion(client, **kwargs):
+    """
+    在全局限流器的许可下调用 chat.completions.create，接口错误按重试策略重试
+
+    Args:
+        client: OpenAI 客户端
+        **kwargs: 透传给 chat.completions.create 的参数；另外可传入只用于用量账本的
+            stage（阶段名）、batch_id（批次编号）和 preamble_tokens（每批重复的提示词 token 数，
+            默认按系统提示词估计）
+
+    Returns:
+        接口返回的 ChatCompletion 对象
+    """
+    engine = _engine
+    if engine is not None:
+        return engine.run(_acomplete(engine, client, kwargs))
+    return _complete(client, kwargs, lambda client, **kwargs: client.chat.completions.create(**kwargs))
+
+
+def _interrupted(collector: _StreamCollector, error: Exception) -> Exception:
+    """已经有输出交给回调之后的错误改为 StreamInterruptedError，网关不再重试"""
+    if collector.parts:
+        return StreamInterruptedError(f"流式响应在输出 {len(collector.parts)} 段后中断: {error}")
+    return error
+
+
+def stream_completion(client, on_delta: Callable[[str], Optional[bool]], **kwargs) -> ChatCompletion:
+    """
+    以流式请求调用 chat.completions.create，每收到一段输出就调用一次 on_delta(text)
+
+    限流许可在整个生成过程中持有，用量和耗时在流结束后记录（请求 include_usage，
+    服务商不返回用量时记为0）。on_delta 返回 False 时立即关闭连接、停止生成。
+    还没有收到输出时的接口错误按重试策略重试；已经有输出交给 on_delta 之后出错时
+    抛出 StreamInterruptedError，由调用方根据已收到的内容决定如何补救。
+
+    Args:
+        client: OpenAI 客户端
+        on_delta: 输出回调；启用异步引擎时在引擎的事件循环线程中调用
+        **kwargs: 同 chat_completion
+
+    Returns:
+        由各段输出拼接而成的 ChatCompletion 对象；提前中止时 finish_reason 为None
+    """
+    engine = _engine
+    if engine is not None:
+        return engine.run(_astream(engine, client, on_delta, kwargs))
+    kwargs.setdefault("stream_options", {"include_usage": True})
+
+    def send(client, **kwargs):
+        collector = _StreamCollector(on_delta)
+        try:
+            return _create_stream(client, collector, **kwargs)
+        except Exception as e:
+            error = _interrupted(collector, e)
+            if error is e:
+                raise
+            raise error from e
+
+    return _complete(client, kwargs, send)
+
+
+async def _acomplete(engine: AsyncLLMEngine, client, kwargs: dict,
+                     send: Optional[Callable[..., Awaitable[ChatCompletion]]] = None) -> ChatCompletion:
+    """_complete 的协程版本：在事件循环中等待限流许可，通过异步引擎发出 send(client, **kwargs)"""
+    send = send or engine.arequest
+    limiter = _limiter
+    tags = _pop_usage_tags(kwargs)
+    model = kwargs.get("model")
+    client = client.with_options(max_retries=0)
+    estimated = _estimate_request_tokens(kwargs) if limiter is not None else 0
+    attempt = 1
+    while True:
+        if limiter is not None:
+            with tracing.async_span("rate_limit_wait", cat="llm"):
+                await limiter.acquire_async(estimated)
+        start = time.monotonic()
+        try:
+            with tracing.async_span("llm_request", cat="llm", model=model, stage=tags["stage"], attempt=attempt):
+                response = await send(client, **kwargs)
+        except Exception as e:
+            _request_finished(limiter, tags, model, estimated, start, error=e)
+            delay = None if isinstance(e, StreamInterruptedError) else _retry_delay(e, attempt, limiter)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException as e:
+            # 包括协程被取消：许可随请求结果一起归还，不会泄漏
+            _request_finished(limiter, tags, model, estimated, start, error=e)
+            raise
+        _request_finished(limiter, tags, model, estimated, start, response=response)
+        return response
+
+
+async def _astream(engine: AsyncLLMEngine, client, on_delta: Callable[[str], Optional[bool]],
+                   kwargs: dict) -> ChatCompletion:
+    """stream_completion 的协程版本"""
+    kwargs.setdefault("stream_options", {"include_usage": True})
+
+    async def send(client, **kwargs):
+        collector = _StreamCollector(on_delta)
+        try:
+            return await engine.arequest_stream(client, collector, **kwargs)
+        except Exception as e:
+            error = _interrupted(collector, e)
+            if error is e:
+                raise
+            raise error from e
+
+    return await _acomplete(engine, client, kwargs, send)
+
+
+def _require_engine() -> AsyncLLMEngine:
+    """返回异步引擎，未启用时临时启用"""
+    engine = _engine
+    if engine is None:
+        enable_async_engine(True)
+        engine = _engine
+        if engine is None:
+            # 其他线程在启用后立即关闭了引擎
+            raise RuntimeError("异步LLM引擎已关闭，无法发出请求")
+    return engine
+
+
+async def achat_completion(client, **kwargs):
+    """
+    chat_completion 的协程版本，可在任意事件循环中等待
+
+    未启用异步引擎时会临时启用；限流许可直接在调用方的事件循环中等待，不占用线程
+    """
+    engine = _require_engine()
+    return await _acomplete(engine, client, kwargs)
+
+
+async def astream_completion(client, on_delta: Callable[[str], Optional[bool]], **kwargs) -> ChatCompletion:
+    """
+    stream_completion 的协程版本，可在任意事件循环中等待；未启用异步引擎时会临时启用
+
+    on_delta 在引擎的事件循环线程中调用
+    """
+    engine = _require_engine()
+    return await _astream(engine, client, on_delta, kwargs)
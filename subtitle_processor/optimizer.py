@@ -1,10 +1,12 @@
 from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import json
+import math
 import re
-from typing import Dict, Optional, List
+import time
+from typing import Dict, Iterable, Optional, List, Set, Tuple, Union
 import concurrent.futures
 
-import retry
 from openai import OpenAI
 
 from .prompts import (
@@ -12,12 +14,27 @@ from .prompts import (
     REFLECT_TRANSLATE_PROMPT,
     SINGLE_TRANSLATE_PROMPT
 )
+from .batch_budget import BatchBudget, estimate_line_tokens
 from .config import SubtitleConfig
-from utils.json_repair import parse_llm_response
+from .data import SubtitleSegment
+from .cache import TranslationCache
+from .journal import BatchJournal
+from .llm_client import (
+    achat_completion, astream_completion, chat_completion, estimate_tokens, get_async_engine, get_client,
+    stream_completion
+)
+from .retry_policy import ErrorClass, classify_error, get_retry_policy
+from .summarizer import section_summary
+from .usage_ledger import propagate
+from utils import tracing
+from utils.json_repair import StreamingRecordParser, parse_llm_records
 from utils.logger import setup_logger
 
 logger = setup_logger("subtitle_optimizer")
 
+# 批次结果中每条记录必须包含的字段，缺少时该字幕在补请求中重新翻译
+BATCH_REQUIRED_FIELDS = ("optimized_subtitle", "translation")
+
 def is_sentence_complete(text: str) -> bool:
     """
     检查句子是否完整
@@ -61,19 +78,42 @@ class SubtitleOptimizer:
     def __init__(
         self,
         config: Optional[SubtitleConfig] = None,
-        need_reflect: bool = False
+        need_reflect: bool = False,
+        client: Optional[OpenAI] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+        cache: Optional[TranslationCache] = None,
+        journal: Optional[BatchJournal] = None,
+        batch_budget: Optional[BatchBudget] = None
     ):
         self.config = config or SubtitleConfig()
         self.need_reflect = need_reflect
-        self.client = OpenAI(
-            base_url=self.config.openai_base_url,
-            api_key=self.config.openai_api_key
-        )
+        self.client = client or get_client(self.config)
         self.thread_num = self.config.thread_num
         self.batch_num = self.config.batch_size
-        self.executor = ThreadPoolExecutor(max_workers=self.thread_num)
+        # 按 token 预算确定批次大小，为None时按 batch_num 固定条数分批
+        if batch_budget is None and self.config.batch_token_budget > 0:
+            batch_budget = BatchBudget(self.config.batch_token_budget)
+        self.batch_budget = batch_budget
+        # 外部传入的线程池由调用方负责关闭，便于在多个文件之间复用
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=self.thread_num)
+        # 批次翻译结果缓存，为None时不使用缓存
+        self.cache = cache
+        # 整个运行共享的重试策略（错误分类、退避和重试预算）
+        self.retry_policy = get_retry_policy()
+        # 流式翻译中每个批次从发出请求到第一条记录完成的时间（秒），以及因偏离格式提前中止的次数
+        self.first_record_latencies: List[float] = []
+        self.stream_aborts = 0
+        # 断点日志，记录已完成的翻译批次以便中断后续传
+        self.journal = journal
         # 改用字典存储日志，使用ID作为键以自动去重
         self.batch_logs = {}
+        # 已经单条翻译过、或拆分重试时放弃的字幕ID，_finish_translation 不再单条重试
+        self._settled_failures: Set[str] = set()
+        # translate_stream 中第一个翻译批次等待摘要的时间（秒）
+        self.summary_wait = 0.0
+        # 字幕ID -> 开始时间，用于为每个批次选取所在时间段的分段总结
+        self._start_times: Dict[str, int] = {}
 
     def translate(self, asr_data, summary_content: Dict) -> List[Dict]:
         """
@@ -87,61 +127,138 @@ class SubtitleOptimizer:
         try:
             # 清空之前的日志
             self.batch_logs.clear()
+            self._settled_failures.clear()
             
+            subtitle_data = asr_data.to_json()
             subtitle_json = {str(k): v["original_subtitle"] 
-                            for k, v in asr_data.to_json().items()}
+                            for k, v in subtitle_data.items()}
+            self._start_times = {str(k): v["start_time"] for k, v in subtitle_data.items()}
             
             # 使用多线程批量翻译
             result = self.translate_multi_thread(subtitle_json, self.need_reflect, summary_content)
-
-            # 检查是否有翻译失败的字幕（带有[翻译失败]前缀）
-            failed_subtitles = {}
-            for k, v in result["translated_subtitles"].items():
-                if isinstance(v, str) and v.startswith("[翻译失败]"):
-                    failed_subtitles[k] = subtitle_json[k]
-                elif isinstance(v, dict) and v.get("translation", "").startswith("[翻译失败]"):
-                    failed_subtitles[k] = subtitle_json[k]
-            
-            # 如果有翻译失败的字幕，使用单条翻译再次尝试
-            if failed_subtitles:
-                logger.info(f"发现{len(failed_subtitles)}个字幕翻译失败，使用单条翻译再次尝试")
-                retry_result = self._translate_chunk_by_single(failed_subtitles)
-                
-                # 更新结果
-                for k, v in retry_result["translated_subtitles"].items():
-                    if not v.startswith("[翻译失败]"):
-                        logger.info(f"字幕ID {k} 单条翻译成功")
-                        result["optimized_subtitles"][str(k)] = retry_result["optimized_subtitles"][k]
-                        result["translated_subtitles"][str(k)] = v
-
-            # 转换结果格式
-            translated_subtitle = []
-            for k, v in result["optimized_subtitles"].items():
-                translated_text = {
-                    "id": int(k),
-                    "original": subtitle_json[str(k)],
-                    "optimized": v,
-                    "translation": result["translated_subtitles"][k]
-                }
-                # 如果是反思模式，添加反思相关的字段
-                if self.need_reflect and isinstance(result["translated_subtitles"][k], dict):
-                    translated_text.update({
-                        "revised_translation": result["translated_subtitles"][k].get("revised_translation"),
-                        "revise_suggestions": result["translated_subtitles"][k].get("revise_suggestions"),
-                        "translation": result["translated_subtitles"][k].get("translation")
-                    })
-                translated_subtitle.append(translated_text)
-            
-            # logger.info(f"翻译结果: {json.dumps(translated_subtitle, indent=4, ensure_ascii=False)}")
-            
-            # 所有批次处理完成后，统一输出日志
-            self._print_all_batch_logs()
-            return translated_subtitle
+            return self._finish_translation(subtitle_json, result)
         finally:
             self.stop()  # 确保线程池被关闭
 
+    def translate_stream(self, segment_batches: Iterable[List[SubtitleSegment]],
+                         summary_content: Union[Dict, concurrent.futures.Future]
+                         ) -> Tuple[List[SubtitleSegment], List[Dict]]:
+        """
+        边断句边翻译
+
+        segment_batches 按时间顺序给出已经定稿的字幕段，每收到一批就按顺序编号，
+        并立即提交其中边界已经确定的翻译批次，不必等待全部断句完成。
+        批次划分与一次性调用 translate 相同。
+
+        Args:
+            segment_batches: 依次产生字幕段列表的可迭代对象
+            summary_content: 总结内容，或尚未完成的摘要 Future（提交第一个翻译批次前才等待，
+                等待时间记录在 summary_wait 中）
+        Returns:
+            (全部字幕段, 翻译结果列表)
+        """
+        try:
+            self.batch_logs.clear()
+            self._settled_failures.clear()
+            self._adjusted_batch_count = 0
+            subtitle_json = {}
+            self._start_times = {}
+            segments = []
+            items = []
+            planned = 0
+            state = self._new_batch_state()
+            try:
+                for batch in segment_batches:
+                    for segment in batch:
+                        segments.append(segment)
+                        key = str(len(segments))
+                        subtitle_json[key] = segment.text.split("\n", 1)[0]
+                        self._start_times[key] = segment.start_time
+                        items.append((key, subtitle_json[key]))
+                    chunks, planned = self._plan_chunks(items, planned, final=False)
+                    if chunks:
+                        summary_content = self._resolve_summary(summary_content)
+                    self._submit_chunks(chunks, state, self.need_reflect, summary_content)
+            except BaseException:
+                # 断句失败时取消尚未开始的翻译批次
+                for future in state["futures"]:
+                    future.cancel()
+                raise
+            chunks, planned = self._plan_chunks(items, planned, final=True)
+            summary_content = self._resolve_summary(summary_content)
+            self._submit_chunks(chunks, state, self.need_reflect, summary_content)
+            logger.info(f"断句完成，共{len(segments)}条字幕，{state['submitted'] + state['restored']}个翻译批次")
+
+            batch_result = self._collect_chunks(state)
+            result = self.translate_multi_thread(subtitle_json, self.need_reflect, summary_content,
+                                                 batch_result=batch_result)
+            return segments, self._finish_translation(subtitle_json, result)
+        finally:
+            self.stop()
+
+    def _resolve_summary(self, summary_content):
+        """摘要仍在请求中时等待其完成"""
+        if not isinstance(summary_content, concurrent.futures.Future):
+            return summary_content
+        start = time.perf_counter()
+        result = summary_content.result()
+        self.summary_wait = time.perf_counter() - start
+        if self.summary_wait >= 0.1:
+            logger.info(f"等待摘要 {self.summary_wait:.1f}s 后开始提交翻译批次")
+        return result
+
+    def _finish_translation(self, subtitle_json: Dict[str, str], result: Dict) -> List[Dict]:
+        """对失败的字幕做单条重试，并转换为翻译结果列表"""
+        # 检查是否有翻译失败的字幕（带有[翻译失败]前缀）
+        failed_subtitles = {}
+        for k, v in result["translated_subtitles"].items():
+            if k in self._settled_failures:
+                continue
+            if isinstance(v, str) and v.startswith("[翻译失败]"):
+                failed_subtitles[k] = subtitle_json[k]
+            elif isinstance(v, dict) and v.get("translation", "").startswith("[翻译失败]"):
+                failed_subtitles[k] = subtitle_json[k]
+        
+        # 如果有翻译失败的字幕，使用单条翻译再次尝试
+        if failed_subtitles:
+            logger.info(f"发现{len(failed_subtitles)}个字幕翻译失败，使用单条翻译再次尝试")
+            retry_result = self._translate_chunk_by_single(failed_subtitles)
+            
+            # 更新结果
+            for k, v in retry_result["translated_subtitles"].items():
+                if not v.startswith("[翻译失败]"):
+                    logger.info(f"字幕ID {k} 单条翻译成功")
+                    result["optimized_subtitles"][str(k)] = retry_result["optimized_subtitles"][k]
+                    result["translated_subtitles"][str(k)] = v
+
+        # 转换结果格式
+        translated_subtitle = []
+        for k, v in result["optimized_subtitles"].items():
+            translated_text = {
+                "id": int(k),
+                "original": subtitle_json[str(k)],
+                "optimized": v,
+                "translation": result["translated_subtitles"][k]
+            }
+            # 如果是反思模式，添加反思相关的字段
+            if self.need_reflect and isinstance(result["translated_subtitles"][k], dict):
+                translated_text.update({
+                    "revised_translation": result["translated_subtitles"][k].get("revised_translation"),
+                    "revise_suggestions": result["translated_subtitles"][k].get("revise_suggestions"),
+                    "translation": result["translated_subtitles"][k].get("translation")
+                })
+            translated_subtitle.append(translated_text)
+        
+        # logger.info(f"翻译结果: {json.dumps(translated_subtitle, indent=4, ensure_ascii=False)}")
+        
+        # 所有批次处理完成后，统一输出日志
+        self._print_all_batch_logs()
+        return translated_subtitle
+
     def stop(self):
         """优雅关闭线程池"""
+        if not self._owns_executor:
+            return
         if hasattr(self, 'executor'):
             try:
                 logger.info("正在等待线程池任务完成...")
@@ -153,26 +270,20 @@ class SubtitleOptimizer:
                 self.executor = None
 
     def translate_multi_thread(self, subtitle_json: Dict[int, str], reflect: bool = False, 
-                             summary_content: Dict = None):
-        """多线程批量翻译字幕"""
+                             summary_content: Dict = None, batch_result: Optional[tuple] = None):
+        """多线程批量翻译字幕
+
+        batch_result 为已经完成的批量翻译结果（translate_stream 边断句边提交批次时传入），
+        此时只处理其中失败的批次
+        """
         if reflect:
             try:
-                result, failed_chunks = self._batch_translate(subtitle_json, use_reflect=True, summary_content=summary_content)
+                result, failed_chunks = batch_result or self._batch_translate(subtitle_json, use_reflect=True, summary_content=summary_content)
                 
-                # 如果有失败的批次，使用单条翻译处理
+                # 如果有失败的批次，拆分后重新按批次翻译
                 if failed_chunks:
-                    logger.info(f"有{len(failed_chunks)}个反思翻译批次失败，使用单条翻译处理这些批次")
-                    # 将失败的批次合并成一个字典
-                    failed_subtitles = {}
-                    for chunk in failed_chunks:
-                        failed_subtitles.update(chunk)
-                    
-                    # 只对失败的字幕使用单条翻译
-                    single_result = self._translate_by_single(failed_subtitles)
-                    
-                    # 合并结果
-                    result["optimized_subtitles"].update(single_result["optimized_subtitles"])
-                    result["translated_subtitles"].update(single_result["translated_subtitles"])
+                    logger.info(f"有{len(failed_chunks)}个反思翻译批次失败，拆分后重新翻译这些批次")
+                    self._recover_failed_chunks(result, failed_chunks, True, summary_content)
                 
                 return result
             except Exception as e:
@@ -181,45 +292,124 @@ class SubtitleOptimizer:
         
         try:
             # 尝试批量翻译
-            result, failed_chunks = self._batch_translate(subtitle_json, use_reflect=False, summary_content=summary_content)
+            result, failed_chunks = batch_result or self._batch_translate(subtitle_json, use_reflect=False, summary_content=summary_content)
             
-            # 如果有失败的批次，使用单条翻译处理
+            # 如果有失败的批次，拆分后重新按批次翻译
             if failed_chunks:
-                logger.info(f"有{len(failed_chunks)}个批次翻译失败，使用单条翻译处理这些批次")
-                # 将失败的批次合并成一个字典
-                failed_subtitles = {}
-                for chunk in failed_chunks:
-                    failed_subtitles.update(chunk)
-                
-                # 只对失败的字幕使用单条翻译
-                single_result = self._translate_by_single(failed_subtitles)
-                
-                # 合并结果
-                result["optimized_subtitles"].update(single_result["optimized_subtitles"])
-                result["translated_subtitles"].update(single_result["translated_subtitles"])
+                logger.info(f"有{len(failed_chunks)}个批次翻译失败，拆分后重新翻译这些批次")
+                self._recover_failed_chunks(result, failed_chunks, False, summary_content)
             
             return result
         except Exception as e:
             logger.error(f"批量翻译完全失败，使用单条翻译处理所有内容：{e}")
             return self._translate_by_single(subtitle_json)
 
-    def _batch_translate(self, subtitle_json: Dict[int, str], use_reflect: bool = False, 
-                         summary_content: Dict = None) -> tuple[Dict, list]:
-        """批量翻译字幕的核心方法
-        
+    def _recover_failed_chunks(self, result: Dict, failed_chunks: List[Tuple[Dict, BaseException]],
+                               use_reflect: bool, summary_content: Dict) -> None:
+        """
+        恢复失败的批次，结果合并到 result
+
+        失败的批次拆分后各自作为批次重新翻译，仍然失败的继续拆分，直到只剩一条字幕；
+        至少对半拆分，批次 token 预算因截断或失败降低后按当前预算拆成更多份。
+        一个失败批次中的单条坏字幕只需要 O(log n) 次额外请求。拆到单条仍失败的字幕
+        最后使用单条翻译。拆分和提交都在调用线程中进行，线程池任务（或引擎中的协程）不会互相等待。
+
+        超出上下文长度时总是拆分；其他错误的每次拆分占用一次重试预算。预算用完（服务端故障）
+        或遇到致命错误时，批次中的字幕直接标记为翻译失败，不再拆分，也不改用单条翻译，
+        避免故障期间成倍增加请求。
+        """
+        pending = {}
+        leftovers = {}
+        abandoned = {}
+
+        def bisect(chunk: Dict[str, str], error: BaseException) -> None:
+            error_class = classify_error(error)
+            if error_class is ErrorClass.FATAL:
+                abandoned.update(chunk)
+                return
+            if len(chunk) == 1:
+                leftovers.update(chunk)
+                return
+            if error_class is not ErrorClass.SPLIT and not self.retry_policy.spend():
+                abandoned.update(chunk)
+                return
+            for half in self._split_failed_chunk(chunk, use_reflect):
+                future = self._submit_batch(use_reflect, "translate_bisect", half,
+                                            self._chunk_summary(half, summary_content))
+                pending[future] = half
+
+        for chunk, error in failed_chunks:
+            bisect(chunk, error)
+
+        recovered = 0
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                half = pending.pop(future)
+                keys = sorted(map(int, half))
+                try:
+                    self._add_batch_result(result, future.result())
+                    recovered += len(half)
+                except Exception as e:
+                    logger.warning(f"拆分批次 {keys[0]} - {keys[-1]} 翻译失败：{e}")
+                    bisect(half, e)
+
+        if recovered:
+            logger.info(f"拆分重试恢复了{recovered}条字幕")
+        if leftovers:
+            logger.info(f"有{len(leftovers)}条字幕拆分后仍然失败，使用单条翻译处理")
+            single_result = self._translate_by_single(leftovers)
+            result["optimized_subtitles"].update(single_result["optimized_subtitles"])
+            result["translated_subtitles"].update(single_result["translated_subtitles"])
+        if abandoned:
+            logger.warning(f"有{len(abandoned)}条字幕遇到致命错误或重试预算已用完，不再重试，标记为翻译失败")
+            for key, text in abandoned.items():
+                result["optimized_subtitles"][key] = text
+                result["translated_subtitles"][key] = f"[翻译失败] {text}"
+            self._settled_failures.update(abandoned)
+
+    def _split_failed_chunk(self, chunk: Dict[str, str], use_reflect: bool) -> List[Dict[str, str]]:
+        """把失败的批次拆成至少两份；份数按当前的批次预算确定，每份条数尽量相等"""
+        items = list(chunk.items())
+        parts = 2
+        if self.batch_budget is not None:
+            cost = sum(estimate_line_tokens(text, use_reflect) for _, text in items)
+            parts = max(parts, math.ceil(cost / self.batch_budget.current()))
+        parts = min(parts, len(items))
+        size, extra = divmod(len(items), parts)
+        pieces = []
+        start = 0
+        for index in range(parts):
+            end = start + size + (index < extra)
+            pieces.append(dict(items[start:end]))
+            start = end
+        return pieces
+
+    def _plan_chunks(self, items: List[Tuple[str, str]], start: int, final: bool = True) -> Tuple[List[Dict], int]:
+        """从 start 开始切分翻译批次，并把批次边界调整到完整句子处
+
+        Args:
+            items: (字幕ID, 文本) 列表，流式处理时会继续增长
+            start: 尚未分批的第一条字幕的位置
+            final: 为False时只切分向后查找范围内的字幕都已到达的批次，
+                分批预算不变时保证与拿到全部字幕后一次性切分的结果相同
+
         Returns:
-            tuple: (翻译结果字典, 失败批次列表)
+            (新切分的批次列表, 下一个批次的起始位置)
         """
-        items = list(subtitle_json.items())[:]
-        
-        # 修改批次切分逻辑，确保每个批次的最后一句是完整的
         chunks = []
-        i = 0
-        self._adjusted_batch_count = 0  # 初始化调整计数器
+        i = start
+        max_lines = self.batch_num * 2 if self.batch_budget else self.batch_num
+        # 向后查找完整句子时最多访问到 i + 1.5 倍批次大小 + 1 的位置
+        lookahead = int(max_lines * 1.5) + 2
         
         while i < len(items):
+            if not final and len(items) - i <= lookahead:
+                break
+
             # 确定当前批次的结束位置
-            end_idx = min(i + self.batch_num, len(items))
+            batch_num = self._batch_lines(items, i, max_lines)
+            end_idx = min(i + batch_num, len(items))
             
             # 如果不是最后一个批次，检查最后一句是否完整
             if end_idx < len(items):
@@ -247,7 +437,7 @@ class SubtitleOptimizer:
                             complete_idx += 1
                             
                             # 设置一个合理的向后查找限制，避免批次过大
-                            if complete_idx - i > self.batch_num * 1.5:
+                            if complete_idx - i > batch_num * 1.5:
                                 break
                         
                         if complete_idx < len(items):
@@ -263,139 +453,215 @@ class SubtitleOptimizer:
             # 更新起始位置
             i = end_idx
         
-        # 记录批次信息
-        logger.info(f"开始批量翻译任务: 预设每批次{self.batch_num}条字幕")
-        logger.info(f"共{len(chunks)}个批次, 平均{sum(len(chunk) for chunk in chunks)/len(chunks):.0f}条字幕")
-        
-        adjusted_count = getattr(self, '_adjusted_batch_count', 0)
-        if adjusted_count > 0:
-            logger.info(f"有{adjusted_count}个批次因句子不完整而进行了调整，确保句子完整性")
-        
-        # 检查是否达到最大线程限制
-        actual_threads = min(len(chunks), self.thread_num)
-        if actual_threads < self.thread_num:
-            logger.info(f"实际使用线程数: {actual_threads}/{self.thread_num}")
+        return chunks, i
+
+    def _batch_lines(self, items: List[Tuple[str, str]], start: int, max_lines: int) -> int:
+        """
+        从 start 开始，估计 token 不超过当前分批预算的字幕条数（至少1条）
+
+        分批预算是取整到固定档位的当前预算，预算在同一档位内波动时批次不变，
+        缓存和断点日志的键保持稳定
+        """
+        if self.batch_budget is None:
+            return self.batch_num
+        budget = self.batch_budget.planning_budget()
+        cost = 0
+        count = 0
+        for _, text in items[start:start + max_lines]:
+            cost += estimate_line_tokens(text, self.need_reflect)
+            if count and cost > budget:
+                break
+            count += 1
+        return count
+
+    def _record_batch_outcome(self, response, batch_size: int, ok: bool) -> None:
+        """把批次结果反馈给 token 预算：截断、失败或成功"""
+        if self.batch_budget is None:
+            return
+        choices = getattr(response, "choices", None)
+        if choices and getattr(choices[0], "finish_reason", None) == "length":
+            self.batch_budget.record_truncated(batch_size)
+        elif ok:
+            self.batch_budget.record_success()
         else:
-            logger.info(f"实际使用线程数: {actual_threads}/{self.thread_num} (已达到配置的最大线程数)")
-        
-        # 创建翻译任务
-        futures = []
-        chunk_map = {}  # 用于记录future和chunk的对应关系
-        
-        for i, chunk in enumerate(chunks):
-            if use_reflect:
-                future = self.executor.submit(self._reflect_translate, chunk, summary_content, i+1, len(chunks))
+            self.batch_budget.record_failure()
+
+    def _new_batch_state(self) -> Dict:
+        """已提交批次的记录：future 与批次、断点日志键的对应关系，以及从断点日志恢复的结果"""
+        return {
+            "futures": [],
+            "chunk_map": {},  # 用于记录future和chunk的对应关系
+            "journal_keys": {},  # 用于记录future和断点日志键的对应关系
+            "restored_results": [],
+            "restored": 0,
+            "submitted": 0,
+        }
+
+    def _submit_chunks(self, chunks: List[Dict], state: Dict, use_reflect: bool,
+                       summary_content: Dict, total_batches: Optional[int] = None) -> None:
+        """提交翻译批次，断点日志中已完成的批次直接复用"""
+        for chunk in chunks:
+            batch_num = state["submitted"] + state["restored"] + 1
+            journal_key = self._batch_journal_key(chunk, use_reflect)
+            journaled = self.journal.get("translate", journal_key) if journal_key else None
+            if journaled is not None:
+                state["restored_results"].append(journaled)
+                state["restored"] += 1
+                continue
+            future = self._submit_batch(use_reflect, "translate_batch", chunk,
+                                        self._chunk_summary(chunk, summary_content), batch_num, total_batches)
+            state["futures"].append(future)
+            state["chunk_map"][future] = chunk
+            state["journal_keys"][future] = journal_key
+            state["submitted"] += 1
+
+    def _submit_batch(self, use_reflect: bool, name: str, *args) -> concurrent.futures.Future:
+        """提交一个翻译批次：启用异步引擎时作为协程在引擎事件循环中执行，否则提交到线程池"""
+        engine = get_async_engine()
+        if engine is not None:
+            task = self._areflect_translate if use_reflect else self._atranslate
+            return engine.spawn(task(*args))
+        task = self._reflect_translate if use_reflect else self._translate
+        return self.executor.submit(propagate(tracing.queued(task, name)), *args)
+
+    def _chunk_summary(self, chunk: Dict[str, str], summary_content: Dict) -> Dict:
+        """分段总结时，每个批次使用其所在时间段的总结"""
+        first_key = next(iter(chunk))
+        if first_key in self._start_times:
+            return section_summary(summary_content, self._start_times[first_key])
+        return summary_content
+
+    @staticmethod
+    def _add_batch_result(result: Dict, translated_subtitle: List[Dict]) -> None:
+        """把一个批次的翻译结果合并到 {"optimized_subtitles", "translated_subtitles"}"""
+        for item in translated_subtitle:
+            k = str(item["id"])
+            result["optimized_subtitles"][k] = item["optimized"]
+            # 保存完整的翻译信息
+            if "revised_translation" in item:
+                result["translated_subtitles"][k] = {
+                    "translation": item["translation"],
+                    "revised_translation": item["revised_translation"],
+                    "revise_suggestions": item["revise_suggestions"]
+                }
             else:
-                future = self.executor.submit(self._translate, chunk, summary_content, i+1, len(chunks))
-            futures.append(future)
-            chunk_map[future] = chunk
-        
+                result["translated_subtitles"][k] = item["translation"]
+
+    def _collect_chunks(self, state: Dict) -> tuple[Dict, list]:
+        """等待已提交的批次完成并汇总结果
+
+        Returns:
+            tuple: (翻译结果字典, 失败批次及其错误的列表)
+        """
         # 收集结果
-        optimized_subtitles = {}
-        translated_subtitles = {}
+        collected = {"optimized_subtitles": {}, "translated_subtitles": {}}
         failed_chunks = []  # 记录失败的批次
+
+        for journaled in state["restored_results"]:
+            for item in journaled:
+                self._collect_batch_log(item)
+            self._add_batch_result(collected, journaled)
+
+        futures = state["futures"]
+        if state["restored"]:
+            logger.info(f"从断点日志恢复{state['restored']}个批次，剩余{len(futures)}个批次需要翻译")
         
         total = len(futures)
         for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
             try:
                 result = future.result()
-                for item in result:
-                    k = str(item["id"])
-                    optimized_subtitles[k] = item["optimized"]
-                    # 保存完整的翻译信息
-                    if "revised_translation" in item:
-                        translated_subtitles[k] = {
-                            "translation": item["translation"],
-                            "revised_translation": item["revised_translation"],
-                            "revise_suggestions": item["revise_suggestions"]
-                        }
-                    else:
-                        translated_subtitles[k] = item["translation"]
+                self._add_batch_result(collected, result)
+                if state["journal_keys"][future] and self._is_batch_complete(result):
+                    self.journal.append("translate", state["journal_keys"][future], result)
                 logger.info(f"批量翻译进度: 第{i}/{total} 已完成翻译")
             except Exception as e:
                 logger.error(f"批量翻译任务失败（批次 {i}/{total}）：{e}")
                 # 记录失败的批次，而不是立即抛出异常
-                failed_chunks.append(chunk_map[future])
+                failed_chunks.append((state["chunk_map"][future], e))
         
         # 返回成功的结果和失败的批次
-        return {
-            "optimized_subtitles": optimized_subtitles,
-            "translated_subtitles": translated_subtitles
-        }, failed_chunks
+        return collected, failed_chunks
 
-    def _translate_by_single(self, subtitle_json: Dict[int, str]) -> Dict:
-        """使用单条翻译模式处理字幕"""
+    def _batch_translate(self, subtitle_json: Dict[int, str], use_reflect: bool = False, 
+                         summary_content: Dict = None) -> tuple[Dict, list]:
+        """批量翻译字幕的核心方法
+        
+        Returns:
+            tuple: (翻译结果字典, 失败批次及其错误的列表)
+        """
         items = list(subtitle_json.items())[:]
-        chunks = [dict(items[i:i + self.batch_num]) 
-                 for i in range(0, len(items), self.batch_num)]
         
-        # 创建翻译任务
-        futures = []
-        chunk_map = {}  # 用于记录future和chunk的对应关系
+        # 修改批次切分逻辑，确保每个批次的最后一句是完整的
+        self._adjusted_batch_count = 0  # 初始化调整计数器
+        chunks, _ = self._plan_chunks(items, 0, final=True)
         
-        for i, chunk in enumerate(chunks):
-            future = self.executor.submit(self._translate_chunk_by_single, chunk)
-            futures.append(future)
-            chunk_map[future] = chunk
+        # 记录批次信息
+        if self.batch_budget:
+            logger.info(f"开始批量翻译任务: 每批次预算{self.batch_budget.planning_budget()} token"
+                        f"（初始{self.batch_budget.initial}），最多{self.batch_num * 2}条字幕")
+        else:
+            logger.info(f"开始批量翻译任务: 预设每批次{self.batch_num}条字幕")
+        logger.info(f"共{len(chunks)}个批次, 平均{sum(len(chunk) for chunk in chunks)/len(chunks):.0f}条字幕")
         
-        # 收集结果
-        optimized_subtitles = {}
-        translated_subtitles = {}
-        total = len(futures)
-        for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
-            try:
-                result = future.result()
-                for k, v in result["optimized_subtitles"].items():
-                    optimized_subtitles[str(k)] = v
-                    translated_subtitles[str(k)] = result["translated_subtitles"][k]
-                logger.info(f"单条翻译进度: 第{i}批次/{total}批次 已完成翻译")
-            except Exception as e:
-                logger.error(f"单条翻译任务失败（批次 {i}/{total}）：{e}")
-                # 处理失败的批次，使用默认翻译
-                failed_chunk = chunk_map[future]
-                for k, v in failed_chunk.items():
-                    optimized_subtitles[str(k)] = v
-                    translated_subtitles[str(k)] = f"[翻译失败] {v}"
-                logger.warning(f"已为失败的批次 {i}/{total} 使用默认翻译")
+        adjusted_count = getattr(self, '_adjusted_batch_count', 0)
+        if adjusted_count > 0:
+            logger.info(f"有{adjusted_count}个批次因句子不完整而进行了调整，确保句子完整性")
         
-        return {
-            "optimized_subtitles": optimized_subtitles,
-            "translated_subtitles": translated_subtitles
-        }
+        # 检查是否达到最大线程限制
+        actual_threads = min(len(chunks), self.thread_num)
+        if actual_threads < self.thread_num:
+            logger.info(f"实际使用线程数: {actual_threads}/{self.thread_num}")
+        else:
+            logger.info(f"实际使用线程数: {actual_threads}/{self.thread_num} (已达到配置的最大线程数)")
+        
+        # 创建翻译任务，断点日志中已完成的批次直接复用
+        state = self._new_batch_state()
+        self._submit_chunks(chunks, state, use_reflect, summary_content, total_batches=len(chunks))
+        return self._collect_chunks(state)
+
+    def _translate_by_single(self, subtitle_json: Dict[int, str]) -> Dict:
+        """使用单条翻译模式处理字幕，仍然失败的字幕不会在 _finish_translation 中再次单条重试"""
+        result = self._translate_chunk_by_single(subtitle_json)
+        self._settled_failures.update(map(str, subtitle_json))
+        failed = sum(1 for v in result["translated_subtitles"].values() if v.startswith("[翻译失败]"))
+        logger.info(f"单条翻译完成: 成功 {len(subtitle_json) - failed}/{len(subtitle_json)} 条")
+        return result
 
-    @retry.retry(tries=2)
+    @tracing.traced("translate_single", cat="translate")
     def _translate_chunk_by_single(self, subtitle_chunk: Dict[int, str]) -> Dict:
-        """单条翻译模式的核心方法"""
-        subtitle_keys = sorted(map(int, subtitle_chunk.keys()))
+        """单条翻译模式的核心方法
+
+        每条字幕一个请求，全部并发执行（并发由限流器控制），耗时约为一次请求的往返时间而不是逐条累加。
+        启用异步引擎时各条请求作为协程在引擎事件循环中 gather，否则提交到共享线程池。
+        需要在调用线程中执行，不能在线程池任务或引擎事件循环中调用。
+        """
         # 修改日志输出，只打印字幕数量而不是范围
-        logger.info(f"[+]正在单条翻译字幕，共{len(subtitle_keys)}条")
-        
+        logger.info(f"[+]正在单条翻译字幕，共{len(subtitle_chunk)}条")
+
+        engine = get_async_engine()
+        if engine is not None:
+            outcomes = engine.run(self._atranslate_lines(subtitle_chunk))
+        else:
+            futures = {
+                self.executor.submit(propagate(tracing.queued(self.retry_policy.call, "translate_line")),
+                                     self._translate_line, key, value, description=f"单条翻译（字幕ID {key}）"): key
+                for key, value in subtitle_chunk.items()
+            }
+            outcomes = {}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    outcomes[futures[future]] = future.result()
+                except Exception as e:
+                    outcomes[futures[future]] = e
+
         translated_subtitle = {}
-        message = [{"role": "system",
-                   "content": SINGLE_TRANSLATE_PROMPT.replace("[TargetLanguage]", self.config.target_language)}]
-        
-        for key, value in subtitle_chunk.items():
-            try:
-                # 为每个字幕ID添加单独的日志
-                logger.info(f"[+]正在翻译字幕ID: {key}")
-                message.append({"role": "user", "content": value})
-                response = self.client.chat.completions.create(
-                    model=self.config.llm_model,
-                    stream=False,
-                    messages=message,
-                    temperature=0.7,
-                    timeout=80
-                    )
-                message.pop()
-                
-                translate = response.choices[0].message.content.strip()
-                translated_subtitle[key] = translate
-                logger.info(f"单条翻译原文: {value}")
-                logger.info(f"单条翻译结果: {translate}")
-            except Exception as e:
-                logger.error(f"单条翻译失败，字幕ID: {key}，错误: {e}")
+        for key, outcome in outcomes.items():
+            if isinstance(outcome, BaseException):
+                logger.error(f"单条翻译失败，字幕ID: {key}，错误: {outcome}")
                 # 使用默认翻译，而不是空字符串，这样用户至少能看到原文
-                translated_subtitle[key] = f"[翻译失败] {value}"
+                translated_subtitle[key] = f"[翻译失败] {subtitle_chunk[key]}"
+            else:
+                translated_subtitle[key] = outcome
         
         # 确保所有字幕都有翻译结果
         for key in subtitle_chunk.keys():
@@ -405,9 +671,53 @@ class SubtitleOptimizer:
         
         return {
             "optimized_subtitles": subtitle_chunk,
-            "translated_subtitles": translated_subtitle
+            "translated_subtitles": {key: translated_subtitle[key] for key in subtitle_chunk}
         }
 
+    async def _atranslate_lines(self, subtitle_chunk: Dict[int, str]) -> Dict:
+        """并发翻译每一条字幕，返回 字幕ID -> 译文或异常"""
+        outcomes = await asyncio.gather(*(
+            self.retry_policy.acall(self._atranslate_line, key, value, description=f"单条翻译（字幕ID {key}）")
+            for key, value in subtitle_chunk.items()
+        ), return_exceptions=True)
+        return dict(zip(subtitle_chunk, outcomes))
+
+    def _line_request(self, key, value: str) -> Dict:
+        """单条翻译的请求参数"""
+        message = [
+            {"role": "system",
+             "content": SINGLE_TRANSLATE_PROMPT.replace("[TargetLanguage]", self.config.target_language)},
+            {"role": "user", "content": value}
+        ]
+        # 为每个字幕ID添加单独的日志
+        logger.info(f"[+]正在翻译字幕ID: {key}")
+        return dict(
+            model=self.config.llm_model,
+            stream=False,
+            messages=message,
+            temperature=0.7,
+            timeout=80,
+            stage="single",
+            batch_id=key
+        )
+
+    @staticmethod
+    def _line_result(value: str, response) -> str:
+        translate = response.choices[0].message.content.strip()
+        logger.info(f"单条翻译原文: {value}")
+        logger.info(f"单条翻译结果: {translate}")
+        return translate
+
+    def _translate_line(self, key, value: str) -> str:
+        """翻译一条字幕，失败时由调用方按重试策略只重试这一条"""
+        response = chat_completion(self.client, **self._line_request(key, value))
+        return self._line_result(value, response)
+
+    async def _atranslate_line(self, key, value: str) -> str:
+        """_translate_line 的协程版本"""
+        response = await achat_completion(self.client, **self._line_request(key, value))
+        return self._line_result(value, response)
+
     def _create_translate_message(self, original_subtitle: Dict[str, str], 
                                 summary_content: Dict, reflect=False):
         """创建翻译提示消息"""
@@ -427,6 +737,91 @@ class SubtitleOptimizer:
             {"role": "user", "content": input_content}
         ]
 
+    @staticmethod
+    def _batch_info(batch_num=None, total_batches=None) -> str:
+        """日志中的批次前缀，流式提交时总批次数未知，只显示批次编号"""
+        if batch_num and total_batches:
+            return f"[批次 {batch_num}/{total_batches}] "
+        return f"[批次 {batch_num}] " if batch_num else ""
+
+    @staticmethod
+    def _preamble_tokens(message: List[Dict], original_subtitle: Dict[str, str]) -> int:
+        """估计消息中每个批次都重复发送的部分（系统提示词、任务说明和摘要参考）的 token 数"""
+        total = sum(estimate_tokens(m["content"]) for m in message)
+        return max(total - estimate_tokens(str(original_subtitle)), 0)
+
+    def _batch_cache_key(self, original_subtitle: Dict[str, str],
+                         summary_content: Dict, reflect: bool) -> Optional[str]:
+        """计算批次的缓存键，未启用缓存时返回None"""
+        if self.cache is None:
+            return None
+        prompt = REFLECT_TRANSLATE_PROMPT if reflect else TRANSLATE_PROMPT
+        summary = summary_content.get('summary', '') if summary_content else ''
+        return self.cache.make_key(self.config.llm_model, prompt, self.config.target_language,
+                                   reflect, summary, original_subtitle)
+
+    def _load_cached_batch(self, cache_key: Optional[str],
+                           original_subtitle: Dict[str, str]) -> Optional[List[Dict]]:
+        """从缓存读取批次结果，并按当前批次的字幕ID重新编号"""
+        if cache_key is None:
+            return None
+        keys = sorted(original_subtitle.keys(), key=int)
+        cached = self.cache.get(cache_key, expected_size=len(keys))
+        if cached is None:
+            return None
+        translated_subtitle = []
+        for k, item in zip(keys, cached):
+            translated_text = {"id": int(k), "original": original_subtitle[k]}
+            translated_text.update(item)
+            translated_subtitle.append(translated_text)
+            self._collect_batch_log(translated_text)
+        return translated_subtitle
+
+    def _batch_journal_key(self, chunk: Dict[str, str], reflect: bool) -> Optional[str]:
+        """计算批次在断点日志中的键，未启用断点日志时返回None"""
+        if self.journal is None:
+            return None
+        return BatchJournal.make_key("translate", self.config.llm_model, self.config.target_language,
+                                     reflect, chunk)
+
+    @staticmethod
+    def _is_batch_complete(translated_subtitle: List[Dict]) -> bool:
+        """批次中没有任何翻译失败的字幕"""
+        return not any(str(item.get("translation", "")).startswith("[翻译失败]")
+                       for item in translated_subtitle)
+
+    def _store_cached_batch(self, cache_key: Optional[str], translated_subtitle: List[Dict]) -> None:
+        """只缓存完整成功的批次结果，编号和原文不进入缓存"""
+        if cache_key is None:
+            return
+        if not self._is_batch_complete(translated_subtitle):
+            return
+        value = [
+            {k: v for k, v in item.items() if k not in ("id", "original")}
+            for item in sorted(translated_subtitle, key=lambda x: x["id"])
+        ]
+        self.cache.set(cache_key, value)
+
+    def _collect_batch_log(self, translated_text: Dict) -> None:
+        """收集有改动的字幕，供最后统一输出"""
+        k = translated_text["id"]
+        if "revised_translation" in translated_text:
+            if (translated_text["original"] != translated_text["optimized"] or 
+                translated_text["translation"] != translated_text["revised_translation"]):
+                self.batch_logs[k] = {
+                    'original': translated_text['original'],
+                    'optimized': translated_text['optimized'],
+                    'translation': translated_text['translation'],
+                    'revised_translation': translated_text['revised_translation'],
+                    'revise_suggestions': translated_text['revise_suggestions']
+                }
+        elif translated_text["original"] != translated_text["optimized"]:
+            self.batch_logs[k] = {
+                'original': translated_text['original'],
+                'optimized': translated_text['optimized'],
+                'translation': translated_text['translation']
+            }
+
     def _print_all_batch_logs(self):
         """统一打印所有批次的日志"""
         if not self.batch_logs:
@@ -519,216 +914,364 @@ class SubtitleOptimizer:
         # 清空日志字典
         self.batch_logs.clear()
 
-    @retry.retry(tries=2)
-    def _reflect_translate(self, original_subtitle: Dict[str, str], 
-                          summary_content: Dict, batch_num=None, total_batches=None) -> List[Dict]:
-        """反思翻译字幕"""
-        subtitle_keys = sorted(map(int, original_subtitle.keys()))
-        batch_info = f"[批次 {batch_num}/{total_batches}] " if batch_num and total_batches else ""
-        if len(subtitle_keys) == self.batch_num:
-            logger.info(f"[+]{batch_info}正在反思翻译字幕：{subtitle_keys[0]} - {subtitle_keys[-1]}")
-        else:
-            logger.info(f"[+]{batch_info}正在反思翻译字幕：{subtitle_keys[0]} - {subtitle_keys[-1]} (共{len(subtitle_keys)}条)")
+    def _records_request(self, pending: Dict[str, str], summary_content: Dict, reflect: bool,
+                         batch_num=None) -> Dict:
+        """批次翻译请求的参数"""
+        message = self._create_translate_message(pending, summary_content, reflect=reflect)
+        return dict(
+            model=self.config.llm_model,
+            messages=message,
+            temperature=0.7,
+            timeout=80,
+            stage="reflect" if reflect else "translate",
+            batch_id=batch_num,
+            preamble_tokens=self._preamble_tokens(message, pending)
+        )
+
+    def _accept_records(self, response, response_content, original_subtitle: Dict[str, str],
+                        pending: Dict[str, str], records: Dict[str, Dict], label: str) -> Dict[str, str]:
+        """把一次请求的结果加入 records，返回仍缺少结果的字幕"""
+        logger.debug(f"{label}API返回结果: \n{json.dumps(response_content, indent=4, ensure_ascii=False)}\n")
+
+        # 如果完全没有返回结果，这是整批次的失败，按异常处理
+        if not response_content or not isinstance(response_content, dict):
+            raise ValueError("API返回空结果")
+
+        # 只保留本次请求中的、必要字段齐全的记录
+        self._commit_records(response_content, pending, records)
+        pending = {k: v for k, v in pending.items() if k not in records}
+        self._record_batch_outcome(response, len(original_subtitle), ok=not pending)
+        return pending
+
+    def _is_split_error(self, error: BaseException, response, original_subtitle: Dict[str, str],
+                        batch_info: str) -> bool:
+        """把失败反馈给 token 预算；超出上下文长度时返回True，由调用方拆分批次"""
+        self._record_batch_outcome(response, len(original_subtitle), ok=False)
+        if classify_error(error) is ErrorClass.SPLIT:
+            logger.warning(f"{batch_info}批次超出模型上下文长度，拆分后重新请求：{error}")
+            return True
+        return False
 
-        max_retries = 2  # 最大重试次数
+    def _request_records(self, original_subtitle: Dict[str, str], summary_content: Dict, reflect: bool,
+                         batch_num=None, batch_info: str = "") -> Dict[str, Dict]:
+        """
+        请求批次翻译，返回 字幕ID -> 结果记录
+
+        损坏或被截断的响应只取出其中字段完整的记录，缺少的字幕在下一次请求中单独补齐，
+        不重新请求整个批次。补请求后仍缺少的字幕不在返回结果中，由调用方处理。
+
+        Raises:
+            Exception: 一条记录都没有拿到，或超出模型上下文长度
+        """
+        label = "反思翻译" if reflect else "翻译"
+        max_retries = self.retry_policy.max_attempts  # 最多请求次数（含补请求）
         current_try = 0
-        
-        while current_try < max_retries:
+        records = {}
+        pending = dict(original_subtitle)
+
+        while pending and current_try < max_retries:
+            response = None
             try:
-                message = self._create_translate_message(original_subtitle, summary_content, reflect=True)
-                response = self.client.chat.completions.create(
-                    model=self.config.llm_model,
-                    stream=False,
-                    messages=message,
-                    temperature=0.7,
-                    timeout=80
-                )
-                response_content = parse_llm_response(response.choices[0].message.content)
-                
-                logger.debug(f"反思翻译API返回结果: {json.dumps(response_content, indent=4, ensure_ascii=False)}")
-
-                # 如果完全没有返回结果，这是整批次的失败，需要重试
-                if not response_content:
-                    current_try += 1
-                    if current_try < max_retries:
-                        logger.warning(f"反思翻译API返回空结果，第{current_try}次重试整个批次")
-                        continue
-                    logger.error(f"反思翻译批次重试{max_retries}次后仍然失败，将使用默认翻译")
-                    response_content = {}
-
-                # 检查API返回的结果是否完整
-                problematic_ids = []
-                for k in original_subtitle.keys():
-                    if str(k) not in response_content:
-                        logger.warning(f"API返回结果缺少字幕ID: {k}，将使用原始字幕")
-                        problematic_ids.append(k)
-                        response_content[str(k)] = {
-                            "optimized_subtitle": original_subtitle[str(k)],
-                            "translation": f"[翻译失败] {original_subtitle[str(k)]}",
-                            "revised_translation": f"[翻译失败] {original_subtitle[str(k)]}",
-                            "revise_suggestions": "翻译失败，无法提供反思建议"
-                        }
+                request = self._records_request(pending, summary_content, reflect, batch_num)
+                with tracing.span(f"{'reflect_' if reflect else ''}translate_attempt", cat="translate",
+                                  batch=batch_num, attempt=current_try + 1, lines=len(pending)):
+                    if self.config.stream_translation:
+                        response, response_content = self._stream_records(request, pending, records,
+                                                                          batch_info, label)
                     else:
-                        # 检查必要的字段是否存在
-                        if "optimized_subtitle" not in response_content[str(k)]:
-                            logger.warning(f"字幕ID {k} 缺少optimized_subtitle字段，将使用原始字幕")
-                            response_content[str(k)]["optimized_subtitle"] = original_subtitle[str(k)]
-                            problematic_ids.append(k)
-                        
-                        if "translation" not in response_content[str(k)]:
-                            logger.warning(f"字幕ID {k} 缺少translation字段，将使用默认翻译")
-                            response_content[str(k)]["translation"] = f"[翻译失败] {original_subtitle[str(k)]}"
-                            problematic_ids.append(k)
-                        
-                        if "revised_translation" not in response_content[str(k)]:
-                            logger.warning(f"字幕ID {k} 缺少revised_translation字段，将使用translation字段")
-                            response_content[str(k)]["revised_translation"] = response_content[str(k)].get("translation", f"[翻译失败] {original_subtitle[str(k)]}")
-                            problematic_ids.append(k)
-                        
-                        if "revise_suggestions" not in response_content[str(k)]:
-                            logger.warning(f"字幕ID {k} 缺少revise_suggestions字段，将使用默认建议")
-                            response_content[str(k)]["revise_suggestions"] = "翻译失败，无法提供反思建议"
-                            problematic_ids.append(k)
-
-                translated_subtitle = []
-                for k, v in response_content.items():
-                    k = int(k)
-                    translated_text = {
-                        "id": k,
-                        "original": original_subtitle[str(k)],
-                        "optimized": v["optimized_subtitle"],
-                        "translation": v["translation"],
-                        "revised_translation": v["revised_translation"],
-                        "revise_suggestions": v["revise_suggestions"]
-                    }
-                    translated_subtitle.append(translated_text)
-
-                    # 收集日志
-                    if (translated_text["original"] != translated_text["optimized"] or 
-                        translated_text["translation"] != translated_text["revised_translation"]):
-                        self.batch_logs[k] = {
-                            'original': translated_text['original'],
-                            'optimized': translated_text['optimized'],
-                            'translation': translated_text['translation'],
-                            'revised_translation': translated_text['revised_translation'],
-                            'revise_suggestions': translated_text['revise_suggestions']
-                        }
-
-                return translated_subtitle
+                        response = chat_completion(self.client, stream=False, **request)
+                        response_content = parse_llm_records(response.choices[0].message.content)
+                pending = self._accept_records(response, response_content, original_subtitle,
+                                               pending, records, label)
+                current_try += 1
+                if pending and current_try < max_retries:
+                    logger.warning(f"{batch_info}{label}结果缺少{len(pending)}条字幕，只补请求这些字幕")
 
             except Exception as e:
+                if self._is_split_error(e, response, original_subtitle, batch_info):
+                    raise
+                # 流式请求中断前已经完成的记录保留，只补请求其余字幕
+                pending = {k: v for k, v in pending.items() if k not in records}
                 current_try += 1
-                if current_try < max_retries:
-                    logger.error(f"反思翻译失败，第{current_try}次重试整个批次。错误：{e}")
+                # 接口错误已由网关按重试策略重试，这里只重试空结果、解析失败等内容错误
+                if current_try < max_retries and self.retry_policy.wait_before_retry(e, current_try):
+                    logger.error(f"{label}失败，第{current_try}次重试。错误：{e}")
                     continue
-                logger.error(f"反思翻译失败，重试{max_retries}次后仍然失败。错误：{e}")
-                # 创建默认的翻译结果
-                translated_subtitle = []
-                for k, v in original_subtitle.items():
-                    k_int = int(k)
-                    translated_text = {
-                        "id": k_int,
-                        "original": v,
-                        "optimized": v,
-                        "translation": f"[翻译失败] {v}",
-                        "revised_translation": f"[翻译失败] {v}",
-                        "revise_suggestions": "翻译失败，无法提供反思建议"
-                    }
-                    translated_subtitle.append(translated_text)
-                return translated_subtitle
-
-    @retry.retry(tries=2)
-    def _translate(self, original_subtitle: Dict[str, str], 
-                  summary_content: Dict, batch_num=None, total_batches=None) -> List[Dict]:
-        """翻译字幕"""
-        subtitle_keys = sorted(map(int, original_subtitle.keys()))
-        batch_info = f"[批次 {batch_num}/{total_batches}] " if batch_num and total_batches else ""
-        if len(subtitle_keys) == self.batch_num:
-            logger.info(f"[+]{batch_info}正在翻译字幕：{subtitle_keys[0]} - {subtitle_keys[-1]}")
-        else:
-            logger.info(f"[+]{batch_info}正在翻译字幕：{subtitle_keys[0]} - {subtitle_keys[-1]} (共{len(subtitle_keys)}条)")
+                if records:
+                    logger.error(f"{label}补请求失败，{len(pending)}条字幕没有结果。错误：{e}")
+                    break
+                logger.error(f"{label}失败：{e}")
+                raise
 
-        max_retries = 2  # 最大重试次数
+        if not records:
+            raise ValueError("API返回结果中没有完整的字幕记录")
+        return records
+
+    async def _arequest_records(self, original_subtitle: Dict[str, str], summary_content: Dict, reflect: bool,
+                                batch_num=None, batch_info: str = "") -> Dict[str, Dict]:
+        """_request_records 的协程版本，等待请求和重试退避时不占用线程"""
+        label = "反思翻译" if reflect else "翻译"
+        max_retries = self.retry_policy.max_attempts
         current_try = 0
-        
-        while current_try < max_retries:
+        records = {}
+        pending = dict(original_subtitle)
+
+        while pending and current_try < max_retries:
+            response = None
             try:
-                message = self._create_translate_message(original_subtitle, summary_content, reflect=False)
-                response = self.client.chat.completions.create(
-                    model=self.config.llm_model,
-                    stream=False,
-                    messages=message,
-                    temperature=0.7,
-                    timeout=80
-                )
-                response_content = parse_llm_response(response.choices[0].message.content)
-
-                logger.debug(f"API返回结果: \n{json.dumps(response_content, indent=4, ensure_ascii=False)}\n")
-
-                # 如果完全没有返回结果，这是整批次的失败，需要重试
-                if not response_content:
-                    current_try += 1
-                    if current_try < max_retries:
-                        logger.warning(f"API返回空结果，第{current_try}次重试整个批次")
-                        continue
-                    logger.error(f"批次重试{max_retries}次后仍然失败，将使用默认翻译")
-                    response_content = {}
-
-                # 检查API返回的结果是否完整
-                problematic_ids = []
-                for k in original_subtitle.keys():
-                    if str(k) not in response_content:
-                        logger.warning(f"API返回结果缺少字幕ID: {k}，将使用原始字幕")
-                        problematic_ids.append(k)
-                        response_content[str(k)] = {
-                            "optimized_subtitle": original_subtitle[str(k)],
-                            "translation": f"[翻译失败] {original_subtitle[str(k)]}"
-                        }
-                    elif "optimized_subtitle" not in response_content[str(k)]:
-                        logger.warning(f"字幕ID {k} 缺少optimized_subtitle字段，将使用原始字幕")
-                        response_content[str(k)]["optimized_subtitle"] = original_subtitle[str(k)]
-                        problematic_ids.append(k)
-                    elif "translation" not in response_content[str(k)]:
-                        logger.warning(f"字幕ID {k} 缺少translation字段，将使用默认翻译")
-                        response_content[str(k)]["translation"] = f"[翻译失败] {original_subtitle[str(k)]}"
-                        problematic_ids.append(k)
-
-                translated_subtitle = []
-                for k, v in response_content.items():
-                    k = int(k)
-                    translated_text = {
-                        "id": k,
-                        "original": original_subtitle[str(k)],
-                        "optimized": v["optimized_subtitle"],
-                        "translation": v["translation"]
-                    }
-                    translated_subtitle.append(translated_text)
-
-                    # 收集日志
-                    if translated_text["original"] != translated_text["optimized"]:
-                        self.batch_logs[k] = {
-                            'original': translated_text['original'],
-                            'optimized': translated_text['optimized'],
-                            'translation': translated_text['translation']
-                        }
-
-                return translated_subtitle
+                request = self._records_request(pending, summary_content, reflect, batch_num)
+                with tracing.async_span(f"{'reflect_' if reflect else ''}translate_attempt", cat="translate",
+                                        batch=batch_num, attempt=current_try + 1, lines=len(pending)):
+                    if self.config.stream_translation:
+                        response, response_content = await self._astream_records(request, pending, records,
+                                                                                 batch_info, label)
+                    else:
+                        response = await achat_completion(self.client, stream=False, **request)
+                        response_content = parse_llm_records(response.choices[0].message.content)
+                pending = self._accept_records(response, response_content, original_subtitle,
+                                               pending, records, label)
+                current_try += 1
+                if pending and current_try < max_retries:
+                    logger.warning(f"{batch_info}{label}结果缺少{len(pending)}条字幕，只补请求这些字幕")
 
             except Exception as e:
+                if self._is_split_error(e, response, original_subtitle, batch_info):
+                    raise
+                pending = {k: v for k, v in pending.items() if k not in records}
                 current_try += 1
-                if current_try < max_retries:
-                    logger.error(f"翻译失败，第{current_try}次重试整个批次。错误：{e}")
+                if current_try < max_retries and await self.retry_policy.await_before_retry(e, current_try):
+                    logger.error(f"{label}失败，第{current_try}次重试。错误：{e}")
                     continue
-                logger.error(f"翻译失败，重试{max_retries}次后仍然失败。错误：{e}")
-                # 创建默认的翻译结果
-                translated_subtitle = []
-                for k, v in original_subtitle.items():
-                    k_int = int(k)
-                    translated_text = {
-                        "id": k_int,
-                        "original": v,
-                        "optimized": v,
-                        "translation": f"[翻译失败] {v}"
-                    }
-                    translated_subtitle.append(translated_text)
-                return translated_subtitle
\ No newline at end of file
+                if records:
+                    logger.error(f"{label}补请求失败，{len(pending)}条字幕没有结果。错误：{e}")
+                    break
+                logger.error(f"{label}失败：{e}")
+                raise
+
+        if not records:
+            raise ValueError("API返回结果中没有完整的字幕记录")
+        return records
+
+    @staticmethod
+    def _commit_records(response_content: Dict, pending: Dict[str, str], records: Dict[str, Dict]) -> Dict[str, Dict]:
+        """把属于本次请求、必要字段齐全的记录加入 records，返回新加入的记录"""
+        committed = {}
+        for k, v in response_content.items():
+            if str(k) in pending and isinstance(v, dict) and all(f in v for f in BATCH_REQUIRED_FIELDS):
+                committed[str(k)] = v
+        records.update(committed)
+        return committed
+
+    def _stream_parser(self, pending: Dict[str, str], records: Dict[str, Dict]):
+        """流式请求的增量解析器和输出回调：每条记录闭合时立即加入 records，输出偏离格式时中止生成"""
+        parser = StreamingRecordParser(list(pending))
+        start = time.monotonic()
+        first_record = []
+
+        def on_delta(text: str) -> bool:
+            if self._commit_records(parser.feed(text), pending, records) and not first_record:
+                first_record.append(time.monotonic() - start)
+            return parser.off_format is None
+
+        return parser, on_delta, first_record
+
+    def _stream_result(self, parser: StreamingRecordParser, first_record: List[float],
+                       batch_info: str, label: str) -> Dict:
+        """正常结束时按完整响应解析，提前中止时只返回已完成的记录"""
+        if first_record:
+            self.first_record_latencies.append(first_record[0])
+        if parser.off_format is None:
+            response_content = parse_llm_records(parser.text)
+            return response_content if response_content else parser.records
+        self.stream_aborts += 1
+        logger.warning(f"{batch_info}{label}输出偏离JSON格式（{parser.off_format}），已提前中止，"
+                       f"保留{len(parser.records)}条完成的记录")
+        if not parser.records:
+            raise ValueError(f"输出偏离JSON格式：{parser.off_format}")
+        return parser.records
+
+    def _stream_records(self, request: Dict, pending: Dict[str, str], records: Dict[str, Dict],
+                        batch_info: str, label: str) -> Tuple[object, Dict]:
+        """
+        流式请求一个批次：每条记录闭合时立即加入 records，输出偏离格式时中止生成
+
+        Returns:
+            (拼接后的响应, 解析结果)；正常结束时按完整响应解析，提前中止时只返回已完成的记录
+        """
+        parser, on_delta, first_record = self._stream_parser(pending, records)
+        response = stream_completion(self.client, on_delta, **request)
+        return response, self._stream_result(parser, first_record, batch_info, label)
+
+    async def _astream_records(self, request: Dict, pending: Dict[str, str], records: Dict[str, Dict],
+                               batch_info: str, label: str) -> Tuple[object, Dict]:
+        """_stream_records 的协程版本"""
+        parser, on_delta, first_record = self._stream_parser(pending, records)
+        response = await astream_completion(self.client, on_delta, **request)
+        return response, self._stream_result(parser, first_record, batch_info, label)
+
+    def describe_streaming(self) -> Optional[str]:
+        """流式翻译的首条结果耗时和中止次数，用于日志；没有流式批次时返回None"""
+        latencies = sorted(self.first_record_latencies)
+        if not latencies and not self.stream_aborts:
+            return None
+        text = f"流式翻译: {len(latencies)} 次请求返回了结果, 提前中止 {self.stream_aborts} 次"
+        if latencies:
+            text += (f", 首条结果平均 {sum(latencies) / len(latencies):.2f}s, "
+                     f"p50 {latencies[len(latencies) // 2]:.2f}s")
+        return text
+
+    def _begin_batch(self, original_subtitle: Dict[str, str], summary_content: Dict, reflect: bool,
+                     batch_num=None, total_batches=None) -> Tuple[str, Optional[str], Optional[List[Dict]]]:
+        """记录批次日志并查询缓存，返回 (日志前缀, 缓存键, 缓存的批次结果或None)"""
+        subtitle_keys = sorted(map(int, original_subtitle.keys()))
+        batch_info = self._batch_info(batch_num, total_batches)
+        label = "反思翻译" if reflect else "翻译"
+        if len(subtitle_keys) == self.batch_num:
+            logger.info(f"[+]{batch_info}正在{label}字幕：{subtitle_keys[0]} - {subtitle_keys[-1]}")
+        else:
+            logger.info(f"[+]{batch_info}正在{label}字幕：{subtitle_keys[0]} - {subtitle_keys[-1]} (共{len(subtitle_keys)}条)")
+
+        cache_key = self._batch_cache_key(original_subtitle, summary_content, reflect=reflect)
+        cached = self._load_cached_batch(cache_key, original_subtitle)
+        if cached is not None:
+            logger.info(f"[+]{batch_info}命中翻译缓存，跳过API调用")
+        return batch_info, cache_key, cached
+
+    @staticmethod
+    def _check_translate_fields(original_subtitle: Dict[str, str], response_content: Dict) -> List[str]:
+        """补齐翻译结果中缺少的字幕和字段，返回有问题的字幕ID"""
+        problematic_ids = []
+        for k in original_subtitle.keys():
+            if str(k) not in response_content:
+                logger.warning(f"API返回结果缺少字幕ID: {k}，将使用原始字幕")
+                problematic_ids.append(k)
+                response_content[str(k)] = {
+                    "optimized_subtitle": original_subtitle[str(k)],
+                    "translation": f"[翻译失败] {original_subtitle[str(k)]}"
+                }
+            elif "optimized_subtitle" not in response_content[str(k)]:
+                logger.warning(f"字幕ID {k} 缺少optimized_subtitle字段，将使用原始字幕")
+                response_content[str(k)]["optimized_subtitle"] = original_subtitle[str(k)]
+                problematic_ids.append(k)
+            elif "translation" not in response_content[str(k)]:
+                logger.warning(f"字幕ID {k} 缺少translation字段，将使用默认翻译")
+                response_content[str(k)]["translation"] = f"[翻译失败] {original_subtitle[str(k)]}"
+                problematic_ids.append(k)
+        return problematic_ids
+
+    @staticmethod
+    def _check_reflect_fields(original_subtitle: Dict[str, str], response_content: Dict) -> List[str]:
+        """补齐反思翻译结果中缺少的字幕和字段，返回有问题的字幕ID"""
+        problematic_ids = []
+        for k in original_subtitle.keys():
+            if str(k) not in response_content:
+                logger.warning(f"API返回结果缺少字幕ID: {k}，将使用原始字幕")
+                problematic_ids.append(k)
+                response_content[str(k)] = {
+                    "optimized_subtitle": original_subtitle[str(k)],
+                    "translation": f"[翻译失败] {original_subtitle[str(k)]}",
+                    "revised_translation": f"[翻译失败] {original_subtitle[str(k)]}",
+                    "revise_suggestions": "翻译失败，无法提供反思建议"
+                }
+            else:
+                # 检查必要的字段是否存在
+                if "optimized_subtitle" not in response_content[str(k)]:
+                    logger.warning(f"字幕ID {k} 缺少optimized_subtitle字段，将使用原始字幕")
+                    response_content[str(k)]["optimized_subtitle"] = original_subtitle[str(k)]
+                    problematic_ids.append(k)
+
+                if "translation" not in response_content[str(k)]:
+                    logger.warning(f"字幕ID {k} 缺少translation字段，将使用默认翻译")
+                    response_content[str(k)]["translation"] = f"[翻译失败] {original_subtitle[str(k)]}"
+                    problematic_ids.append(k)
+
+                if "revised_translation" not in response_content[str(k)]:
+                    logger.warning(f"字幕ID {k} 缺少revised_translation字段，将使用translation字段")
+                    response_content[str(k)]["revised_translation"] = response_content[str(k)].get("translation", f"[翻译失败] {original_subtitle[str(k)]}")
+                    problematic_ids.append(k)
+
+                if "revise_suggestions" not in response_content[str(k)]:
+                    logger.warning(f"字幕ID {k} 缺少revise_suggestions字段，将使用默认建议")
+                    response_content[str(k)]["revise_suggestions"] = "翻译失败，无法提供反思建议"
+                    problematic_ids.append(k)
+        return problematic_ids
+
+    def _finish_batch(self, original_subtitle: Dict[str, str], response_content: Dict, reflect: bool,
+                      cache_key: Optional[str]) -> List[Dict]:
+        """检查API返回的结果是否完整，转换为批次结果列表；完整的批次写入缓存"""
+        if reflect:
+            problematic_ids = self._check_reflect_fields(original_subtitle, response_content)
+        else:
+            problematic_ids = self._check_translate_fields(original_subtitle, response_content)
+
+        translated_subtitle = []
+        for k in original_subtitle.keys():
+            v = response_content[str(k)]
+            k = int(k)
+            translated_text = {
+                "id": k,
+                "original": original_subtitle[str(k)],
+                "optimized": v["optimized_subtitle"],
+                "translation": v["translation"]
+            }
+            if reflect:
+                translated_text.update({
+                    "revised_translation": v["revised_translation"],
+                    "revise_suggestions": v["revise_suggestions"]
+                })
+            translated_subtitle.append(translated_text)
+
+            # 收集日志
+            self._collect_batch_log(translated_text)
+
+        if not problematic_ids:
+            self._store_cached_batch(cache_key, translated_subtitle)
+        return translated_subtitle
+
+    @tracing.traced("reflect_translate_batch", cat="translate")
+    def _reflect_translate(self, original_subtitle: Dict[str, str], 
+                          summary_content: Dict, batch_num=None, total_batches=None) -> List[Dict]:
+        """反思翻译字幕"""
+        batch_info, cache_key, cached = self._begin_batch(original_subtitle, summary_content, True,
+                                                          batch_num, total_batches)
+        if cached is not None:
+            return cached
+        response_content = self._request_records(original_subtitle, summary_content, reflect=True,
+                                                 batch_num=batch_num, batch_info=batch_info)
+        return self._finish_batch(original_subtitle, response_content, True, cache_key)
+
+    @tracing.traced("reflect_translate_batch", cat="translate")
+    async def _areflect_translate(self, original_subtitle: Dict[str, str],
+                                  summary_content: Dict, batch_num=None, total_batches=None) -> List[Dict]:
+        """_reflect_translate 的协程版本"""
+        batch_info, cache_key, cached = self._begin_batch(original_subtitle, summary_content, True,
+                                                          batch_num, total_batches)
+        if cached is not None:
+            return cached
+        response_content = await self._arequest_records(original_subtitle, summary_content, reflect=True,
+                                                        batch_num=batch_num, batch_info=batch_info)
+        return self._finish_batch(original_subtitle, response_content, True, cache_key)
+
+    @tracing.traced("translate_batch", cat="translate")
+    def _translate(self, original_subtitle: Dict[str, str], 
+                  summary_content: Dict, batch_num=None, total_batches=None) -> List[Dict]:
+        """翻译字幕"""
+        batch_info, cache_key, cached = self._begin_batch(original_subtitle, summary_content, False,
+                                                          batch_num, total_batches)
+        if cached is not None:
+            return cached
+        response_content = self._request_records(original_subtitle, summary_content, reflect=False,
+                                                 batch_num=batch_num, batch_info=batch_info)
+        return self._finish_batch(original_subtitle, response_content, False, cache_key)
+
+    @tracing.traced("translate_batch", cat="translate")
+    async def _atranslate(self, original_subtitle: Dict[str, str],
+                          summary_content: Dict, batch_num=None, total_batches=None) -> List[Dict]:
+        """_translate 的协程版本"""
+        batch_info, cache_key, cached = self._begin_batch(original_subtitle, summary_content, False,
+                                                          batch_num, total_batches)
+        if cached is not None:
+            return cached
+        response_content = await self._arequest_records(original_subtitle, summary_content, reflect=False,
+                                                        batch_num=batch_num, batch_info=batch_info)
+        return self._finish_batch(original_subtitle, response_content, False, cache_key)
@@ -0,0 +1,175 @@
+"""
+API 端点探测结果的磁盘缓存
+
+探测结果（是否可达、模型是否可用、是否支持 JSON 模式、观测到的延迟）按
+(base_url, 模型, 密钥指纹) 保存在 JSON 文件中，在有效期内的文件处理不再发送探测请求。
+每个文件在独立子进程中处理时同样可以复用。缓存未命中时，发送一个极短的探测请求
+（send_probe_request），以最先完成的请求作为探测结果（见 llm_client.observe_next_request），
+只缓存成功的结果。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+import openai
+
+from .llm_client import chat_completion
+from .retry_policy import FATAL_ERRORS, is_context_length_error
+from utils.logger import setup_logger
+
+logger = setup_logger("endpoint_probe")
+
+DEFAULT_PROBE_PATH = Path(__file__).parent.parent / "cache" / "endpoint_probe.json"
+DEFAULT_TTL = 24 * 3600
+
+@dataclass
+class ProbeResult:
+    """一次端点探测的结果"""
+    reachable: bool
+    model_valid: bool
+    # None 表示尚未检测
+    json_mode: Optional[bool]
+    latency: float
+    checked_at: float
+
+
+def key_fingerprint(api_key: str) -> str:
+    """密钥的指纹，缓存文件中不保存密钥本身"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def error_message(error: BaseException) -> str:
+    """取出接口错误中的核心信息"""
+    return getattr(error, "message", None) or str(error)
+
+
+class ProbeCache:
+    """探测结果缓存，写入时整体替换文件，可被多个进程同时使用"""
+
+    def __init__(self, path: Optional[str] = None, ttl: int = DEFAULT_TTL):
+        self.path = Path(path) if path else DEFAULT_PROBE_PATH
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(base_url: str, model: str, api_key: str) -> str:
+        return f"{base_url.rstrip('/')}|{model}|{key_fingerprint(api_key)}"
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取端点探测缓存失败，忽略缓存: {e}")
+            return {}
+
+    def get(self, base_url: str, model: str, api_key: str) -> Optional[ProbeResult]:
+        """返回有效期内的探测结果，没有或已过期时返回None"""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._load().get(self.make_key(base_url, model, api_key))
+        if not entry:
+            return None
+        try:
+            result = ProbeResult(**entry)
+        except TypeError:
+            return None
+        if time.time() - result.checked_at > self.ttl:
+            return None
+        return result
+
+    def put(self, base_url: str, model: str, api_key: str, result: ProbeResult) -> None:
+        """保存探测结果，同时清理已过期的条目"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            entries = self._load()
+            now = time.time()
+            entries = {k: v for k, v in entries.items() if now - v.get("checked_at", 0) <= self.ttl}
+            entries[self.make_key(base_url, model, api_key)] = asdict(result)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, indent=2)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning(f"写入端点探测缓存失败: {e}")
+
+
+def is_fatal_error(error: Optional[BaseException]) -> bool:
+    """判断请求错误是否说明端点或模型不可用：重试不会成功的错误或连接失败（超时和上下文过长不算）"""
+    if error is None or not isinstance(error, FATAL_ERRORS + (openai.APIConnectionError,)):
+        return False
+    if isinstance(error, openai.APITimeoutError):
+        return False
+    if is_context_length_error(error):
+        return False
+    return True
+
+
+def result_from_request(latency: float, error: Optional[BaseException]) -> ProbeResult:
+    """
+    根据第一个实际请求的结果生成探测结果
+
+    Raises:
+        error: 端点或模型不可用时原样抛出
+    """
+    if is_fatal_error(error):
+        raise error
+    # 429 和服务端错误说明端点可达且模型存在，只是暂时无法处理
+    return ProbeResult(reachable=True, model_valid=True, json_mode=None,
+                       latency=latency, checked_at=time.time())
+
+
+def send_probe_request(client, model: str) -> None:
+    """
+    通过网关发送一个只生成 1 个 token 的请求，结果由 observe_next_request 的回调取得
+
+    请求失败时不抛出异常，错误同样交给回调判断
+    """
+    try:
+        chat_completion(
+            client,
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": "Hello!"}
+            ],
+            max_tokens=1,
+            timeout=15,
+            stage="probe"
+        )
+    except Exception as e:
+        logger.debug(f"探测请求失败: {e}")
+
+
+def check_json_mode(client, model: str) -> Optional[bool]:
+    """检测模型是否接受 response_format=json_object，无法判断时返回None"""
+    try:
+        chat_completion(
+            client,
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": 'Reply with the JSON object {"ok": true}.'}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=20,
+            timeout=30,
+            stage="probe"
+        )
+        return True
+    except openai.BadRequestError:
+        return False
+    except Exception as e:
+        logger.debug(f"JSON 模式检测失败: {e}")
+        return None
@@ -247,6 +247,25 @@ Return a JSON object in the source language (e.g., if subtitles are in English,
 }
 """
 
+SECTION_SUMMARY_NOTE = """
+
+## Partial Transcript
+
+The content below is section [SectionIndex] of [SectionCount] of a longer transcript ([TimeRange]).
+Analyze only this section, using the same output format. Its analysis will be merged with the other sections later and will also be given to the translators of this section, so keep key points specific to what is said here.
+"""
+
+REDUCE_SUMMARY_PROMPT = """
+You are a **professional video analyst**. The transcript of a long video was analyzed in consecutive sections. Merge the section analyses below into a single analysis of the whole video.
+
+Rules:
+- Return exactly one JSON object in the same format as the section analyses ("summary" and "terms")
+- "key_points" should describe the whole video in order, not repeat every section
+- Merge the ASR issue lists and term lists, removing duplicates; when sections disagree on a correction, keep the one with the strongest validation
+- Keep every product name, proper noun and do_not_translate term that appears in any section
+- Use the source language of the analyses
+"""
+
 TRANSLATE_PROMPT = """
 You are a subtitle proofreading and translation expert. Your task is to process subtitles generated through speech recognition and translate them into [TargetLanguage].
 
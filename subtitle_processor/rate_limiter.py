@@ -0,0 +1,186 @@
+"""
+自适应限流器
+
+所有LLM请求在发出前都要从限流器获取许可：
+- 每分钟请求数（RPM）和每分钟 token 数（TPM）两个令牌桶，0 表示不限制
+- 服务端返回 429 时遵守 Retry-After，在此之前暂停发放新的许可
+- 并发上限采用加性增、乘性减（AIMD）：请求顺利且延迟正常时缓慢增加，
+  遇到 429 或服务端过载时减半
+"""
+import asyncio
+import threading
+import time
+from typing import Optional, Set, Tuple
+
+from utils.logger import setup_logger
+
+logger = setup_logger("rate_limiter")
+
+# 没有 Retry-After 时遇到 429 的默认暂停时间（秒）
+DEFAULT_RETRY_AFTER = 2.0
+# 延迟超过历史最佳水平的倍数后不再增加并发
+LATENCY_TOLERANCE = 2.0
+
+
+class TokenBucket:
+    """按分钟速率补充的令牌桶，允许短暂透支以便用实际用量校正预估"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """返回获取 amount 个令牌还需等待的秒数"""
+        self._refill(now)
+        # 单次请求超过桶容量时，只要求桶是满的，避免永远等待
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= amount
+
+
+class AdaptiveRateLimiter:
+    """RPM/TPM 令牌桶 + AIMD 并发控制"""
+
+    def __init__(self, max_concurrency: int, initial_concurrency: Optional[int] = None,
+                 requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 min_concurrency: int = 1):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        initial = initial_concurrency or self.max_concurrency
+        self.limit = float(min(max(initial, self.min_concurrency), self.max_concurrency))
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.in_flight = 0
+        self.rate_limited_count = 0
+        self._pause_until = 0.0
+        self._latency_floor: Optional[float] = None
+        self._cond = threading.Condition()
+        # 在事件循环中等待许可的协程，名额或令牌变化时通过 call_soon_threadsafe 唤醒
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def _try_acquire(self, estimated_tokens: int) -> Tuple[bool, Optional[float]]:
+        """
+        尝试占用一个许可，调用方需持有 self._cond
+
+        Returns:
+            (是否成功, 失败时还需等待的秒数；None 表示等待其他请求完成)
+        """
+        now = time.monotonic()
+        if self._pause_until > now:
+            return False, self._pause_until - now
+        if self.in_flight >= int(self.limit):
+            return False, None
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.wait_time(1, now))
+        if self.token_bucket and estimated_tokens:
+            wait = max(wait, self.token_bucket.wait_time(estimated_tokens, now))
+        if wait > 0:
+            return False, wait
+        if self.request_bucket:
+            self.request_bucket.consume(1)
+        if self.token_bucket:
+            self.token_bucket.consume(estimated_tokens)
+        self.in_flight += 1
+        return True, 0.0
+
+    def acquire(self, estimated_tokens: int = 0) -> None:
+        """阻塞直到允许发出一个请求"""
+        with self._cond:
+            while True:
+                acquired, wait = self._try_acquire(estimated_tokens)
+                if acquired:
+                    return
+                self._cond.wait(timeout=wait)
+
+    async def acquire_async(self, estimated_tokens: int = 0) -> None:
+        """
+        在事件循环中等待直到允许发出一个请求，等待期间不占用线程
+
+        许可只在成功时一次性占用，等待中被取消不会占用名额
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        try:
+            while True:
+                with self._cond:
+                    acquired, wait = self._try_acquire(estimated_tokens)
+                    if acquired:
+                        return
+                    waiter[1].clear()
+                    self._async_waiters.add(waiter)
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+
+    def _notify(self) -> None:
+        """唤醒所有等待许可的线程和协程，调用方需持有 self._cond"""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # 事件循环已经关闭
+                pass
+
+    def release(self, latency: float, estimated_tokens: int = 0, actual_tokens: Optional[int] = None) -> None:
+        """请求成功完成：用实际 token 数校正预估，并在延迟正常时加性增加并发"""
+        with self._cond:
+            self.in_flight -= 1
+            if self.token_bucket and actual_tokens is not None:
+                self.token_bucket.consume(actual_tokens - estimated_tokens)
+
+            # 以每个 token 的耗时衡量延迟，消除批次大小不同带来的差异
+            cost = latency / max(actual_tokens or estimated_tokens or 1, 1)
+            if self._latency_floor is None or cost < self._latency_floor:
+                self._latency_floor = cost
+            if cost <= self._latency_floor * LATENCY_TOLERANCE and self.limit < self.max_concurrency:
+                old = int(self.limit)
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                if int(self.limit) != old:
+                    logger.debug(f"请求顺利，并发上限提高到 {int(self.limit)}")
+            self._notify()
+
+    def release_failed(self) -> None:
+        """请求因其他错误失败，只归还并发名额"""
+        with self._cond:
+            self.in_flight -= 1
+            self._notify()
+
+    def on_overload(self, retry_after: Optional[float] = None, rate_limited: bool = True) -> None:
+        """
+        请求遇到 429 或服务端过载：并发上限减半，并在 Retry-After 之前暂停发放许可
+
+        Args:
+            retry_after: 服务端要求的等待秒数
+            rate_limited: 是否为 429，False 表示 5xx/超时等过载信号，只减并发不暂停
+        """
+        with self._cond:
+            self.in_flight -= 1
+            old = int(self.limit)
+            self.limit = max(float(self.min_concurrency), self.limit / 2)
+            if rate_limited:
+                self.rate_limited_count += 1
+                pause = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+                self._pause_until = max(self._pause_until, time.monotonic() + pause)
+                logger.warning(f"触发服务端限流，暂停 {pause:.1f} 秒，并发上限 {old} -> {int(self.limit)}")
+            else:
+                logger.warning(f"服务端过载，并发上限 {old} -> {int(self.limit)}")
+            self._notify()
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
@@ -0,0 +1,214 @@
+"""
+LLM 请求的统一重试策略
+
+所有LLM请求都通过同一个策略决定是否重试：
+- 按错误类型分类：可重试（超时、连接错误、服务端错误、限流、空结果或解析失败）、
+  拆分后重试（输入超出上下文长度，重试同样的请求没有意义，由调用方拆小后再请求）、
+  致命（认证失败、模型不存在、请求参数错误，以及 TypeError、KeyError 等代码错误，重试不会成功）
+- 重试前按指数退避等待，并加入随机抖动，避免并发的批次同时重试
+- 整个运行共享一个重试预算，服务端故障时重试次数有上限，不会成倍放大请求量；
+  限流（429）按 Retry-After 暂停后重试，不占用预算
+
+接口错误由网关 chat_completion 按策略重试；调用方只对结果内容的错误（空结果、解析失败）
+使用 wait_before_retry / call（协程中为 await_before_retry / acall）重试，
+网关已经放弃的接口错误不会在调用方再次重试。
+"""
+import asyncio
+import random
+import threading
+import time
+from enum import Enum
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+from utils.logger import setup_logger
+
+logger = setup_logger("retry_policy")
+
+T = TypeVar("T")
+
+DEFAULT_MAX_ATTEMPTS = 3
+# 限流错误的最多尝试次数
+RATE_LIMIT_ATTEMPTS = 6
+DEFAULT_BUDGET = 100
+# 第一次重试前的基础等待时间和最长等待时间（秒）
+BASE_DELAY = 1.0
+MAX_DELAY = 20.0
+
+# 这些错误重试不会成功
+FATAL_ERRORS = (
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.NotFoundError,
+    openai.BadRequestError,
+    openai.UnprocessableEntityError,
+)
+
+# 代码本身的错误，重试只会重复同样的失败
+PROGRAMMING_ERRORS = (
+    TypeError,
+    KeyError,
+    AttributeError,
+    NameError,
+    AssertionError,
+    NotImplementedError,
+)
+
+# 服务商表示输入超出上下文长度的错误信息（小写）
+CONTEXT_LENGTH_MARKERS = (
+    "context_length_exceeded",
+    "maximum context length",
+    "context window",
+)
+
+
+def is_context_length_error(error: Optional[BaseException]) -> bool:
+    """判断请求错误是否因为输入超出模型的上下文长度"""
+    if not isinstance(error, openai.BadRequestError):
+        return False
+    if getattr(error, "code", None) == "context_length_exceeded":
+        return True
+    message = (getattr(error, "message", None) or str(error)).lower()
+    return any(marker in message for marker in CONTEXT_LENGTH_MARKERS)
+
+
+class ErrorClass(Enum):
+    """请求错误的处理方式"""
+    RETRY = "retry"
+    SPLIT = "split"
+    FATAL = "fatal"
+
+
+def classify_error(error: BaseException) -> ErrorClass:
+    """判断请求错误应当重试、拆分后重试还是直接放弃"""
+    if is_context_length_error(error):
+        return ErrorClass.SPLIT
+    if isinstance(error, FATAL_ERRORS + PROGRAMMING_ERRORS):
+        return ErrorClass.FATAL
+    return ErrorClass.RETRY
+
+
+class RetryPolicy:
+    """错误分类 + 指数退避 + 运行级重试预算，线程安全"""
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, budget: int = DEFAULT_BUDGET,
+                 base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY):
+        """
+        Args:
+            max_attempts: 每个请求最多尝试的次数（含第一次）
+            budget: 整个运行最多重试的次数，0 表示不限制
+            base_delay: 第一次重试前的基础等待时间（秒）
+            max_delay: 最长等待时间（秒）
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间：指数增长，在上限的一半到上限之间随机"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def spend(self) -> bool:
+        """从运行级预算中扣除一次重试，预算用完时返回False"""
+        with self._lock:
+            if self.budget and self.retries >= self.budget:
+                self.denied += 1
+                if self.denied == 1:
+                    logger.warning(f"本次运行的重试预算（{self.budget}次）已用完，之后的失败请求不再重试")
+                return False
+            self.retries += 1
+            return True
+
+    def retry_delay(self, error: BaseException, attempt: int,
+                    retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        第 attempt 次尝试失败后是否重试
+
+        Args:
+            retry_after: 服务端要求的等待秒数（429 的 Retry-After）
+
+        Returns:
+            重试前应等待的秒数；错误不可重试、次数或预算用完时返回None
+        """
+        if classify_error(error) is not ErrorClass.RETRY:
+            return None
+        if isinstance(error, openai.RateLimitError):
+            if attempt >= max(self.max_attempts, RATE_LIMIT_ATTEMPTS):
+                return None
+            return max(self.backoff(attempt), retry_after or 0.0)
+        if attempt >= self.max_attempts or not self.spend():
+            return None
+        return self.backoff(attempt)
+
+    def _content_retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """结果内容错误重试前的等待秒数，不重试时返回None；接口错误（openai.APIError）已经由网关重试过"""
+        if isinstance(error, openai.APIError):
+            return None
+        return self.retry_delay(error, attempt)
+
+    def wait_before_retry(self, error: BaseException, attempt: int) -> bool:
+        """调用方对结果内容错误的重试：允许重试时等待退避时间后返回True，否则返回False"""
+        delay = self._content_retry_delay(error, attempt)
+        if delay is None:
+            return False
+        time.sleep(delay)
+        return True
+
+    async def await_before_retry(self, error: BaseException, attempt: int) -> bool:
+        """wait_before_retry 的协程版本，退避期间不占用线程"""
+        delay = self._content_retry_delay(error, attempt)
+        if delay is None:
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+    def call(self, func: Callable[..., T], *args, description: str = "LLM请求", **kwargs) -> T:
+        """调用 func，结果内容错误时按策略重试（同 wait_before_retry），不再重试时抛出最后一次的异常"""
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not self.wait_before_retry(e, attempt):
+                    raise
+                logger.warning(f"{description}失败，第{attempt}次重试: {e}")
+                attempt += 1
+
+    async def acall(self, func: Callable[..., Awaitable[T]], *args, description: str = "LLM请求", **kwargs) -> T:
+        """call 的协程版本，func 为协程函数"""
+        attempt = 1
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if not await self.await_before_retry(e, attempt):
+                    raise
+                logger.warning(f"{description}失败，第{attempt}次重试: {e}")
+                attempt += 1
+
+    def describe(self) -> str:
+        with self._lock:
+            if self.budget:
+                return f"重试 {self.retries}/{self.budget} 次"
+            return f"重试 {self.retries} 次"
+
+
+_policy = RetryPolicy()
+
+
+def configure_retry_policy(max_attempts: int = DEFAULT_MAX_ATTEMPTS, budget: int = DEFAULT_BUDGET) -> RetryPolicy:
+    """为本次运行设置共享的重试策略（重试预算从零开始计算）"""
+    global _policy
+    _policy = RetryPolicy(max_attempts=max_attempts, budget=budget)
+    return _policy
+
+
+def get_retry_policy() -> RetryPolicy:
+    """返回进程内共享的重试策略"""
+    return _policy
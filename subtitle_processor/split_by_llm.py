@@ -1,11 +1,11 @@
 import re
-from typing import List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
 from openai import OpenAI
 
 from .data import SubtitleSegment
 from .prompts import SPLIT_SYSTEM_PROMPT
-from .config import SubtitleConfig, get_default_config
+from .llm_client import achat_completion, chat_completion, get_async_engine, get_client
+from .retry_policy import get_retry_policy
 from utils.logger import setup_logger
 
 logger = setup_logger("subtitle_spliter")
@@ -78,106 +78,157 @@ def split_by_end_marks(sentence: str) -> List[str]:
     
     return segments if segments else [sentence]
 
+def _split_messages(text: str, max_word_count_english: int) -> List[dict]:
+    # 使用系统提示词
+    system_prompt = SPLIT_SYSTEM_PROMPT.replace("[max_word_count_english]", str(max_word_count_english))
+    
+    # 在用户提示中添加对空格的强调
+    user_prompt = f"Please use multiple <br> tags to separate the following sentence. Make sure to preserve all spaces and punctuation exactly as they appear in the original text:\n{text}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def _parse_split_response(response, text: str, max_word_count_english: int) -> List[str]:
+    """按 <br> 切分模型返回的断句结果，并再次拆分其中的超长句"""
+    # 处理响应
+    result = response.choices[0].message.content
+    if not result:
+        raise Exception("API返回为空")
+    logger.debug(f"API返回结果: \n\n{result}\n")
+
+    # 清理和分割文本 - 简化处理，保留原始格式
+    result = re.sub(r'\n+', '', result)
+    
+    # 直接按<br>分割，保留原始格式和空格
+    sentences = result.split("<br>")
+    
+    # 清理空白行，但保留内部空格
+    sentences = [seg.strip() for seg in sentences if seg.strip()]
+
+    # 验证句子长度
+    new_sentences = []
+    for sentence in sentences:
+        # 首先按结束标记拆分句子
+        segments = split_by_end_marks(sentence)
+        
+        # 对每个分段进行长度检查
+        for segment in segments:
+            threshold = max_word_count_english + 5
+            word_count = count_words(segment)
+            
+            if max_word_count_english < word_count < threshold:
+                logger.info(f"长句: {word_count}, 文本: {segment}")
+            if word_count > threshold:
+                logger.info(f"超长句: {word_count}, 文本: {segment}")
+                # 尝试切分句子
+                split_results = split_by_common_words(segment)
+                new_sentences.extend(split_results)
+            else:
+                new_sentences.append(segment)
+    
+    sentences = new_sentences
+
+    # 验证结果
+    word_count = count_words(text)
+    expected_segments = word_count / max_word_count_english
+    actual_segments = len(sentences)
+    
+    if actual_segments < expected_segments * 0.9:
+        logger.warning(f"断句数量不足：预期 {expected_segments:.1f}，实际 {actual_segments}")
+        
+    return sentences
+
+
 def split_by_llm(text: str,
                 model: str = "gpt-4o-mini",
                 max_word_count_english: int = 14,
-                max_retries: int = 3) -> List[str]:
+                fallback: bool = True,
+                client: Optional[OpenAI] = None,
+                batch_id: Optional[int] = None) -> List[str]:
     """
     使用LLM拆分句子
+
+    启用异步引擎时在引擎事件循环中执行 asplit_by_llm 并等待结果
     
     Args:
         text: 要拆分的文本
         model: 使用的语言模型
         max_word_count_english: 英文最大单词数
-        max_retries: 最大重试次数
+        fallback: 按重试策略重试后仍失败时是否退回按句号简单拆分，为False时抛出异常
+        client: OpenAI 客户端，默认使用进程内共享的客户端
+        batch_id: 批次编号，记入用量账本
         
     Returns:
         List[str]: 拆分后的句子列表
     """
+    engine = get_async_engine()
+    if engine is not None:
+        return engine.run(asplit_by_llm(text, model=model, max_word_count_english=max_word_count_english,
+                                        fallback=fallback, client=client, batch_id=batch_id))
+
     logger.info(f"单词数{count_words(text)}, 分段文本: {text[:50]}...{text[-50:]}")
     
-    # 初始化客户端
-    config = SubtitleConfig()
-    client = OpenAI(
-        base_url=config.openai_base_url,
-        api_key=config.openai_api_key
-    )
-    
-    # 使用系统提示词
-    system_prompt = SPLIT_SYSTEM_PROMPT.replace("[max_word_count_english]", str(max_word_count_english))
-    
-    # 在用户提示中添加对空格的强调
-    user_prompt = f"Please use multiple <br> tags to separate the following sentence. Make sure to preserve all spaces and punctuation exactly as they appear in the original text:\n{text}"
+    # 复用共享客户端，保持与API之间的长连接
+    client = client or get_client()
+    messages = _split_messages(text, max_word_count_english)
 
-    try:
+    def request_split() -> List[str]:
         # 调用API
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client,
             model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=messages,
             temperature=0.2,
-            timeout=80
+            timeout=80,
+            stage="split",
+            batch_id=batch_id
         )
+        return _parse_split_response(response, text, max_word_count_english)
         
-        # 处理响应
-        result = response.choices[0].message.content
-        if not result:
-            raise Exception("API返回为空")
-        logger.debug(f"API返回结果: \n\n{result}\n")
+    try:
+        # 接口错误由网关重试，空结果等内容错误在这里按同一个重试策略重试
+        return get_retry_policy().call(request_split, description="断句请求")
+    except Exception as e:
+        logger.error(f"API调用失败, 无法拆分句子: {str(e)}")
+        if not fallback:
+            raise
+        # 如果API调用失败，使用简单的句子拆分
+        return text.split(". ")
 
-        # 清理和分割文本 - 简化处理，保留原始格式
-        result = re.sub(r'\n+', '', result)
-        
-        # 直接按<br>分割，保留原始格式和空格
-        sentences = result.split("<br>")
-        
-        # 清理空白行，但保留内部空格
-        sentences = [seg.strip() for seg in sentences if seg.strip()]
 
-        # 验证句子长度
-        new_sentences = []
-        for sentence in sentences:
-            # 首先按结束标记拆分句子
-            segments = split_by_end_marks(sentence)
-            
-            # 对每个分段进行长度检查
-            for segment in segments:
-                threshold = max_word_count_english + 5
-                word_count = count_words(segment)
-                
-                if max_word_count_english < word_count < threshold:
-                    logger.info(f"长句: {word_count}, 文本: {segment}")
-                if word_count > threshold:
-                    logger.info(f"超长句: {word_count}, 文本: {segment}")
-                    # 尝试切分句子
-                    split_results = split_by_common_words(segment)
-                    new_sentences.extend(split_results)
-                else:
-                    new_sentences.append(segment)
-        
-        sentences = new_sentences
+async def asplit_by_llm(text: str,
+                        model: str = "gpt-4o-mini",
+                        max_word_count_english: int = 14,
+                        fallback: bool = True,
+                        client: Optional[OpenAI] = None,
+                        batch_id: Optional[int] = None) -> List[str]:
+    """split_by_llm 的协程版本，参数相同"""
+    logger.info(f"单词数{count_words(text)}, 分段文本: {text[:50]}...{text[-50:]}")
+    client = client or get_client()
+    messages = _split_messages(text, max_word_count_english)
 
-        # 验证结果
-        word_count = count_words(text)
-        expected_segments = word_count / max_word_count_english
-        actual_segments = len(sentences)
-        
-        if actual_segments < expected_segments * 0.9:
-            logger.warning(f"断句数量不足：预期 {expected_segments:.1f}，实际 {actual_segments}")
-            
-        return sentences
-        
+    async def request_split() -> List[str]:
+        response = await achat_completion(
+            client,
+            model=model,
+            messages=messages,
+            temperature=0.2,
+            timeout=80,
+            stage="split",
+            batch_id=batch_id
+        )
+        return _parse_split_response(response, text, max_word_count_english)
+
+    try:
+        return await get_retry_policy().acall(request_split, description="断句请求")
     except Exception as e:
-        if max_retries > 0:
-            logger.warning(f"API调用失败: {str(e)}，剩余重试次数: {max_retries-1}")
-            return split_by_llm(text, model, max_word_count_english, max_retries-1)
-        else:
-            logger.error(f"API调用失败, 无法拆分句子: {str(e)}")
-            # 如果API调用失败，使用简单的句子拆分
-            return text.split(". ")
-        
+        logger.error(f"API调用失败, 无法拆分句子: {str(e)}")
+        if not fallback:
+            raise
+        return text.split(". ")
+
 def split_by_common_words(text: str) -> List[str]:
     """
     在常见连接词处对句子进行分割
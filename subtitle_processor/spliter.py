@@ -1,10 +1,15 @@
 import difflib
 import re
+import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
-from typing import List
-from subtitle_processor.split_by_llm import split_by_llm
+from typing import Iterator, List, Optional, Sequence, Tuple
+from subtitle_processor.split_by_llm import asplit_by_llm, split_by_llm
 from subtitle_processor.data import SubtitleData, SubtitleSegment, save_split_results
 from subtitle_processor.config import get_default_config
+from subtitle_processor.journal import BatchJournal
+from subtitle_processor.llm_client import get_async_engine
+from subtitle_processor.usage_ledger import propagate
+from utils import tracing
 from utils.logger import setup_logger
 
 logger = setup_logger("subtitle_spliter")
@@ -12,6 +17,22 @@ logger = setup_logger("subtitle_spliter")
 FIXED_NUM_THREADS = 1  # 固定的线程数量
 SPLIT_RANGE = 30  # 在分割点前后寻找最大时间间隔的范围
 MAX_GAP = 1500  # 允许每个词语之间的最大时间间隔 ms
+WORD_CHAR_PATTERN = re.compile(r'\w', flags=re.UNICODE)
+# 各种语言的Unicode范围，count_words 按字符计数
+NON_ENGLISH_PATTERNS = [re.compile(pattern) for pattern in (
+    r'[\u4e00-\u9fff]',           # 中日韩统一表意文字
+    r'[\u3040-\u309f]',           # 平假名
+    r'[\u30a0-\u30ff]',           # 片假名
+    r'[\uac00-\ud7af]',           # 韩文音节
+    r'[\u0e00-\u0e7f]',           # 泰文
+    r'[\u0600-\u06ff]',           # 阿拉伯文
+    r'[\u0400-\u04ff]',           # 西里尔字母（俄文等）
+    r'[\u0590-\u05ff]',           # 希伯来文
+    r'[\u1e00-\u1eff]',           # 越南文
+    r'[\u3130-\u318f]',           # 韩文兼容字母
+)]
+# 对齐用的词元：单个中日韩字符，或连续的其它文字字符
+ALIGN_TOKEN_PATTERN = re.compile(r"[\u3040-\u30ff\u4e00-\u9fff\uac00-\ud7af]|[^\W\u3040-\u30ff\u4e00-\u9fff\uac00-\ud7af]+")
 
 class SubtitleProcessError(Exception):
     """字幕处理相关的异常"""
@@ -21,37 +42,23 @@ def is_pure_punctuation(s: str) -> bool:
     """
     检查字符串是否仅由标点符号组成
     """
-    return not re.search(r'\w', s, flags=re.UNICODE)
+    return not WORD_CHAR_PATTERN.search(s)
 
 
 def count_words(text: str) -> int:
     """
     统计多语言文本中的字符/单词数
     """
-    # 定义各种语言的Unicode范围
-    patterns = [
-        r'[\u4e00-\u9fff]',           # 中日韩统一表意文字
-        r'[\u3040-\u309f]',           # 平假名
-        r'[\u30a0-\u30ff]',           # 片假名
-        r'[\uac00-\ud7af]',           # 韩文音节
-        r'[\u0e00-\u0e7f]',           # 泰文
-        r'[\u0600-\u06ff]',           # 阿拉伯文
-        r'[\u0400-\u04ff]',           # 西里尔字母（俄文等）
-        r'[\u0590-\u05ff]',           # 希伯来文
-        r'[\u1e00-\u1eff]',           # 越南文
-        r'[\u3130-\u318f]',           # 韩文兼容字母
-    ]
-    
     # 统计所有非英文字符
     non_english_chars = 0
     remaining_text = text
     
-    for pattern in patterns:
+    for pattern in NON_ENGLISH_PATTERNS:
         # 计算当前语言的字符数
-        chars = len(re.findall(pattern, remaining_text))
+        chars = len(pattern.findall(remaining_text))
         non_english_chars += chars
         # 从文本中移除已计数的字符
-        remaining_text = re.sub(pattern, ' ', remaining_text)
+        remaining_text = pattern.sub(' ', remaining_text)
     
     # 计算英文单词数（处理剩余的文本）
     english_words = len(remaining_text.strip().split())
@@ -66,10 +73,186 @@ def preprocess_text(s: str) -> str:
     return ' '.join(s.split())
 
 
+def tokenize_for_alignment(text: str) -> List[str]:
+    """
+    提取用于对齐的词元：中日韩字符逐字，其它文字按单词，统一小写并忽略标点和空白
+    """
+    return [token.lower() for token in ALIGN_TOKEN_PATTERN.findall(text)]
+
+
+def _match_sentence_tokens(segments: Sequence[SubtitleSegment], sentences: List[str],
+                           threshold: float) -> Tuple[List[Optional[Tuple[int, int]]], List[int]]:
+    """
+    用一次 SequenceMatcher 找出每个句子的匹配词元落在哪些分段上
+
+    Returns:
+        (每个句子匹配词元所在的首尾分段，未匹配或与前一句完全重叠的为 None; 每个句子的词元数)
+    """
+    seg_tokens = []
+    token_seg = []  # 每个分段词元所属的分段下标
+    for index, seg in enumerate(segments):
+        tokens = tokenize_for_alignment(seg.text)
+        seg_tokens.extend(tokens)
+        token_seg.extend([index] * len(tokens))
+
+    sent_tokens = []
+    token_sent = []  # 每个句子词元所属的句子下标
+    sent_sizes = []
+    for index, sentence in enumerate(sentences):
+        tokens = tokenize_for_alignment(sentence)
+        sent_tokens.extend(tokens)
+        token_sent.extend([index] * len(tokens))
+        sent_sizes.append(len(tokens))
+
+    first_seg = [None] * len(sentences)
+    last_seg = [None] * len(sentences)
+    matched = [0] * len(sentences)
+    matcher = difflib.SequenceMatcher(None, sent_tokens, seg_tokens, autojunk=False)
+    for a, b, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            sent_index = token_sent[a + offset]
+            seg_index = token_seg[b + offset]
+            matched[sent_index] += 1
+            if first_seg[sent_index] is None:
+                first_seg[sent_index] = seg_index
+            last_seg[sent_index] = seg_index
+
+    anchors: List[Optional[Tuple[int, int]]] = []
+    prev_end = -1
+    for index in range(len(sentences)):
+        if first_seg[index] is None or matched[index] < sent_sizes[index] * threshold:
+            anchors.append(None)
+            continue
+        # 前一句已占用的分段不再重复使用
+        start = max(first_seg[index], prev_end + 1)
+        end = last_seg[index]
+        if end < start:
+            anchors.append(None)
+            continue
+        anchors.append((start, end))
+        prev_end = end
+    return anchors, sent_sizes
+
+
+def _split_gap(start: int, end: int, sizes: List[int]) -> List[Optional[Tuple[int, int]]]:
+    """按句子词元数的比例把分段区间 [start, end] 依次分给连续的几个句子，分不到分段的句子为 None"""
+    weights = [max(size, 1) for size in sizes]
+    total = sum(weights)
+    count = end - start + 1
+    spans: List[Optional[Tuple[int, int]]] = []
+    cursor = start
+    cumulative = 0
+    for weight in weights:
+        cumulative += weight
+        boundary = start + round(count * cumulative / total)
+        spans.append((cursor, boundary - 1) if boundary > cursor else None)
+        cursor = max(cursor, boundary)
+    return spans
+
+
+def _fill_spans(anchors: List[Optional[Tuple[int, int]]], sizes: List[int],
+                seg_count: int) -> List[Optional[Tuple[int, int]]]:
+    """
+    把锚点之外的分段分配给句子，使所有分段都属于某个句子
+
+    两个已匹配句子之间若有未匹配的句子，中间未被占用的分段按比例分给这些句子；
+    没有未匹配句子时并入后一个句子。第一个句子之前的分段并入第一个区间，
+    最后一个句子之后的分段并入最后一个区间。
+    """
+    spans: List[Optional[Tuple[int, int]]] = [None] * len(anchors)
+    prev_end = -1
+    last_index = None  # 最后一个得到区间的句子
+    run: List[int] = []  # 两个锚点之间未匹配的句子
+    for index in range(len(anchors) + 1):
+        if index < len(anchors) and anchors[index] is None:
+            run.append(index)
+            continue
+        gap_end = anchors[index][0] - 1 if index < len(anchors) else seg_count - 1
+        start = prev_end + 1
+        if run and gap_end >= start:
+            for sent_index, span in zip(run, _split_gap(start, gap_end, [sizes[i] for i in run])):
+                spans[sent_index] = span
+                if span is not None:
+                    last_index = sent_index
+            start = gap_end + 1
+        run = []
+        if index < len(anchors):
+            spans[index] = (start, anchors[index][1])
+            prev_end = anchors[index][1]
+            last_index = index
+        elif last_index is not None and start <= gap_end:
+            spans[last_index] = (spans[last_index][0], gap_end)
+    return spans
+
+
+def align_sentences_to_segments(segments: Sequence[SubtitleSegment], sentences: List[str],
+                                threshold: float = 0.5) -> List[Optional[Tuple[int, int]]]:
+    """
+    把整批句子一次性对齐到字幕分段上
+
+    将所有句子和所有分段分别展开成词元序列，用一次 SequenceMatcher（关闭 autojunk）
+    找出相同的词元块作为锚点，每个句子取其匹配词元所在分段的首尾作为区间。
+    锚点之间未被匹配的分段优先分给中间未匹配的句子，否则并入后一个句子；
+    首尾多出的分段并入第一个和最后一个区间，保证区间连续、不重叠且覆盖所有分段。
+
+    Args:
+        segments: 字幕分段
+        sentences: LLM 返回的句子列表
+        threshold: 句子词元的最低匹配比例，低于该值视为未匹配
+
+    Returns:
+        每个句子对应的分段区间 (start, end)（包含两端），分不到分段的句子为 None
+    """
+    anchors, sizes = _match_sentence_tokens(segments, sentences, threshold)
+    return _fill_spans(anchors, sizes, len(segments))
+
+
 def merge_segments_based_on_sentences(segments: List[SubtitleSegment], sentences: List[str], max_unmatched: int = 5) -> List[SubtitleSegment]:
     """
     基于提供的句子列表合并字幕分段
     
+    先用词元级对齐一次性确定所有句子的分段区间；对齐失败的句子过多时，
+    退回逐句滑动窗口匹配。
+    
+    Args:
+        segments: 字幕段列表
+        sentences: 句子列表
+        max_unmatched: 允许的最大未匹配句子数量，超过此数量将返回原始分段
+        
+    Returns:
+        合并后的 SubtitleSegment 列表
+    """
+    anchors, sizes = _match_sentence_tokens(segments, sentences, 0.5)
+    unmatched = [sentence for sentence, anchor in zip(sentences, anchors) if anchor is None]
+    if len(unmatched) > max_unmatched or len(unmatched) == len(sentences):
+        logger.warning(f"词元对齐未匹配 {len(unmatched)} 句，改用滑动窗口匹配")
+        return merge_by_sliding_window(segments, sentences, max_unmatched)
+    for sentence in unmatched:
+        logger.debug(f"句子未能按词元匹配，按位置分配分段: {sentence}")
+    spans = _fill_spans(anchors, sizes, len(segments))
+
+    new_segments = []
+    for sentence, span in zip(sentences, spans):
+        if span is None:
+            logger.warning(f"无法匹配句子: {sentence}")
+            continue
+        start_seg_index, end_seg_index = span
+        segs_to_merge = segments[start_seg_index:end_seg_index + 1]
+
+        # 按照时间切分避免合并跨度大的
+        seg_groups = merge_by_time_gaps(segs_to_merge, max_gap=MAX_GAP)
+
+        # 直接使用LLM返回的原始句子，完全保留格式和标点
+        merged_text = preprocess_text(sentence)
+        for group in seg_groups:
+            new_segments.append(SubtitleSegment(merged_text, group[0].start_time, group[-1].end_time))
+
+    return new_segments
+
+def merge_by_sliding_window(segments: List[SubtitleSegment], sentences: List[str], max_unmatched: int = 5) -> List[SubtitleSegment]:
+    """
+    逐句在滑动窗口内用 difflib 查找最相似的分段区间并合并，作为对齐失败时的后备方法
+    
     Args:
         segments: 字幕段列表
         sentences: 句子列表
@@ -253,10 +436,39 @@ def merge_by_time_gaps(segments: List[SubtitleSegment], max_gap: int = MAX_GAP,
     return result
 
 
+def _split_input(segments: List[SubtitleSegment], model: str, max_word_count_english: Optional[int],
+                 batch_index: Optional[int], journal: Optional[BatchJournal]):
+    """合并分段文本，并查询断点日志；返回 (文本, 单词数上限, 断点日志键, 已记录的断句结果或None)"""
+    config = get_default_config()
+    max_word_count_english = max_word_count_english or config.max_word_count_english
+        
+    # 修改合并文本的方式，添加空格
+    txt = " ".join([seg.text.strip() for seg in segments])
+    # 记录当前批次的单词数
+    current_words = count_words(txt)
+    logger.info(f"批次 {batch_index}: 处理文本单词数: {current_words}")
+    
+    # 使用LLM拆分句子，已记录在断点日志中的批次不再调用API
+    journal_key = BatchJournal.make_key(model, max_word_count_english, txt) if journal else None
+    sentences = journal.get("split", journal_key) if journal else None
+    if sentences is not None:
+        logger.info(f"批次 {batch_index}: 从断点日志恢复断句结果")
+    return txt, max_word_count_english, journal_key, sentences
+
+
+def _merge_split_result(segments: List[SubtitleSegment], sentences: List[str],
+                        batch_index: Optional[int]) -> List[SubtitleSegment]:
+    logger.info(f"批次 {batch_index}: 句子提取完成，共 {len(sentences)} 句")
+    # 对当前分段进行合并处理
+    merged_segments = merge_segments_based_on_sentences(segments, sentences)
+    return merged_segments
+
+
 def process_by_llm(segments: List[SubtitleSegment], 
                    model: str = "gpt-4o-mini",
                    max_word_count_english: int = None,
-                   batch_index: int = None) -> List[SubtitleSegment]:
+                   batch_index: int = None,
+                   journal: Optional[BatchJournal] = None) -> List[SubtitleSegment]:
     """
     使用LLM处理分段
     
@@ -265,27 +477,48 @@ def process_by_llm(segments: List[SubtitleSegment],
         model: 使用的语言模型
         max_word_count_english: 英文最大单词数
         batch_index: 批次编号
+        journal: 断点日志，已完成的批次直接复用断句结果
         
     Returns:
         List[SubtitleSegment]: 处理后的字幕分段列表
     """
-    config = get_default_config()
-    max_word_count_english = max_word_count_english or config.max_word_count_english
-        
-    # 修改合并文本的方式，添加空格
-    txt = " ".join([seg.text.strip() for seg in segments])
-    # 记录当前批次的单词数
-    current_words = count_words(txt)
-    logger.info(f"批次 {batch_index}: 处理文本单词数: {current_words}")
-    
-    # 使用LLM拆分句子
-    sentences = split_by_llm(txt, 
-                           model=model, 
-                           max_word_count_english=max_word_count_english)
-    logger.info(f"批次 {batch_index}: 句子提取完成，共 {len(sentences)} 句")
-    # 对当前分段进行合并处理
-    merged_segments = merge_segments_based_on_sentences(segments, sentences)
-    return merged_segments
+    txt, max_word_count_english, journal_key, sentences = _split_input(
+        segments, model, max_word_count_english, batch_index, journal)
+    if sentences is None:
+        try:
+            sentences = split_by_llm(txt, 
+                                   model=model, 
+                                   max_word_count_english=max_word_count_english,
+                                   fallback=False,
+                                   batch_id=batch_index)
+            if journal:
+                journal.append("split", journal_key, sentences)
+        except Exception:
+            # API调用失败时使用简单的句子拆分，该结果不写入断点日志，下次运行时重新请求
+            sentences = txt.split(". ")
+    return _merge_split_result(segments, sentences, batch_index)
+
+
+async def aprocess_by_llm(segments: List[SubtitleSegment],
+                          model: str = "gpt-4o-mini",
+                          max_word_count_english: int = None,
+                          batch_index: int = None,
+                          journal: Optional[BatchJournal] = None) -> List[SubtitleSegment]:
+    """process_by_llm 的协程版本，参数相同"""
+    txt, max_word_count_english, journal_key, sentences = _split_input(
+        segments, model, max_word_count_english, batch_index, journal)
+    if sentences is None:
+        try:
+            sentences = await asplit_by_llm(txt,
+                                            model=model,
+                                            max_word_count_english=max_word_count_english,
+                                            fallback=False,
+                                            batch_id=batch_index)
+            if journal:
+                journal.append("split", journal_key, sentences)
+        except Exception:
+            sentences = txt.split(". ")
+    return _merge_split_result(segments, sentences, batch_index)
 
 
 def split_by_sentences(asr_data: SubtitleData, word_threshold: int = 500) -> List[SubtitleData]:
@@ -299,124 +532,123 @@ def split_by_sentences(asr_data: SubtitleData, word_threshold: int = 500) -> Lis
     Returns:
         List[SubtitleData]: 按单词数阈值分组后的字幕数据列表
     """
-    # 定义句子结束标志
-    sentence_end_markers = ['.', '!', '?', '。', '！', '？', '…']
+    # 定义句子结束标志（元组，str.endswith 一次检查全部）
+    sentence_end_markers = ('.', '!', '?', '。', '！', '？', '…')
     # 定义分句标点
-    split_markers = [',', '，', ';', '；', '、']
+    split_markers = (',', '，', ';', '；', '、')
     
-    # 预处理字幕数据
-    segments = preprocess_segments(asr_data.segments)
+    # 预处理字幕数据（同 preprocess_segments），直接在列上筛选；没有纯标点的段时不复制。
+    # 批次都是该数据的切片视图，不再复制和排序
+    data = asr_data.where(lambda text: not is_pure_punctuation(text))
+    texts = data.texts
     
-    # 按句子切分
-    sentence_segments = []
-    current_sentence_segments = []
+    # 按句子切分，记录每个句子的 [start, end) 索引范围
+    sentence_ranges = []
+    sentence_start = 0
     
-    for seg in segments:
-        current_sentence_segments.append(seg)
-        text = seg.text.strip()
+    for i, text in enumerate(texts):
+        text = text.strip()
         
         # 检查是否是句子结尾
-        if any(text.endswith(marker) for marker in sentence_end_markers):
-            if current_sentence_segments:
-                sentence_segments.append(current_sentence_segments)
-                current_sentence_segments = []
+        if text.endswith(sentence_end_markers):
+            sentence_ranges.append((sentence_start, i + 1))
+            sentence_start = i + 1
     
     # 处理最后一组未完成的句子
-    if current_sentence_segments:
-        sentence_segments.append(current_sentence_segments)
+    if sentence_start < len(texts):
+        sentence_ranges.append((sentence_start, len(texts)))
     
-    # 按单词数阈值分组
+    # 按单词数阈值分组，当前批次为 [batch_start, batch_end)
     batched_data = []
-    current_batch = []
-    current_segments = []
+    batch_start = batch_end = 0
     current_word_count = 0
     
-    def split_long_sentence(sentence_segs: List[SubtitleSegment]) -> List[List[SubtitleSegment]]:
+    def split_long_sentence(start: int, end: int) -> List[Tuple[int, int]]:
         """拆分过长的句子"""
         result = []
-        temp_segs = []
+        part_start = start
         temp_word_count = 0
         
-        for seg in sentence_segs:
-            seg_text = seg.text.strip()
+        for i in range(start, end):
+            seg_text = texts[i].strip()
             seg_word_count = count_words(seg_text)
             
             # 如果当前段落加上之前的已经超过阈值，并且当前段落以分句标点结尾
             if (temp_word_count + seg_word_count > word_threshold and 
-                any(seg_text.endswith(marker) for marker in split_markers)):
-                if temp_segs:
-                    result.append(temp_segs)
-                    temp_segs = []
+                seg_text.endswith(split_markers)):
+                if i > part_start:
+                    result.append((part_start, i))
+                    part_start = i
                     temp_word_count = 0
             
-            temp_segs.append(seg)
             temp_word_count += seg_word_count
             
             # 如果累积的单词数已经接近阈值，强制分段
             if temp_word_count >= word_threshold * 1.2:
-                if temp_segs:
-                    result.append(temp_segs)
-                    temp_segs = []
-                    temp_word_count = 0
+                result.append((part_start, i + 1))
+                part_start = i + 1
+                temp_word_count = 0
         
         # 处理剩余的段落
-        if temp_segs:
-            result.append(temp_segs)
+        if part_start < end:
+            result.append((part_start, end))
         
         return result
     
-    for sentence in sentence_segments:
+    for start, end in sentence_ranges:
         # 计算当前句子的单词数
-        sentence_text = " ".join([seg.text for seg in sentence])
+        sentence_text = " ".join(texts[start:end])
         sentence_word_count = count_words(sentence_text)
         
         # 如果当前句子超过阈值，尝试拆分
         if sentence_word_count >= word_threshold:
             # 先保存当前批次
-            if current_segments:
-                batched_data.append(SubtitleData(current_segments))
-                current_batch = []
-                current_segments = []
-                current_word_count = 0
+            if batch_end > batch_start:
+                batched_data.append(data[batch_start:batch_end])
             
             # 拆分长句子
-            split_parts = split_long_sentence(sentence)
-            for part in split_parts:
-                batched_data.append(SubtitleData(part))
+            for part_start, part_end in split_long_sentence(start, end):
+                batched_data.append(data[part_start:part_end])
+            batch_start = batch_end = end
+            current_word_count = 0
             continue
             
         # 如果添加当前句子后超过阈值，先保存当前批次，然后开始新批次
-        if current_word_count + sentence_word_count > word_threshold and current_segments:
-            batched_data.append(SubtitleData(current_segments))
-            current_batch = []
-            current_segments = []
+        if current_word_count + sentence_word_count > word_threshold and batch_end > batch_start:
+            batched_data.append(data[batch_start:batch_end])
+            batch_start = start
             current_word_count = 0
         
-        current_batch.append(sentence)
-        current_segments.extend(sentence)
+        batch_end = end
         current_word_count += sentence_word_count
     
     # 处理最后一批未满的数据
-    if current_segments:
-        batched_data.append(SubtitleData(current_segments))
+    if batch_end > batch_start:
+        batched_data.append(data[batch_start:batch_end])
     
     return batched_data
 
 
-def merge_segments(asr_data: SubtitleData, 
-                   model: str = "gpt-4o-mini", 
-                   num_threads: int = FIXED_NUM_THREADS, 
-                   save_split: str = None) -> SubtitleData:
+def iter_merge_segments(asr_data: SubtitleData,
+                        model: str = "gpt-4o-mini",
+                        num_threads: int = FIXED_NUM_THREADS,
+                        executor: Optional[ThreadPoolExecutor] = None,
+                        journal: Optional[BatchJournal] = None) -> Iterator[List[SubtitleSegment]]:
     """
-    合并字幕分段
-    
+    并行断句，按时间顺序逐批产出已经定稿的字幕段
+
+    所有断句批次一次性提交，结果按批次顺序产出：后面的批次先完成时暂存，
+    等前面的批次完成后再一起产出，保证字幕编号稳定。
+    每个批次的最后一段可能与下一批次的第一段合并（merge_short_segment），
+    因此暂留到下一批次到达后再产出，结果与全部完成后统一合并相同。
+
     Args:
         asr_data: 字幕数据
         model: 使用的语言模型
         num_threads: 线程数量
-        save_split: 保存断句结果的文件路径
+        executor: 复用的线程池，为None时按num_threads临时创建；启用异步引擎时不使用
+        journal: 断点日志，为None时不记录断句进度
     """
-
     # 预处理字幕数据，移除纯标点符号的分段，并处理仅包含字母和撇号的文本
     asr_data.segments = preprocess_segments(asr_data.segments)
     
@@ -428,29 +660,87 @@ def merge_segments(asr_data: SubtitleData,
 
     # 检查每个批次的单词数
     for i, segment in enumerate(asr_data_segments):
-        text = " ".join([seg.text.strip() for seg in segment.segments])
+        text = " ".join([text.strip() for text in segment.texts])
         word_count = count_words(text)
         logger.info(f"批次 {i+1}/{total_segments}: 单词数 {word_count}")
 
     # 多线程处理每个分段
     logger.info("开始并行处理每个分段...")
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        def process_segment(args):
-            index, asr_data_part = args
-            try:
-                return process_by_llm(asr_data_part.segments, model=model, batch_index=index+1)
-            except Exception as e:
-                raise Exception(f"批次 {index+1} LLM处理失败: {str(e)}")
-
-        # 并行处理所有分段，添加批次编号
-        processed_segments = list(executor.map(process_segment, enumerate(asr_data_segments)))
-
-    # 合并所有处理后的分段
-    final_segments = []
-    for segment in processed_segments:
-        final_segments.extend(segment)
+    def process_segment(args):
+        index, asr_data_part = args
+        try:
+            with tracing.span("split_batch", cat="split", batch=index+1, segments=len(asr_data_part)):
+                return process_by_llm(asr_data_part.segments, model=model, batch_index=index+1, journal=journal)
+        except Exception as e:
+            raise Exception(f"批次 {index+1} LLM处理失败: {str(e)}")
 
-    final_segments.sort(key=lambda seg: seg.start_time)
+    async def aprocess_segment(index, asr_data_part):
+        try:
+            with tracing.async_span("split_batch", cat="split", batch=index+1, segments=len(asr_data_part)):
+                return await aprocess_by_llm(asr_data_part.segments, model=model, batch_index=index+1,
+                                             journal=journal)
+        except Exception as e:
+            raise Exception(f"批次 {index+1} LLM处理失败: {str(e)}")
+
+    # 并行处理所有分段，添加批次编号；结果按提交顺序返回，提前结束迭代时会取消尚未完成的批次。
+    # 启用异步引擎时每个批次是引擎事件循环中的一个协程，否则是线程池中的一个任务
+    own_executor = None
+    engine = get_async_engine()
+    if engine is not None:
+        results = _ordered_results([engine.spawn(aprocess_segment(index, part))
+                                    for index, part in enumerate(asr_data_segments)])
+    else:
+        if executor is None:
+            executor = own_executor = ThreadPoolExecutor(max_workers=num_threads)
+        task = propagate(tracing.queued(process_segment, "split_batch"))
+        results = executor.map(task, enumerate(asr_data_segments))
+    try:
+        carry: List[SubtitleSegment] = []
+        for segments in results:
+            segments = carry + sorted(segments, key=lambda seg: seg.start_time)
+            merge_short_segment(segments)
+            carry = segments[-1:]
+            if len(segments) > 1:
+                yield segments[:-1]
+        if carry:
+            yield carry
+    finally:
+        results.close()
+        if own_executor is not None:
+            own_executor.shutdown(wait=True)
+
+
+def _ordered_results(futures: List[concurrent.futures.Future]) -> Iterator:
+    """按提交顺序取出结果；迭代提前结束（出错或被关闭）时取消其余批次"""
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def merge_segments(asr_data: SubtitleData, 
+                   model: str = "gpt-4o-mini", 
+                   num_threads: int = FIXED_NUM_THREADS, 
+                   save_split: str = None,
+                   executor: Optional[ThreadPoolExecutor] = None,
+                   journal: Optional[BatchJournal] = None) -> SubtitleData:
+    """
+    合并字幕分段
+    
+    Args:
+        asr_data: 字幕数据
+        model: 使用的语言模型
+        num_threads: 线程数量
+        save_split: 保存断句结果的文件路径
+        executor: 复用的线程池，为None时按num_threads临时创建
+        journal: 断点日志，为None时不记录断句进度
+    """
+    final_segments = []
+    for segments in iter_merge_segments(asr_data, model=model, num_threads=num_threads,
+                                        executor=executor, journal=journal):
+        final_segments.extend(segments)
 
     # 如果需要保存断句结果
     if save_split:
@@ -471,8 +761,6 @@ def merge_segments(asr_data: SubtitleData,
         except Exception as e:
             logger.error(f"保存断句结果失败: {str(e)}")
 
-    merge_short_segment(final_segments)
-
     # 创建最终的字幕数据对象
-    final_asr_data = SubtitleData(final_segments)
-    return final_asr_data
\ No newline at end of file
+    final_asr_data = SubtitleData(final_segments, presorted=True)
+    return final_asr_data
@@ -1,33 +1,93 @@
-from typing import Dict, Optional
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 from openai import OpenAI
-from .prompts import SUMMARIZER_PROMPT
+from .prompts import REDUCE_SUMMARY_PROMPT, SECTION_SUMMARY_NOTE, SUMMARIZER_PROMPT
+from .cache import TranslationCache
 from .config import SubtitleConfig
+from .data import SubtitleData
+from .llm_client import achat_completion, chat_completion, estimate_tokens, get_async_engine, get_client
+from .usage_ledger import propagate
 from utils.json_repair import parse_llm_response
 from utils.logger import setup_logger
 
 logger = setup_logger("subtitle_summarizer")
 
+# 一个分段超过上限的这个比例后，遇到句末就结束分段
+SECTION_SOFT_RATIO = 0.8
+
+
+def _format_time(ms: int) -> str:
+    minutes, seconds = divmod(ms // 1000, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
 
 class SubtitleSummarizer:
     def __init__(
         self,
-        config: Optional[SubtitleConfig] = None
+        config: Optional[SubtitleConfig] = None,
+        client: Optional[OpenAI] = None,
+        cache: Optional[TranslationCache] = None
     ):
         self.config = config or SubtitleConfig()
-        self.client = OpenAI(
-            base_url=self.config.openai_base_url,
-            api_key=self.config.openai_api_key
-        )
+        self.client = client or get_client(self.config)
+        # 摘要缓存（与批次翻译缓存共用），为None时每次都重新总结
+        self.cache = cache
+
+    def plan_sections(self, asr_data: SubtitleData) -> Optional[List[Dict]]:
+        """
+        按 token 上限把字幕切分为连续的分段，用于分段总结
+
+        Args:
+            asr_data: 字幕数据（断句前后均可）
+        Returns:
+            分段列表，每段包含 start_time、end_time 和 text；全文不超过上限时返回None
+        """
+        limit = self.config.summary_chunk_tokens
+        texts = asr_data.texts
+        if limit <= 0 or not texts:
+            return None
+        token_counts = [estimate_tokens(text) + 1 for text in texts]
+        if sum(token_counts) <= limit:
+            return None
+
+        starts = [0]
+        tokens = 0
+        for i, count in enumerate(token_counts):
+            tokens += count
+            text = texts[i].rstrip()
+            at_sentence_end = text.endswith(('.', '?', '!', '。', '？', '！'))
+            if i + 1 < len(texts) and (tokens >= limit or (tokens >= limit * SECTION_SOFT_RATIO and at_sentence_end)):
+                starts.append(i + 1)
+                tokens = 0
+        # 最后一段过短时并入前一段
+        if len(starts) > 1 and tokens < limit * (1 - SECTION_SOFT_RATIO):
+            starts.pop()
+        ends = starts[1:] + [len(texts)]
+        return [self._make_section(asr_data, start, end) for start, end in zip(starts, ends)]
+
+    @staticmethod
+    def _make_section(asr_data: SubtitleData, start: int, end: int) -> Dict:
+        part = asr_data[start:end]
+        return {
+            "start_time": part[0].start_time,
+            "end_time": part[len(part) - 1].end_time,
+            "text": part.to_txt(),
+        }
 
-    def summarize(self, subtitle_content: str, input_file: str) -> Dict:
+    def summarize(self, subtitle_content: str, input_file: str,
+                  sections: Optional[List[Dict]] = None) -> Dict:
         """
         总结字幕内容
         Args:
             subtitle_content: 字幕内容
             input_file: 输入的字幕文件路径
+            sections: plan_sections 切分的分段，提供时分段并行总结后再合并
         Returns:
-            Dict: 包含总结信息的字典
+            Dict: 包含总结信息的字典；分段总结时另有 sections（每段的时间范围和总结）
         """
         try:
             # 使用 pathlib 处理文件名
@@ -36,35 +96,244 @@ class SubtitleSummarizer:
             readable_filename = path.stem.replace('_', ' ').replace('-', ' ')
 
             logger.info(f"可读性文件名: {readable_filename}")            
-            # 更新提示词，强调文件名的权威性
-            message = [
-                {"role": "system", "content": (
-                    "You are a precise subtitle summarizer. "
-                    "When processing proper nouns and product names:"
-                    "1. Use the filename as reference for product names"
-                    "2. Only correct terms that appear to be ASR errors based on:"
-                    "   - Similar pronunciation"
-                    "   - Context indicating they refer to the same thing"
-                    "3. Do not modify other technical terms or module names that are clearly different"
-                    f"{SUMMARIZER_PROMPT}"
-                )},
-                {"role": "user", "content": f"Filename: {readable_filename}\n\nContent:\n{subtitle_content}"}
-            ]
-            
-            response = self.client.chat.completions.create(
-                model=self.config.llm_model,
-                messages=message,
-                temperature=0.7,
-                timeout=80
-            )
-            
-            summary = response.choices[0].message.content
-            return {
-                "summary": summary
-            }
+            # 摘要是翻译批次缓存键的一部分，复用上次的摘要，重新运行时批次才能命中缓存
+            cache_key = self._cache_key(subtitle_content, sections)
+            cached = self.cache.get_summary(cache_key) if cache_key else None
+            if cached is not None:
+                logger.info("使用缓存的字幕摘要，跳过API调用")
+                return cached
+
+            if sections:
+                result = self._summarize_sections(sections, readable_filename)
+                complete = result["summary"] and all(s["summary"] for s in result["sections"])
+            else:
+                summary = self._request_summary(self._system_prompt(), readable_filename, subtitle_content)
+                result = {
+                    "summary": summary
+                }
+                complete = bool(summary)
+            # 只缓存完整的摘要，部分分段失败时下次重新总结
+            if cache_key and complete:
+                self.cache.set_summary(cache_key, result)
+            return result
             
         except Exception as e:
             logger.error(f"总结字幕失败: {e}")
             return {
                 "summary": ""
             }
+
+    def _cache_key(self, subtitle_content: str, sections: Optional[List[Dict]]) -> Optional[str]:
+        """摘要的缓存键，未启用缓存时返回None；文件名只是参考，不计入键，重新编码的副本同样命中"""
+        if self.cache is None:
+            return None
+        prompts = [self._system_prompt()]
+        if sections:
+            prompts += [SECTION_SUMMARY_NOTE, REDUCE_SUMMARY_PROMPT]
+        return self.cache.make_summary_key(self.config.llm_model, prompts, subtitle_content, sections)
+
+    @staticmethod
+    def _system_prompt(note: str = "") -> str:
+        # 更新提示词，强调文件名的权威性
+        return (
+            "You are a precise subtitle summarizer. "
+            "When processing proper nouns and product names:"
+            "1. Use the filename as reference for product names"
+            "2. Only correct terms that appear to be ASR errors based on:"
+            "   - Similar pronunciation"
+            "   - Context indicating they refer to the same thing"
+            "3. Do not modify other technical terms or module names that are clearly different"
+            f"{SUMMARIZER_PROMPT}{note}"
+        )
+
+    @staticmethod
+    def _summary_messages(system_prompt: str, readable_filename: str, content: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Filename: {readable_filename}\n\nContent:\n{content}"}
+        ]
+
+    def _request_summary(self, system_prompt: str, readable_filename: str, content: str,
+                         batch_id=None) -> str:
+        response = chat_completion(
+            self.client,
+            model=self.config.llm_model,
+            messages=self._summary_messages(system_prompt, readable_filename, content),
+            temperature=0.7,
+            timeout=80,
+            stage="summary",
+            batch_id=batch_id
+        )
+        return response.choices[0].message.content
+
+    async def _arequest_summary(self, system_prompt: str, readable_filename: str, content: str,
+                                batch_id=None) -> str:
+        response = await achat_completion(
+            self.client,
+            model=self.config.llm_model,
+            messages=self._summary_messages(system_prompt, readable_filename, content),
+            temperature=0.7,
+            timeout=80,
+            stage="summary",
+            batch_id=batch_id
+        )
+        return response.choices[0].message.content
+
+    def _section_prompt(self, index: int, total: int, section: Dict) -> Tuple[str, str]:
+        """第 index 段总结的系统提示词和时间范围"""
+        time_range = f"{_format_time(section['start_time'])} - {_format_time(section['end_time'])}"
+        note = (SECTION_SUMMARY_NOTE.replace("[SectionIndex]", str(index + 1))
+                .replace("[SectionCount]", str(total)).replace("[TimeRange]", time_range))
+        return self._system_prompt(note), time_range
+
+    def _summarize_sections(self, sections: List[Dict], readable_filename: str) -> Dict:
+        """分段并行总结（map），再逐层合并为全文总结（reduce）"""
+        total = len(sections)
+        logger.info(f"字幕超过单次总结上限（约{self.config.summary_chunk_tokens} token），分{total}段并行总结")
+        engine = get_async_engine()
+        if engine is not None:
+            return engine.run(self._asummarize_sections(sections, readable_filename))
+
+        def summarize_section(args: Tuple[int, Dict]) -> str:
+            index, section = args
+            system_prompt, time_range = self._section_prompt(index, total, section)
+            try:
+                summary = self._request_summary(system_prompt, readable_filename, section["text"],
+                                                batch_id=f"section-{index + 1}")
+            except Exception as e:
+                # 单段失败只影响该段，合并时跳过
+                logger.error(f"第{index + 1}/{total}段总结失败: {e}")
+                return ""
+            logger.info(f"第{index + 1}/{total}段总结完成（{time_range}）")
+            return summary or ""
+
+        # 摘要本身在共享线程池中执行，分段请求使用独立的线程池，避免等待自己所在的线程池
+        with ThreadPoolExecutor(max_workers=min(total, self.config.thread_num)) as executor:
+            section_summaries = list(executor.map(propagate(summarize_section), enumerate(sections)))
+            completed = [text for text in section_summaries if text]
+            try:
+                summary = self._reduce(completed, readable_filename, executor) if completed else ""
+            except Exception as e:
+                # 合并失败时仍保留各段总结，翻译批次使用所在分段的总结
+                logger.error(f"合并分段总结失败，只使用分段总结: {e}")
+                summary = ""
+        return self._sections_result(sections, section_summaries, summary)
+
+    async def _asummarize_sections(self, sections: List[Dict], readable_filename: str) -> Dict:
+        """_summarize_sections 的协程版本：各段总结和每一层合并的请求用 gather 并发"""
+        total = len(sections)
+
+        async def summarize_section(index: int, section: Dict) -> str:
+            system_prompt, time_range = self._section_prompt(index, total, section)
+            try:
+                summary = await self._arequest_summary(system_prompt, readable_filename, section["text"],
+                                                       batch_id=f"section-{index + 1}")
+            except Exception as e:
+                logger.error(f"第{index + 1}/{total}段总结失败: {e}")
+                return ""
+            logger.info(f"第{index + 1}/{total}段总结完成（{time_range}）")
+            return summary or ""
+
+        section_summaries = await asyncio.gather(*(summarize_section(index, section)
+                                                   for index, section in enumerate(sections)))
+        completed = [text for text in section_summaries if text]
+        try:
+            summary = await self._areduce(completed, readable_filename) if completed else ""
+        except Exception as e:
+            logger.error(f"合并分段总结失败，只使用分段总结: {e}")
+            summary = ""
+        return self._sections_result(sections, list(section_summaries), summary)
+
+    @staticmethod
+    def _sections_result(sections: List[Dict], section_summaries: List[str], summary: str) -> Dict:
+        # 全文的术语表附加到每个分段总结中，保证各段翻译的术语一致
+        overall = parse_llm_response(summary) if summary else None
+        return {
+            "summary": summary,
+            "terms": overall.get("terms") if isinstance(overall, dict) else None,
+            "sections": [
+                {"start_time": section["start_time"], "end_time": section["end_time"], "summary": text}
+                for section, text in zip(sections, section_summaries)
+            ],
+        }
+
+    def _reduce_groups(self, summaries: List[str], level: int) -> List[List[str]]:
+        """把一层的总结按 token 上限分组，每组合并为一份"""
+        limit = self.config.summary_chunk_tokens
+        groups = [[]]
+        tokens = 0
+        for summary in summaries:
+            count = estimate_tokens(summary)
+            if groups[-1] and tokens + count > limit:
+                groups.append([])
+                tokens = 0
+            groups[-1].append(summary)
+            tokens += count
+        if len(groups) == len(summaries):
+            # 每份总结都已接近上限，两两合并以保证逐层减少
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        logger.info(f"第{level}层合并: {len(summaries)}份总结 -> {len(groups)}份")
+        return groups
+
+    @staticmethod
+    def _reduce_content(group: List[str]) -> str:
+        return "\n\n".join(f"<section_analysis index=\"{i + 1}\">\n{text}\n</section_analysis>"
+                           for i, text in enumerate(group))
+
+    def _reduce(self, summaries: List[str], readable_filename: str, executor: ThreadPoolExecutor) -> str:
+        """合并分段总结，输入超过上限时先分组合并，逐层进行直到只剩一份"""
+        level = 1
+        while len(summaries) > 1:
+            groups = self._reduce_groups(summaries, level)
+
+            def reduce_group(args: Tuple[int, List[str]], level=level) -> str:
+                index, group = args
+                if len(group) == 1:
+                    return group[0]
+                return self._request_summary(REDUCE_SUMMARY_PROMPT, readable_filename, self._reduce_content(group),
+                                             batch_id=f"reduce-{level}-{index + 1}")
+
+            summaries = list(executor.map(propagate(reduce_group), enumerate(groups)))
+            level += 1
+        return summaries[0]
+
+    async def _areduce(self, summaries: List[str], readable_filename: str) -> str:
+        """_reduce 的协程版本，同一层的各组并发合并"""
+        level = 1
+        while len(summaries) > 1:
+            groups = self._reduce_groups(summaries, level)
+
+            async def reduce_group(index: int, group: List[str], level=level) -> str:
+                if len(group) == 1:
+                    return group[0]
+                return await self._arequest_summary(REDUCE_SUMMARY_PROMPT, readable_filename,
+                                                    self._reduce_content(group),
+                                                    batch_id=f"reduce-{level}-{index + 1}")
+
+            summaries = await asyncio.gather(*(reduce_group(index, group) for index, group in enumerate(groups)))
+            level += 1
+        return summaries[0]
+
+
+def section_summary(summary_content: Dict, start_time: int) -> Dict:
+    """
+    取出覆盖指定时间的分段总结，供该时间段的翻译批次使用
+
+    分段总结只描述本段内容，另外附上全文总结中的术语表以保持全片术语一致。
+    没有分段总结时原样返回 summary_content。
+    """
+    sections = summary_content.get("sections") if summary_content else None
+    if not sections:
+        return summary_content
+    section = sections[0]
+    for candidate in sections:
+        if candidate["start_time"] > start_time:
+            break
+        section = candidate
+    if not section["summary"]:
+        return summary_content
+    summary = section["summary"]
+    if summary_content.get("terms"):
+        terms = json.dumps(summary_content["terms"], ensure_ascii=False, indent=2)
+        summary = f"{summary}\n\nTerminology for the whole video:\n{terms}"
+    return {"summary": summary}
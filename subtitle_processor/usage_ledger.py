@@ -0,0 +1,227 @@
+"""
+LLM 用量账本
+
+网关 chat_completion 每完成一次请求（成功或失败）就记录一条：所属文件、阶段、批次、
+提示词/输出 token、固定提示词（系统提示词与摘要参考等每批重复的部分）的估计 token、耗时和结果。
+翻译器在每个文件结束和进程结束时输出汇总报告（按阶段的请求数、token、生成速度、费用、
+每小时视频成本），并把新增记录追加到 CSV 或 JSON Lines 账本中，用于容量规划。
+
+记录所属的文件由 file_scope() 设置；提交到线程池的任务需要用 propagate() 包装，
+工作线程才能继承当前文件。
+"""
+import csv
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger("usage_ledger")
+
+_current_file: ContextVar[Optional[str]] = ContextVar("usage_file", default=None)
+
+
+@dataclass
+class UsageRecord:
+    """一次LLM请求的用量"""
+    timestamp: float
+    file: Optional[str]
+    stage: str
+    batch_id: Optional[str]
+    model: Optional[str]
+    prompt_tokens: int
+    completion_tokens: int
+    preamble_tokens: int
+    latency: float
+    outcome: str
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class UsageLedger:
+    """进程内的用量记录，线程安全"""
+
+    def __init__(self):
+        self._records: List[UsageRecord] = []
+        self._durations: Dict[str, float] = {}
+        self._flushed = 0
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, batch_id=None, model: Optional[str] = None,
+               prompt_tokens: int = 0, completion_tokens: int = 0, preamble_tokens: int = 0,
+               latency: float = 0.0, outcome: str = "ok") -> UsageRecord:
+        """记录一次请求，所属文件取自当前的 file_scope()"""
+        entry = UsageRecord(
+            timestamp=time.time(),
+            file=_current_file.get(),
+            stage=stage,
+            batch_id=None if batch_id is None else str(batch_id),
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            preamble_tokens=preamble_tokens,
+            latency=latency,
+            outcome=outcome,
+        )
+        with self._lock:
+            self._records.append(entry)
+        return entry
+
+    def set_media_duration(self, file: str, seconds: float) -> None:
+        """记录文件对应的视频时长，用于计算每小时视频的成本"""
+        with self._lock:
+            self._durations[file] = seconds
+
+    def records(self, file: Optional[str] = None) -> List[UsageRecord]:
+        with self._lock:
+            records = list(self._records)
+        if file is None:
+            return records
+        return [r for r in records if r.file == file]
+
+    def summarize(self, file: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """按阶段汇总，键 "total" 为全部阶段之和"""
+        return summarize_records(self.records(file))
+
+    def format_report(self, file: Optional[str] = None, price_input: float = 0.0,
+                      price_output: float = 0.0) -> str:
+        """
+        生成用量报告
+
+        Args:
+            file: 只统计该文件的记录，为None时统计全部
+            price_input: 每百万输入 token 的价格，0 表示不计算费用
+            price_output: 每百万输出 token 的价格
+        """
+        records = self.records(file)
+        if not records:
+            return "LLM用量: 无请求"
+        summary = summarize_records(records)
+        lines = [f"{'阶段':<10}{'请求':>6}{'失败':>6}{'输入token':>11}{'输出token':>11}"
+                 f"{'平均耗时':>9}{'输出token/s':>12}"]
+        for stage, data in summary.items():
+            lines.append(
+                f"{stage:<12}{data['requests']:>6}{data['failed']:>6}{data['prompt_tokens']:>11}"
+                f"{data['completion_tokens']:>11}{data['mean_latency']:>10.2f}s{data['completion_tps']:>13.1f}"
+            )
+        total = summary["total"]
+        if total["prompt_tokens"]:
+            share = total["preamble_tokens"] / total["prompt_tokens"] * 100
+            lines.append(f"每批重复的提示词（系统提示词、摘要参考）约占输入 {share:.0f}%")
+        elapsed = max(r.timestamp for r in records) - min(r.timestamp - r.latency for r in records)
+        if elapsed > 0:
+            lines.append(f"吞吐: {(total['prompt_tokens'] + total['completion_tokens']) / elapsed:.0f} token/s "
+                         f"（{elapsed:.1f}s 内）")
+        if price_input or price_output:
+            cost = (total["prompt_tokens"] * price_input + total["completion_tokens"] * price_output) / 1e6
+            line = f"费用: {cost:.4f}"
+            with self._lock:
+                durations = self._durations
+                hours = sum(durations.get(f, 0.0) for f in {r.file for r in records}) / 3600
+            if hours > 0:
+                line += f"，视频 {hours:.2f} 小时，每小时视频 {cost / hours:.4f}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def flush(self, path: str) -> int:
+        """
+        把上次写入之后的新记录追加到账本文件
+
+        Args:
+            path: 后缀为 .csv 时写 CSV（新文件写表头），否则写 JSON Lines
+
+        Returns:
+            写入的记录数
+        """
+        with self._lock:
+            pending = self._records[self._flushed:]
+            self._flushed = len(self._records)
+        if not pending:
+            return 0
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if path.suffix.lower() == ".csv":
+                new_file = not path.exists() or path.stat().st_size == 0
+                with open(path, "a", encoding="utf-8", newline="") as f:
+                    writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(UsageRecord)])
+                    if new_file:
+                        writer.writeheader()
+                    writer.writerows(asdict(r) for r in pending)
+            else:
+                with open(path, "a", encoding="utf-8") as f:
+                    for r in pending:
+                        f.write(json.dumps(asdict(r), ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"写入用量账本失败: {e}")
+            return 0
+        return len(pending)
+
+
+def summarize_records(records: Iterable[UsageRecord]) -> Dict[str, Dict[str, float]]:
+    """按阶段汇总请求数、失败数、token 和耗时"""
+    summary: Dict[str, Dict[str, float]] = {}
+    for r in records:
+        for key in (r.stage, "total"):
+            data = summary.setdefault(key, {"requests": 0, "failed": 0, "prompt_tokens": 0,
+                                            "completion_tokens": 0, "preamble_tokens": 0,
+                                            "latency": 0.0})
+            data["requests"] += 1
+            data["failed"] += r.outcome != "ok"
+            data["prompt_tokens"] += r.prompt_tokens
+            data["completion_tokens"] += r.completion_tokens
+            data["preamble_tokens"] += r.preamble_tokens
+            data["latency"] += r.latency
+    for data in summary.values():
+        data["mean_latency"] = data["latency"] / data["requests"]
+        data["completion_tps"] = data["completion_tokens"] / data["latency"] if data["latency"] else 0.0
+    if "total" in summary:
+        summary["total"] = summary.pop("total")
+    return summary
+
+
+_ledger = UsageLedger()
+
+
+def get_ledger() -> UsageLedger:
+    """返回进程内共享的用量账本"""
+    return _ledger
+
+
+def current_file() -> Optional[str]:
+    """当前请求所属的文件，不在 file_scope 内时为None"""
+    return _current_file.get()
+
+
+@contextmanager
+def file_scope(file: str):
+    """在此范围内（包括 propagate 包装的线程池任务）发起的请求记入该文件"""
+    token = _current_file.set(file)
+    try:
+        yield
+    finally:
+        _current_file.reset(token)
+
+
+def propagate(func: Callable) -> Callable:
+    """包装提交到线程池的任务，使其继承提交时所属的文件"""
+    file = _current_file.get()
+    if file is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_file.set(file)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_file.reset(token)
+    return wrapper
@@ -0,0 +1,64 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# SubtitleConfig 在创建时校验 API 配置，测试不发请求，填入占位值即可
+os.environ.setdefault("OPENAI_BASE_URL", "http://127.0.0.1/v1")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import ast
+import json
+import re
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from subtitle_processor.retry_policy import configure_retry_policy
+
+
+class FakeLLM:
+    """模拟 OpenAI 客户端：按 <input_subtitle> 中的字幕生成翻译批次的响应
+
+    reply 可替换为自定义函数 (字幕ID -> 原文, 消息列表) -> 响应文本，用于构造损坏或出错的响应
+    """
+
+    def __init__(self, reply=None):
+        self.reply = reply or self.translate_all
+        self.requests = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    @staticmethod
+    def translate_all(subtitles, messages):
+        return json.dumps({k: {"optimized_subtitle": v, "translation": f"译{v}",
+                               "revised_translation": f"改{v}", "revise_suggestions": "ok"}
+                           for k, v in subtitles.items()}, ensure_ascii=False)
+
+    def create(self, **kwargs):
+        user = kwargs["messages"][-1]["content"]
+        match = re.search(r"<input_subtitle>(.*)</input_subtitle>", user, re.S)
+        subtitles = ast.literal_eval(match.group(1)) if match else {}
+        with self._lock:
+            self.requests.append(subtitles)
+        content = self.reply(subtitles, kwargs["messages"])
+        message = SimpleNamespace(content=content)
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=10, total_tokens=20)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage)
+
+
+@pytest.fixture
+def fake_llm():
+    return FakeLLM()
+
+
+@pytest.fixture(autouse=True)
+def retry_policy():
+    """每个测试使用新的重试策略，不等待退避时间"""
+    policy = configure_retry_policy(max_attempts=3, budget=100)
+    policy.base_delay = policy.max_delay = 0.0
+    return policy
@@ -0,0 +1,42 @@
+from subtitle_processor.data import SubtitleSegment
+from subtitle_processor.spliter import align_sentences_to_segments, merge_segments_based_on_sentences
+
+
+def words(text):
+    """每个单词一个分段，间隔1秒"""
+    return [SubtitleSegment(word, i * 1000, i * 1000 + 900) for i, word in enumerate(text.split())]
+
+
+def test_exact_sentences_align_to_their_words():
+    segments = words("hello there my friend how are you today")
+    spans = align_sentences_to_segments(segments, ["Hello there, my friend.", "How are you today?"])
+    assert spans == [(0, 3), (4, 7)]
+
+
+def test_leading_segments_join_first_span():
+    segments = words("um so hello there my friend how are you")
+    spans = align_sentences_to_segments(segments, ["Hello there, my friend.", "How are you?"])
+    assert spans == [(0, 5), (6, 8)]
+
+
+def test_trailing_segments_join_last_span():
+    segments = words("hello there my friend uh")
+    spans = align_sentences_to_segments(segments, ["Hello there, my friend."])
+    assert spans == [(0, 4)]
+
+
+def test_unmatched_sentence_gets_its_own_span():
+    segments = words("hello there my friend zzz qqq xxx how are you today")
+    sentences = ["Hello there, my friend.", "Something the model rewrote.", "How are you today?"]
+    spans = align_sentences_to_segments(segments, sentences)
+    # 中间没有匹配上的分段归属未匹配的句子，而不是被下一句吞掉
+    assert spans == [(0, 3), (4, 6), (7, 10)]
+
+
+def test_merge_keeps_every_segment():
+    segments = words("um hello there my friend zzz qqq how are you uh")
+    sentences = ["Hello there, my friend.", "Rewritten.", "How are you?"]
+    merged = merge_segments_based_on_sentences(segments, sentences)
+    assert [seg.text for seg in merged] == sentences
+    assert merged[0].start_time == segments[0].start_time
+    assert merged[-1].end_time == segments[-1].end_time
@@ -0,0 +1,112 @@
+import asyncio
+import re
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from subtitle_processor import llm_client
+from subtitle_processor.config import SubtitleConfig
+from subtitle_processor.data import SubtitleData, SubtitleSegment
+from subtitle_processor.optimizer import SubtitleOptimizer
+from subtitle_processor.spliter import merge_segments
+from subtitle_processor.summarizer import SubtitleSummarizer
+from test_summarizer import SECTIONS, SummaryLLM
+
+
+class EngineProbe:
+    """记录经过异步引擎的请求：同时进行中的最大请求数，以及发出请求的线程"""
+
+    def __init__(self):
+        self.client = None
+        self.in_flight = 0
+        self.peak = 0
+        self.threads = set()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """启用异步引擎，请求交给测试中设置的假客户端处理，每个请求耗时 20ms"""
+    probe = EngineProbe()
+
+    async def arequest(self, client, **kwargs):
+        probe.threads.add(threading.current_thread().name)
+        probe.in_flight += 1
+        probe.peak = max(probe.peak, probe.in_flight)
+        try:
+            await asyncio.sleep(0.02)
+            return probe.client.chat.completions.create(**kwargs)
+        finally:
+            probe.in_flight -= 1
+
+    monkeypatch.setattr(llm_client.AsyncLLMEngine, "arequest", arequest)
+    llm_client.configure_rate_limiter(8)
+    llm_client.enable_async_engine(True)
+    yield probe
+    llm_client.enable_async_engine(False)
+    llm_client.configure_rate_limiter(0)
+
+
+def lines(count):
+    return SubtitleData([SubtitleSegment(f"line number {i} is here.", i * 1000, i * 1000 + 900)
+                         for i in range(count)])
+
+
+def translate(client):
+    # 只有一个工作线程：批次能并发只可能是因为它们作为协程在引擎事件循环中调度
+    config = SubtitleConfig(thread_num=1, batch_size=5, batch_token_budget=0)
+    return SubtitleOptimizer(config=config, client=client).translate(lines(20), {"summary": ""})
+
+
+def test_batches_run_as_coroutines_on_engine_loop(engine, fake_llm):
+    engine.client = fake_llm
+    result = translate(fake_llm)
+    assert [item["translation"] for item in sorted(result, key=lambda x: x["id"])] == \
+        [f"译line number {i} is here." for i in range(20)]
+    assert len(fake_llm.requests) == 4
+    assert engine.peak == 4
+    assert engine.threads == {"llm-event-loop"}
+
+
+def test_bisect_and_single_lines_on_engine(engine, fake_llm):
+    def reply(subtitles, messages):
+        if "line number 7 is here." in subtitles.values():
+            return "not json"
+        return fake_llm.translate_all(subtitles, messages)
+
+    fake_llm.reply = reply
+    engine.client = fake_llm
+    result = {item["id"]: item["translation"] for item in translate(fake_llm)}
+    assert len(result) == 20
+    assert all(text == f"译line number {i - 1} is here." for i, text in result.items() if i != 8)
+    assert sum(1 for subtitles in fake_llm.requests if not subtitles) == 1
+
+
+def test_sections_are_gathered_on_engine(engine):
+    engine.client = SummaryLLM()
+    summarizer = SubtitleSummarizer(config=SubtitleConfig(thread_num=1), client=engine.client)
+    result = summarizer.summarize("part one\npart two", "talk.srt", sections=SECTIONS)
+    assert [s["summary"] for s in result["sections"]] == ["summary of part one", "summary of part two"]
+    assert result["terms"] == {"a": "甲"}
+    assert engine.peak == 2
+
+
+class SplitLLM:
+    """断句请求按句号插入 <br>"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        text = messages[-1]["content"].split("\n", 1)[1]
+        message = SimpleNamespace(content=re.sub(r"\. ", ".<br>", text))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None)
+
+
+def test_split_batches_run_on_engine(engine):
+    engine.client = SplitLLM()
+    words = [SubtitleSegment(f"w{i}." if i % 10 == 9 else f"w{i}", i * 100, i * 100 + 90) for i in range(1200)]
+    result = merge_segments(SubtitleData(words), model="m", num_threads=1)
+    assert engine.peak >= 2
+    assert engine.threads == {"llm-event-loop"}
+    assert " ".join(seg.text for seg in result.segments).split() == [seg.text for seg in words]
@@ -0,0 +1,87 @@
+from subtitle_processor.batch_budget import BatchBudget, estimate_line_tokens
+from subtitle_processor.config import SubtitleConfig
+from subtitle_processor.optimizer import SubtitleOptimizer
+
+
+def test_budget_shrinks_on_truncation_and_failure():
+    budget = BatchBudget(1000)
+    budget.record_truncated(10)
+    assert budget.current() == 500
+    budget.record_failure()
+    assert budget.current() == 375
+    for _ in range(5):
+        budget.record_failure()
+    assert budget.current() == 250  # 不低于初始预算的 25%
+    assert budget.failure_rate() == 1.0
+
+
+def test_budget_grows_up_to_twice_initial():
+    budget = BatchBudget(1000)
+    budget.record_failure()
+    for _ in range(100):
+        budget.record_success()
+    assert budget.current() == 2000
+    assert "成功 100，截断 0，失败 1" in budget.describe()
+
+
+def test_planning_budget_rounds_down_to_levels():
+    budget = BatchBudget(1000)
+    assert budget.planning_budget() == 1000
+    budget.record_success()
+    assert (budget.current(), budget.planning_budget()) == (1050, 1000)
+    for _ in range(9):
+        budget.record_success()
+    assert (budget.current(), budget.planning_budget()) == (1500, 1500)
+    budget.record_failure()
+    assert (budget.current(), budget.planning_budget()) == (1125, 1000)
+    budget.record_truncated()
+    assert (budget.current(), budget.planning_budget()) == (562, 500)
+
+
+def optimizer(budget):
+    config = SubtitleConfig(thread_num=2, batch_size=10, batch_token_budget=0)
+    return SubtitleOptimizer(config=config, client=object(), batch_budget=budget)
+
+
+def items(count):
+    return [(str(i), f"Sentence number {i} is here.") for i in range(1, count + 1)]
+
+
+def plan(budget):
+    opt = optimizer(budget)
+    opt._adjusted_batch_count = 0
+    try:
+        return opt._plan_chunks(items(60), 0)[0]
+    finally:
+        opt.stop()
+
+
+def test_planning_follows_budget_level():
+    fresh = plan(BatchBudget(400))
+    # 同一档位内的波动不改变批次
+    wobbled = BatchBudget(400)
+    wobbled.record_success()
+    assert wobbled.current() > 400
+    assert plan(wobbled) == fresh
+    shrunk = BatchBudget(400)
+    shrunk.record_truncated()
+    smaller = plan(shrunk)
+    assert len(smaller) > len(fresh)
+    assert [key for chunk in smaller for key in chunk] == [key for chunk in fresh for key in chunk]
+
+
+def test_failed_chunk_split_follows_current_budget():
+    lines = dict(items(12))
+    cost = sum(estimate_line_tokens(text) for text in lines.values())
+    budget = BatchBudget(cost)
+    opt = optimizer(budget)
+    try:
+        halves = opt._split_failed_chunk(lines, False)
+        assert [len(piece) for piece in halves] == [6, 6]
+        budget.record_truncated()
+        budget.record_truncated()
+        pieces = opt._split_failed_chunk(lines, False)
+        assert [len(piece) for piece in pieces] == [3, 3, 3, 3]
+        assert [key for piece in pieces for key in piece] == list(lines)
+    finally:
+        opt.stop()
@@ -0,0 +1,72 @@
+import itertools
+
+from subtitle_processor.cache import TranslationCache
+from subtitle_processor.config import SubtitleConfig
+from subtitle_processor.data import SubtitleData, SubtitleSegment
+from subtitle_processor.optimizer import SubtitleOptimizer
+from subtitle_processor.summarizer import SubtitleSummarizer
+
+
+def make_key(cache, subtitles, summary="summary"):
+    return cache.make_key("model", "prompt", "简体中文", False, summary, subtitles)
+
+
+def test_key_ignores_ids_and_whitespace(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.db"))
+    assert make_key(cache, {"1": "hello  world", "2": "bye"}) == make_key(cache, {"7": "hello world", "8": " bye"})
+    assert make_key(cache, {"1": "hello"}) != make_key(cache, {"1": "hello"}, summary="other")
+
+
+def test_get_set_and_stats(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.db"))
+    key = make_key(cache, {"1": "hello"})
+    assert cache.get(key) is None
+    cache.set(key, [{"translation": "你好"}])
+    assert cache.get(key) == [{"translation": "你好"}]
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_size_mismatch_counts_as_miss(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.db"))
+    key = make_key(cache, {"1": "hello"})
+    cache.set(key, [{"translation": "你好"}])
+    assert cache.get(key, expected_size=2) is None
+    assert cache.get(key, expected_size=1) is not None
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.db"), max_bytes=200)
+    keys = [make_key(cache, {"1": f"line {i}"}) for i in range(3)]
+    for key in keys:
+        cache.set(key, [{"translation": "x" * 60}])
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def run_pipeline(client, cache, data):
+    config = SubtitleConfig(thread_num=2, batch_size=5, batch_token_budget=0)
+    summary = SubtitleSummarizer(config=config, client=client, cache=cache).summarize(data.to_txt(), "talk.srt")
+    return SubtitleOptimizer(config=config, client=client, cache=cache).translate(data, summary)
+
+
+def test_rerun_reuses_summary_and_costs_no_translate_calls(tmp_path, fake_llm):
+    summaries = itertools.count(1)
+
+    def reply(subtitles, messages):
+        if not subtitles:
+            # 摘要请求使用较高的 temperature，每次生成的文本都不同
+            return f"summary #{next(summaries)}"
+        return fake_llm.translate_all(subtitles, messages)
+
+    fake_llm.reply = reply
+    cache = TranslationCache(str(tmp_path / "cache.db"))
+    data = SubtitleData([SubtitleSegment(f"Sentence number {i} is here.", i * 1000, i * 1000 + 900)
+                         for i in range(20)])
+    first = run_pipeline(fake_llm, cache, data)
+    assert sum(1 for subtitles in fake_llm.requests if subtitles) == 4
+    fake_llm.requests.clear()
+
+    second = run_pipeline(fake_llm, TranslationCache(str(tmp_path / "cache.db")), data)
+    assert fake_llm.requests == []
+    assert sorted(second, key=lambda item: item["id"]) == sorted(first, key=lambda item: item["id"])
@@ -0,0 +1,45 @@
+from subtitle_processor.data import SubtitleData, SubtitleSegment
+from subtitle_processor.spliter import split_by_sentences
+
+
+def data(texts="abcdef"):
+    return SubtitleData([SubtitleSegment(text, i * 1000, i * 1000 + 900) for i, text in enumerate(texts)])
+
+
+def test_owner_merge_does_not_change_view():
+    d = data()
+    view = d[2:4]
+    d.merge_segments(0, 1)
+    assert view.texts == ["c", "d"]
+    assert [seg.start_time for seg in view] == [2000, 3000]
+    assert d.texts == ["ab", "c", "d", "e", "f"]
+
+
+def test_owner_merge_with_next_does_not_change_nested_view():
+    d = data()
+    inner = d[1:5][1:3]
+    d.merge_with_next_segment(1)
+    assert inner.texts == ["c", "d"]
+    assert d.texts == ["a", "b c", "d", "e", "f"]
+
+
+def test_view_merge_does_not_change_owner():
+    d = data()
+    view = d[2:5]
+    view.merge_segments(0, 1)
+    assert view.texts == ["cd", "e"]
+    assert d.texts == list("abcdef")
+
+
+def test_where_keeps_matching_segments():
+    d = data(["a", "!", "b", "c"])
+    kept = d.where(lambda text: text.isalpha())
+    assert kept.texts == ["a", "b", "c"]
+    assert [seg.start_time for seg in kept] == [0, 2000, 3000]
+    assert d.where(lambda text: True).texts == d.texts
+
+
+def test_split_by_sentences_drops_punctuation_segments():
+    d = data(["hello", "world.", "...", "next", "one."])
+    batches = split_by_sentences(d, word_threshold=2)
+    assert [batch.texts for batch in batches] == [["hello", "world."], ["next", "one."]]
@@ -0,0 +1,72 @@
+from subtitle_processor.config import SubtitleConfig
+from subtitle_processor.data import SubtitleData, SubtitleSegment
+from subtitle_processor.journal import BatchJournal
+from subtitle_processor.optimizer import SubtitleOptimizer
+
+
+def make_data(n):
+    return SubtitleData([SubtitleSegment(f"line number {i} is here.", i * 1000, i * 1000 + 900) for i in range(n)])
+
+
+def make_optimizer(client, journal):
+    config = SubtitleConfig(thread_num=4, batch_size=5, batch_token_budget=0)
+    return SubtitleOptimizer(config=config, client=client, journal=journal)
+
+
+def by_id(result):
+    return sorted(result, key=lambda item: item["id"])
+
+
+def test_append_and_reload(tmp_path):
+    path = tmp_path / "a.journal.jsonl"
+    journal = BatchJournal(str(path))
+    journal.append("translate", "k1", [{"id": 1}])
+    journal.append("split", "k2", ["a", "b"])
+    reloaded = BatchJournal(str(path))
+    assert reloaded.get("translate", "k1") == [{"id": 1}]
+    assert reloaded.get("split", "k2") == ["a", "b"]
+    assert reloaded.count("translate") == 1
+
+
+def test_ignores_truncated_last_line(tmp_path):
+    path = tmp_path / "a.journal.jsonl"
+    journal = BatchJournal(str(path))
+    journal.append("translate", "k1", [{"id": 1}])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"stage": "translate", "key": "k2", "res')
+    reloaded = BatchJournal(str(path))
+    assert reloaded.count("translate") == 1
+    assert reloaded.get("translate", "k2") is None
+
+
+def test_remove_deletes_file(tmp_path):
+    path = tmp_path / "a.journal.jsonl"
+    journal = BatchJournal(str(path))
+    journal.append("translate", "k1", [])
+    journal.remove()
+    assert not path.exists()
+    assert journal.get("translate", "k1") is None
+
+
+def test_resume_skips_completed_batches(tmp_path, fake_llm):
+    path = tmp_path / "a.journal.jsonl"
+    first = make_optimizer(fake_llm, BatchJournal(str(path))).translate(make_data(12), {"summary": "s"})
+    assert len(fake_llm.requests) == 3
+
+    # 第二次处理同一文件：全部批次都从断点日志恢复，不再发送请求
+    resumed = make_optimizer(fake_llm, BatchJournal(str(path))).translate(make_data(12), {"summary": "s"})
+    assert len(fake_llm.requests) == 3
+    assert by_id(resumed) == by_id(first)
+
+
+def test_resume_requests_only_missing_batches(tmp_path, fake_llm):
+    path = tmp_path / "a.journal.jsonl"
+    make_optimizer(fake_llm, BatchJournal(str(path))).translate(make_data(12), {"summary": "s"})
+    # 模拟中断：只保留第一个批次的记录
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    path.write_text(lines[0], encoding="utf-8")
+    fake_llm.requests.clear()
+
+    result = make_optimizer(fake_llm, BatchJournal(str(path))).translate(make_data(12), {"summary": "s"})
+    assert len(fake_llm.requests) == 2
+    assert [r["translation"] for r in by_id(result)] == [f"译line number {i} is here." for i in range(12)]
@@ -0,0 +1,178 @@
+import json
+from pathlib import Path
+
+from utils.json_repair import (
+    _RECORD_BOUNDARY, IncrementalJSONParser, JSONParser, StreamingRecordParser, clean_llm_response,
+    from_file, iter_json_members, loads, parse_llm_records
+)
+
+
+def test_records_keep_escaped_quotes():
+    response = json.dumps({
+        "1": {"translation": 'He said "hi"'},
+        "2": {"translation": 'A "quoted" word'},
+    }, ensure_ascii=False)
+    # 截断的最后一条记录让整体解码失败，走逐条取出的路径
+    truncated = response[:-1] + ', "3": {"translation": "cut'
+    for text in (response, truncated, f'"""\n{truncated}\n"""'):
+        records = parse_llm_records(text)
+        assert records["1"]["translation"] == 'He said "hi"'
+        assert records["2"]["translation"] == 'A "quoted" word'
+        assert "3" not in records
+
+
+def test_over_escaped_records_are_decoded_after_cleanup():
+    response = '{\\"1\\": {\\"translation\\": \\"你好\\"}, \\"2\\": {\\"translation\\": \\"再见\\"}}'
+    assert parse_llm_records(response) == {"1": {"translation": "你好"}, "2": {"translation": "再见"}}
+
+
+def test_cleanup_only_fills_records_that_failed():
+    response = ('{"1": {"translation": "他说\\"好\\""}, '
+                '\\"2\\": {\\"translation\\": \\"再见\\"}, "3": {"translation": "cut')
+    records = parse_llm_records(response)
+    assert records["1"]["translation"] == '他说"好"'
+    assert records["2"]["translation"] == "再见"
+    assert "3" not in records
+
+
+def records_json(count, translation=lambda i: f"译文{i}", indent=None):
+    return json.dumps({str(i): {"optimized_subtitle": f"line {i}", "translation": translation(i)}
+                       for i in range(1, count + 1)}, ensure_ascii=False, indent=indent)
+
+
+def stream(text, step=1, expected=None):
+    parser = StreamingRecordParser(expected)
+    emitted = {}
+    for i in range(0, len(text), step):
+        emitted.update(parser.feed(text[i:i + step]))
+    return parser, emitted
+
+
+def test_stream_emits_records_with_escaped_quotes():
+    text = records_json(5, lambda i: f'他说"第{i}句"', indent=2)
+    for step in (1, 3, 64):
+        parser, emitted = stream(text, step, [str(i) for i in range(1, 6)])
+        assert parser.off_format is None
+        assert emitted == {str(i): {"optimized_subtitle": f"line {i}", "translation": f'他说"第{i}句"'}
+                           for i in range(1, 6)}
+
+
+def test_stream_resyncs_after_unescaped_quote():
+    # 第2条译文中有一个未转义的引号，字符串边界错位
+    for indent in (None, 2):
+        text = records_json(40, indent=indent).replace("译文2", '他说"好', 1)
+        parser, emitted = stream(text, 5, [str(i) for i in range(1, 41)])
+        assert parser.off_format is None
+        assert len(emitted) == 40
+        assert emitted["2"]["translation"].startswith('他说"好')
+        assert emitted["3"] == {"optimized_subtitle": "line 3", "translation": "译文3"}
+
+
+def test_stream_without_quote_problems_never_resyncs():
+    parser = IncrementalJSONParser(logging=True, resync=_RECORD_BOUNDARY)
+    text = records_json(30, lambda i: f'"{i}": {{' if i % 2 else "a\\nb", indent=2)
+    members = []
+    for i in range(0, len(text), 7):
+        members.extend(parser.feed(text[i:i + 7]))
+    assert dict(members) == json.loads(text)
+    assert not parser.log
+
+
+def feed_all(text, step, parser=None):
+    parser = parser or IncrementalJSONParser()
+    members = []
+    for i in range(0, len(text), step):
+        members.extend(parser.feed(text[i:i + step]))
+    return members + parser.close()
+
+
+def test_incremental_members_match_at_every_split_point():
+    text = ('```json\n{"a": "x\\\\\\"}{,", "b": [1, {"c": "]"}], "n": -1.5e3, '
+            '"t": true, "z": null, "u": "\\u4f60"}\n```')
+    expected = list(json.loads(text[8:-4]).items())
+    for cut in range(len(text) + 1):
+        parser = IncrementalJSONParser()
+        members = parser.feed(text[:cut]) + parser.feed(text[cut:]) + parser.close()
+        assert members == expected, cut
+    for step in (1, 2, 5):
+        assert feed_all(text, step) == expected
+
+
+def test_incremental_top_level_arrays_and_consecutive_containers():
+    text = '[1, "two", {"three": 3}] noise {"k": [4]}'
+    assert feed_all(text, 1) == [(0, 1), (1, "two"), (2, {"three": 3}), ("k", [4])]
+
+
+def test_incremental_repairs_missing_comma_and_truncation():
+    members = feed_all('{"1": {"t": "a"} "2": {"t": "b"}, "3": {"t": "cu', 4)
+    assert members == [("1", {"t": "a"}), ("2", {"t": "b"}), ("3", {"t": "cu"})]
+
+
+def test_incremental_members_are_emitted_as_soon_as_they_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"1": {"t": "a"') == []
+    assert parser.feed('}') == [("1", {"t": "a"})]
+    assert parser.feed(', "2": 5') == []
+    assert parser.feed(',') == [("2", 5)]
+    # 已经返回的成员不再留在缓冲区中
+    assert len(parser._buffer) <= 2
+
+
+def test_iter_json_members_reads_in_chunks(tmp_path):
+    data = {str(i): {"text": "x" * i, "items": list(range(i % 5))} for i in range(200)}
+    path = tmp_path / "big.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    with open(path, encoding="utf-8") as fd:
+        assert dict(iter_json_members(fd, chunk_size=7)) == data
+
+
+CORPUS_PATH = Path(__file__).parent.parent / "benchmarks" / "json_repair_corpus.jsonl"
+
+FAST_SCAN_CASES = [
+    '{"a": "plain", "b": "esc \\" \\\\ \\n \\u4f60", "c": [1, -2.5, 3e4, 0.1]}',
+    '{"a": "unterminated',
+    '{"a": "x" "b": "y"}',
+    '{"a": "他说"好", "b": 1}',
+    '[1,2,3 , 4  ,\n\t 5]',
+    '{"n": 1.2.3, "m": 12abc, "k": -}',
+    '{"a": """triple""", \'b\': \'single\'}',
+    '{"a": [1, 2, "x\\\\"], "b": {"c": "}"}',
+    '   \n\n {"a"   :   "spaces"   ,   "b"  :   [  ]  }   ',
+    '{"1": {"translation": "a", "revised_translation": "b"}, "2": {"translation": "c',
+]
+
+
+def parse_both(text):
+    results = []
+    for fast in (False, True):
+        parser = JSONParser(text, None, True)
+        parser.fast_scan = fast
+        results.append(parser.parse())
+    return results
+
+
+def test_fast_scan_matches_char_by_char_scan():
+    for text in FAST_SCAN_CASES:
+        slow, fast = parse_both(text)
+        assert slow == fast, text
+
+
+def test_fast_scan_matches_on_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    assert entries
+    for entry in entries:
+        slow, fast = parse_both(clean_llm_response(entry["reply"]))
+        assert slow == fast, (entry["kind"], entry["mode"])
+
+
+def test_file_input_scans_char_by_char_with_same_result(tmp_path):
+    assert JSONParser('{"a": 1}', None, False).fast_scan
+    path = tmp_path / "a.json"
+    # StringFileWrapper 按字符下标 seek，只适用于 ASCII 文件；读到文件末尾时不会抛出 IndexError，
+    # 末尾有空白的输入不适用于文件路径
+    for text in (case for case in FAST_SCAN_CASES if case.isascii() and case == case.rstrip()):
+        path.write_text(text, encoding="utf-8")
+        with open(path, encoding="utf-8") as fd:
+            assert not JSONParser(None, fd, False).fast_scan
+        assert from_file(str(path), skip_json_loads=True) == loads(text, skip_json_loads=True), text
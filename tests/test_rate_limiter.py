@@ -0,0 +1,100 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from subtitle_processor import llm_client
+from subtitle_processor.rate_limiter import AdaptiveRateLimiter
+from subtitle_processor.usage_ledger import file_scope, get_ledger
+
+
+def test_acquire_async_waits_for_release_from_other_thread():
+    limiter = AdaptiveRateLimiter(1)
+
+    async def main():
+        await limiter.acquire_async()
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        threading.Thread(target=limiter.release, args=(0.1,)).start()
+        await asyncio.wait_for(waiter, timeout=2)
+
+    asyncio.run(main())
+    assert limiter.in_flight == 1
+
+
+def test_cancelled_acquire_async_does_not_leak_permit():
+    limiter = AdaptiveRateLimiter(1)
+
+    async def main():
+        await limiter.acquire_async()
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release_failed()
+
+    asyncio.run(main())
+    assert limiter.in_flight == 0
+    assert not limiter._async_waiters
+    # 名额已经归还，同步调用方可以立即拿到许可
+    limiter.acquire()
+    assert limiter.in_flight == 1
+
+
+def test_acquire_async_respects_concurrency_limit():
+    limiter = AdaptiveRateLimiter(2)
+    peak = 0
+
+    async def worker():
+        nonlocal peak
+        await limiter.acquire_async()
+        peak = max(peak, limiter.in_flight)
+        await asyncio.sleep(0.01)
+        limiter.release(0.01)
+
+    async def main():
+        await asyncio.gather(*(worker() for _ in range(10)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert limiter.in_flight == 0
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """启用异步引擎，发出的请求直接返回固定响应"""
+    async def arequest(self, client, **kwargs):
+        await asyncio.sleep(0)
+        return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15))
+
+    monkeypatch.setattr(llm_client.AsyncLLMEngine, "arequest", arequest)
+    llm_client.configure_rate_limiter(2)
+    llm_client.enable_async_engine(True)
+    yield llm_client.get_async_engine()
+    llm_client.enable_async_engine(False)
+    llm_client.configure_rate_limiter(0)
+
+
+def test_chat_completion_on_engine_keeps_ledger_file(engine):
+    client = SimpleNamespace(with_options=lambda **kwargs: client)
+    with file_scope("engine_test.srt"):
+        llm_client.chat_completion(client, model="m", messages=[], stage="translate", batch_id=1)
+    records = get_ledger().records("engine_test.srt")
+    assert len(records) == 1 and records[0].prompt_tokens == 10
+    assert llm_client.get_rate_limiter().in_flight == 0
+
+
+def test_achat_completion_from_other_loop(engine):
+    client = SimpleNamespace(with_options=lambda **kwargs: client)
+
+    async def main():
+        with file_scope("async_test.srt"):
+            await asyncio.gather(*(llm_client.achat_completion(client, model="m", messages=[], stage="split")
+                                   for _ in range(5)))
+
+    asyncio.run(main())
+    assert len(get_ledger().records("async_test.srt")) == 5
+    assert llm_client.get_rate_limiter().in_flight == 0
@@ -0,0 +1,114 @@
+import httpx
+import openai
+import pytest
+
+from subtitle_processor.config import SubtitleConfig
+from subtitle_processor.data import SubtitleData, SubtitleSegment
+from subtitle_processor.optimizer import SubtitleOptimizer
+from subtitle_processor.retry_policy import (
+    ErrorClass, RetryPolicy, classify_error, configure_retry_policy, is_context_length_error
+)
+
+
+def api_error(cls, status, message="error", code=None):
+    request = httpx.Request("POST", "http://127.0.0.1/v1/chat/completions")
+    body = {"code": code} if code else None
+    return cls(message, response=httpx.Response(status, request=request), body=body)
+
+
+def test_context_length_errors_are_split():
+    for message in ("This model's maximum context length is 8192 tokens",
+                    "Input exceeds the context window of this model"):
+        assert classify_error(api_error(openai.BadRequestError, 400, message)) is ErrorClass.SPLIT
+    assert is_context_length_error(api_error(openai.BadRequestError, 400, "too long", code="context_length_exceeded"))
+    # 只是提到 context 的其他参数错误不是超长
+    assert classify_error(api_error(openai.BadRequestError, 400, "Invalid 'context' parameter")) is ErrorClass.FATAL
+
+
+def test_classification():
+    assert classify_error(api_error(openai.AuthenticationError, 401)) is ErrorClass.FATAL
+    assert classify_error(api_error(openai.RateLimitError, 429)) is ErrorClass.RETRY
+    assert classify_error(api_error(openai.InternalServerError, 500)) is ErrorClass.RETRY
+    assert classify_error(ValueError("API返回空结果")) is ErrorClass.RETRY
+    for error in (TypeError("x"), KeyError("x"), AttributeError("x")):
+        assert classify_error(error) is ErrorClass.FATAL
+
+
+def test_budget_is_shared_and_limited():
+    policy = RetryPolicy(max_attempts=5, budget=2, base_delay=0, max_delay=0)
+    assert policy.spend() and policy.spend()
+    assert not policy.spend()
+    assert policy.retry_delay(ValueError("x"), 1) is None
+    assert policy.describe() == "重试 2/2 次"
+
+
+def test_retry_delay_respects_attempts_and_retry_after():
+    policy = RetryPolicy(max_attempts=3, budget=0, base_delay=1, max_delay=4)
+    error = api_error(openai.InternalServerError, 500)
+    assert 0.5 <= policy.retry_delay(error, 1) <= 1
+    assert 1 <= policy.retry_delay(error, 2) <= 2
+    assert policy.retry_delay(error, 3) is None
+    # 限流不占用预算，等待时间不短于 Retry-After
+    limited = api_error(openai.RateLimitError, 429)
+    assert policy.retry_delay(limited, 4, retry_after=10) == 10
+    assert policy.retries == 2
+
+
+def test_call_retries_only_content_errors():
+    policy = RetryPolicy(max_attempts=3, budget=0, base_delay=0, max_delay=0)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ValueError("API返回为空")
+        return "ok"
+
+    assert policy.call(flaky) == "ok" and len(calls) == 3
+    # 接口错误已经由网关重试过，不再重试
+    with pytest.raises(openai.InternalServerError):
+        policy.call(lambda: (_ for _ in ()).throw(api_error(openai.InternalServerError, 500)))
+
+
+def translate(client, lines=20):
+    config = SubtitleConfig(thread_num=4, batch_size=5, batch_token_budget=0)
+    data = SubtitleData([SubtitleSegment(f"line number {i} is here.", i * 1000, i * 1000 + 900)
+                         for i in range(lines)])
+    return SubtitleOptimizer(config=config, client=client).translate(data, {"summary": ""})
+
+
+def test_fatal_batches_are_marked_failed_without_single_requests(fake_llm):
+    def reply(subtitles, messages):
+        raise api_error(openai.BadRequestError, 400, "content rejected")
+
+    fake_llm.reply = reply
+    result = translate(fake_llm)
+    assert len(fake_llm.requests) == 4
+    assert all(item["translation"].startswith("[翻译失败]") for item in result)
+
+
+def test_exhausted_budget_stops_fan_out(fake_llm):
+    configure_retry_policy(max_attempts=3, budget=1).base_delay = 0
+
+    def reply(subtitles, messages):
+        raise api_error(openai.InternalServerError, 500)
+
+    fake_llm.reply = reply
+    result = translate(fake_llm)
+    # 4 个批次 + 1 次重试，之后不再拆分也不改用单条翻译
+    assert len(fake_llm.requests) == 5
+    assert len(result) == 20 and all(item["translation"].startswith("[翻译失败]") for item in result)
+
+
+def test_bisect_isolates_bad_line(fake_llm):
+    def reply(subtitles, messages):
+        if "line number 7 is here." in subtitles.values():
+            return "not json"
+        return fake_llm.translate_all(subtitles, messages)
+
+    fake_llm.reply = reply
+    result = {item["id"]: item["translation"] for item in translate(fake_llm)}
+    assert len(result) == 20
+    assert all(text == f"译line number {i - 1} is here." for i, text in result.items() if i != 8)
+    # 只有拆到单条仍失败的那一条改用单条翻译（单条请求不带 <input_subtitle>）
+    assert sum(1 for subtitles in fake_llm.requests if not subtitles) == 1
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from subtitle_processor.config import SubtitleConfig
+from subtitle_processor.prompts import REDUCE_SUMMARY_PROMPT
+from subtitle_processor.summarizer import SubtitleSummarizer, section_summary
+
+
+class SummaryLLM:
+    """分段总结返回固定文本，合并请求可设置为失败"""
+
+    def __init__(self, fail_reduce=False):
+        self.fail_reduce = fail_reduce
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, messages, **kwargs):
+        if messages[0]["content"] == REDUCE_SUMMARY_PROMPT:
+            if self.fail_reduce:
+                raise openai.BadRequestError("reduce failed", response=_response(400), body=None)
+            content = '{"summary": "whole", "terms": {"a": "甲"}}'
+        else:
+            content = f"summary of {messages[1]['content'].split('Content:')[1].strip()}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content),
+                                                        finish_reason="stop")],
+                               usage=None)
+
+
+def _response(status):
+    return httpx.Response(status, request=httpx.Request("POST", "http://127.0.0.1/v1/chat/completions"))
+
+
+SECTIONS = [
+    {"start_time": 0, "end_time": 1000, "text": "part one"},
+    {"start_time": 1000, "end_time": 2000, "text": "part two"},
+]
+
+
+def summarize(client):
+    summarizer = SubtitleSummarizer(config=SubtitleConfig(thread_num=2), client=client)
+    return summarizer.summarize("part one\npart two", "talk.srt", sections=SECTIONS)
+
+
+def test_sections_are_reduced_into_overall_summary():
+    result = summarize(SummaryLLM())
+    assert result["terms"] == {"a": "甲"}
+    assert [s["summary"] for s in result["sections"]] == ["summary of part one", "summary of part two"]
+    assert "Terminology" in section_summary(result, 1500)["summary"]
+
+
+def test_reduce_failure_keeps_section_summaries():
+    result = summarize(SummaryLLM(fail_reduce=True))
+    assert result["summary"] == "" and result["terms"] is None
+    assert [s["summary"] for s in result["sections"]] == ["summary of part one", "summary of part two"]
+    assert section_summary(result, 1500) == {"summary": "summary of part two"}
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import tracing
+
+
+@pytest.fixture
+def tracer():
+    tracer = tracing.enable_tracing()
+    yield tracer
+    tracing._tracer = None
+
+
+def events(tracer, ph=None):
+    return [e for e in tracer.to_json()["traceEvents"] if ph is None or e["ph"] == ph]
+
+
+def test_disabled_tracing_is_noop():
+    assert tracing.get_tracer() is None
+    with tracing.span("noop"):
+        pass
+    assert tracing.traced()(lambda: 1)() == 1
+
+
+def test_span_records_thread_and_error(tracer):
+    with tracing.span("ok", cat="test", batch=1):
+        pass
+    with pytest.raises(ValueError):
+        with tracing.span("bad"):
+            raise ValueError("boom")
+    complete = events(tracer, "X")
+    assert [e["name"] for e in complete] == ["ok", "bad"]
+    assert complete[0]["args"] == {"batch": 1} and complete[0]["tid"] == threading.get_ident()
+    assert complete[1]["args"]["error"] == "ValueError: boom"
+    names = {e["args"]["name"] for e in events(tracer, "M")}
+    assert threading.current_thread().name in names
+
+
+def test_traced_decorator_uses_function_name(tracer):
+    @tracing.traced(cat="test")
+    def work(x):
+        return x * 2
+
+    assert work(2) == 4
+    assert [e["name"] for e in events(tracer, "X")] == ["work"]
+
+
+def test_queued_records_wait_on_worker(tracer):
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="worker") as pool:
+        pool.submit(tracing.queued(lambda: None, "job")).result()
+    begin, end = events(tracer, "b"), events(tracer, "e")
+    assert len(begin) == len(end) == 1
+    assert begin[0]["name"] == "queue_wait:job" and begin[0]["id"] == end[0]["id"]
+    assert begin[0]["args"]["worker"].startswith("worker")
+    assert end[0]["ts"] >= begin[0]["ts"]
+
+
+def test_async_spans_of_concurrent_coroutines_do_not_nest(tracer):
+    async def job(delay):
+        with tracing.async_span("request", cat="llm"):
+            await asyncio.sleep(delay)
+
+    async def main():
+        await asyncio.gather(job(0.02), job(0.01))
+
+    asyncio.run(main())
+    begin = events(tracer, "b")
+    assert len(begin) == 2 and len({e["id"] for e in begin}) == 2
+    assert not events(tracer, "X")
+
+
+def test_save_trace_writes_json_and_stops(tracer, tmp_path):
+    with tracing.span("step"):
+        pass
+    path = tmp_path / "trace.json"
+    tracing.save_trace(str(path))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert any(e["name"] == "step" for e in data["traceEvents"])
+    assert tracing.get_tracer() is None
@@ -0,0 +1,17 @@
+from captioner_translate.translator import SubtitleTranslator
+from subtitle_processor.config import SubtitleConfig
+
+
+def translator(model="shared-model"):
+    instance = SubtitleTranslator.__new__(SubtitleTranslator)
+    instance.config = SubtitleConfig(llm_model=model)
+    return instance
+
+
+def test_file_model_does_not_change_shared_config():
+    instance = translator()
+    config = instance._file_config("other-model")
+    assert config.llm_model == "other-model"
+    assert instance.config.llm_model == "shared-model"
+    assert instance._file_config(None) is instance.config
+    assert instance._file_config("shared-model") is instance.config
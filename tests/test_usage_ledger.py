@@ -0,0 +1,82 @@
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from subtitle_processor.llm_client import _notify_request, observe_next_request
+from subtitle_processor.usage_ledger import UsageLedger, file_scope, propagate
+
+
+def test_records_carry_current_file():
+    ledger = UsageLedger()
+    ledger.record("split")
+    with file_scope("a.srt"):
+        ledger.record("translate", batch_id=3)
+    assert [r.file for r in ledger.records()] == [None, "a.srt"]
+    assert ledger.records("a.srt")[0].batch_id == "3"
+
+
+def test_propagate_carries_file_into_worker_threads():
+    ledger = UsageLedger()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        with file_scope("a.srt"):
+            first = pool.submit(propagate(lambda: ledger.record("translate")))
+        with file_scope("b.srt"):
+            second = pool.submit(propagate(lambda: ledger.record("translate")))
+        # 未包装的任务不继承文件
+        third = pool.submit(lambda: ledger.record("translate"))
+    assert (first.result().file, second.result().file, third.result().file) == ("a.srt", "b.srt", None)
+
+
+def test_summarize_by_stage_and_total():
+    ledger = UsageLedger()
+    ledger.record("translate", prompt_tokens=100, completion_tokens=50, preamble_tokens=40, latency=2.0)
+    ledger.record("translate", latency=1.0, outcome="rate_limited")
+    ledger.record("summary", prompt_tokens=10, completion_tokens=10, latency=1.0)
+    summary = ledger.summarize()
+    assert list(summary) == ["translate", "summary", "total"]
+    translate = summary["translate"]
+    assert translate["requests"] == 2 and translate["failed"] == 1
+    assert translate["mean_latency"] == 1.5 and translate["completion_tps"] == 50 / 3
+    assert summary["total"]["prompt_tokens"] == 110
+
+
+def test_report_cost_per_video_hour():
+    ledger = UsageLedger()
+    with file_scope("a.srt"):
+        ledger.record("translate", prompt_tokens=1_000_000, completion_tokens=500_000, latency=1.0)
+    ledger.set_media_duration("a.srt", 1800)
+    report = ledger.format_report("a.srt", price_input=1.0, price_output=2.0)
+    assert "费用: 2.0000" in report
+    assert "每小时视频 4.0000" in report
+    assert UsageLedger().format_report() == "LLM用量: 无请求"
+
+
+def test_flush_appends_only_new_records(tmp_path):
+    ledger = UsageLedger()
+    path = tmp_path / "usage.csv"
+    ledger.record("split")
+    assert ledger.flush(str(path)) == 1
+    assert ledger.flush(str(path)) == 0
+    ledger.record("translate")
+    assert ledger.flush(str(path)) == 1
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["stage"] for row in rows] == ["split", "translate"]
+
+    jsonl = tmp_path / "usage.jsonl"
+    ledger.record("summary")
+    ledger.flush(str(jsonl))
+    assert [json.loads(line)["stage"] for line in jsonl.read_text(encoding="utf-8").splitlines()] == ["summary"]
+
+
+def test_request_observer_only_sees_its_own_file():
+    seen = []
+    with file_scope("a.srt"):
+        observe_next_request(lambda latency, error: seen.append(("a.srt", latency)))
+    with file_scope("b.srt"):
+        _notify_request(1.0, None)
+    assert seen == []
+    with file_scope("a.srt"):
+        _notify_request(2.0, None)
+        _notify_request(3.0, None)
+    assert seen == [("a.srt", 2.0)]
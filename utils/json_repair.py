@@ -24,11 +24,24 @@ All supported use cases are in the unit tests
 
 import os
 import json
-from typing import Any, Dict, List, Optional, Union, TextIO, Tuple
+import re
+from typing import Any, Dict, List, Optional, Pattern, Union, TextIO, Tuple
 from utils.logger import setup_logger
+from utils.tracing import traced
 
 logger = setup_logger("json_repair")
 
+# Used by the fast scanning paths: the next closing delimiter or escape inside a string body,
+# whitespace runs and number characters
+_STRING_RUN_END = {
+    '"': re.compile(r'["\\]'),
+    "'": re.compile(r"['\\]"),
+    "”": re.compile(r"[”\\]"),
+}
+_WHITESPACES = re.compile(r"\s*")
+_NUMBER_CHARS = re.compile(r"[0-9\-.eE/,]*")
+_NUMBER_CHARS_IN_ARRAY = re.compile(r"[0-9\-.eE/]*")
+
 
 class StringFileWrapper:
     # This is a trick to simplify the code, transform the filedescriptor handling into a string handling
@@ -84,6 +97,9 @@ class JSONParser:
             self.json_str = StringFileWrapper(json_fd)
         # Index is our iterator that will keep track of which character we are looking at right now
         self.index: int = 0
+        # With a plain string, string bodies, whitespace runs and numbers are scanned in bulk with
+        # str.find and compiled regexes; a file (StringFileWrapper seeks on every read) is read char by char
+        self.fast_scan: bool = isinstance(self.json_str, str)
         # This is used in the object member parsing to manage the special cases of missing quotes in key or value
         self.context: list[str] = []
         # Use this to log the activity, but only if logging is active
@@ -341,11 +357,8 @@ class JSONParser:
         # There is sometimes a weird case of doubled quotes, we manage this also later in the while loop
         if self.get_char_at() == lstring_delimiter:
             # This is a valid exception only if it's closed by a double delimiter again
-            i = 1
+            i = self.skip_to_character(rstring_delimiter, 1)
             next_c = self.get_char_at(i)
-            while next_c and next_c != rstring_delimiter:
-                i += 1
-                next_c = self.get_char_at(i)
             # Now check that the next character is also a delimiter to ensure that we have "".....""
             # In that case we ignore this rstring delimiter
             if next_c and (self.get_char_at(i + 1) or "") == rstring_delimiter:
@@ -392,11 +405,8 @@ class JSONParser:
                 elif self.get_context() == "object_value" and char in [",", "}"]:
                     rstring_delimiter_missing = True
                     # check if this is a case in which the closing comma is NOT missing instead
-                    i = 1
+                    i = self.skip_to_character(rstring_delimiter, 1)
                     next_c = self.get_char_at(i)
-                    while next_c and next_c != rstring_delimiter:
-                        i += 1
-                        next_c = self.get_char_at(i)
                     if next_c:
                         i += 1
                         next_c = self.get_char_at(i)
@@ -412,8 +422,15 @@ class JSONParser:
                             "info",
                         )
                         break
-            string_acc += char
-            self.index += 1
+            if self.fast_scan and not missing_quotes and char != "\\":
+                # Fast path: take the whole run up to the next delimiter or escape at once
+                match = _STRING_RUN_END[rstring_delimiter].search(self.json_str, self.index)
+                end = match.start() if match else len(self.json_str)
+                string_acc += self.json_str[self.index:end]
+                self.index = end
+            else:
+                string_acc += char
+                self.index += 1
             char = self.get_char_at()
             if len(string_acc) > 1 and string_acc[-1] == "\\":
                 # This is a special case, if people use real strings this might happen
@@ -488,11 +505,8 @@ class JSONParser:
                         next_c = self.get_char_at(i)
                     # If we stopped for a comma in object_value context, let's check if find a "} at the end of the string
                     if next_c == "," and self.get_context() == "object_value":
-                        i += 1
+                        i = self.skip_to_character(rstring_delimiter, i + 1)
                         next_c = self.get_char_at(i)
-                        while next_c and next_c != rstring_delimiter:
-                            i += 1
-                            next_c = self.get_char_at(i)
                         # Ok now I found a delimiter, let's skip whitespaces and see if next we find a }
                         i += 1
                         next_c = self.get_char_at(i)
@@ -513,11 +527,8 @@ class JSONParser:
                             # But this might not be it! This could be just a missing comma
                             # We found a delimiter and we need to check if this is a key
                             # so find a rstring_delimiter and a colon after
-                            i += 1
+                            i = self.skip_to_character(rstring_delimiter, i + 1)
                             next_c = self.get_char_at(i)
-                            while next_c and next_c != rstring_delimiter:
-                                i += 1
-                                next_c = self.get_char_at(i)
                             i += 1
                             next_c = self.get_char_at(i)
                             while next_c and next_c != ":":
@@ -570,10 +581,15 @@ class JSONParser:
         number_chars = set("0123456789-.eE/,")
         char = self.get_char_at()
         is_array = self.get_context() == "array"
-        while char and char in number_chars and (char != "," or not is_array):
-            number_str += char
-            self.index += 1
-            char = self.get_char_at()
+        if self.fast_scan:
+            pattern = _NUMBER_CHARS_IN_ARRAY if is_array else _NUMBER_CHARS
+            number_str = pattern.match(self.json_str, self.index).group()
+            self.index += len(number_str)
+        else:
+            while char and char in number_chars and (char != "," or not is_array):
+                number_str += char
+                self.index += 1
+                char = self.get_char_at()
         if len(number_str) > 1 and number_str[-1] in "-eE/,":
             # The number ends with a non valid character for a number/currency, rolling back one
             number_str = number_str[:-1]
@@ -630,6 +646,10 @@ class JSONParser:
         """
         This function quickly iterates on whitespaces, syntactic sugar to make the code more concise
         """
+        if self.fast_scan:
+            if self.index < len(self.json_str):
+                self.index = _WHITESPACES.match(self.json_str, self.index).end()
+            return
         try:
             char = self.json_str[self.index]
         except IndexError:
@@ -641,6 +661,22 @@ class JSONParser:
             except IndexError:
                 return
 
+    def skip_to_character(self, character: str, idx: int = 0) -> int:
+        """
+        Return the offset (relative to self.index, starting at idx) of the next `character`,
+        or of the end of the input when there is none
+        """
+        if self.fast_scan:
+            pos = self.json_str.find(character, self.index + idx)
+            if pos == -1:
+                return max(idx, len(self.json_str) - self.index)
+            return pos - self.index
+        next_c = self.get_char_at(idx)
+        while next_c and next_c != character:
+            idx += 1
+            next_c = self.get_char_at(idx)
+        return idx
+
     def set_context(self, value: str) -> None:
         # If a value is provided update the context variable and save in stack
         if value:
@@ -750,6 +786,206 @@ def from_file(
 
     return jsonobj
 
+# 增量解析时在顶层容器之外只查找容器的开头，在容器内查找结构字符和字符串中的引号、转义
+_CONTAINER_START = re.compile(r"[{\[]")
+_STRUCTURAL = re.compile(r'[{}\[\]",]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+JSONMember = Tuple[Union[str, int], JSONReturnType]
+
+
+class IncrementalJSONParser:
+    """按片段增量解析 JSON，顶层对象的成员、顶层数组的元素完成时立即返回
+
+    只对新到达的片段做一次结构扫描（字符串、转义和括号层级），状态在片段之间保留，
+    已经返回的成员从缓冲区中丢弃，因此可以边接收流式响应边解析，也可以分块读取
+    大文件而不必整体载入。每个完成的成员先用 json.loads 解码，失败时交给 JSONParser，
+    保留缺少引号、括号、逗号等修复规则；成员之间缺少逗号时同样可以分开。
+    close() 修复并返回最后一个未闭合的成员（例如被截断的响应）。
+
+    顶层对象的成员返回 (键, 值)，顶层数组的元素返回 (下标, 值)。顶层容器之前的
+    文字（代码块标记、说明文字）被忽略；一个顶层容器结束后可以接着解析下一个。
+
+    字符串中未转义的引号个数为奇数时，扫描到的字符串边界会整体错位，之后的成员都无法闭合。
+    提供 resync 时，成员的值中出现 resync 匹配的位置（下一个成员的开头）即认为当前成员
+    已经结束：修复并返回当前成员，从匹配结束处重新开始扫描。
+    """
+
+    def __init__(self, logging: Optional[bool] = False, resync: Optional[Pattern[str]] = None) -> None:
+        """
+        Args:
+            logging: 是否记录修复日志
+            resync: 匹配顶层成员之间分界的正则，匹配结束处为下一个成员的开头；为None时不重新同步
+        """
+        self.logging = logging
+        self.resync = resync
+        # 修复过程的日志，只有 logging 为真时记录
+        self.log: List[Dict[str, str]] = []
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        # 当前顶层容器（"{" 或 "["）、当前成员在缓冲区中的起点和数组元素的下标
+        self._kind: Optional[str] = None
+        self._start: Optional[int] = None
+        self._index = 0
+
+    def feed(self, chunk: str) -> List[JSONMember]:
+        """追加一段文本，返回其中新完成的成员"""
+        self._buffer += chunk
+        members: List[JSONMember] = []
+        buffer = self._buffer
+        pos = self._scan(buffer, self._pos, members)
+        while self._resynchronize(buffer, pos, members):
+            pos = self._scan(buffer, self._start, members)
+        # 丢弃已经解析过的文本
+        keep = pos if self._start is None else min(pos, self._start)
+        self._buffer = buffer[keep:]
+        self._pos = pos - keep
+        if self._start is not None:
+            self._start -= keep
+        return members
+
+    def _scan(self, buffer: str, pos: int, members: List[JSONMember]) -> int:
+        """从 pos 开始扫描到缓冲区末尾，完成的成员加入 members，返回扫描到的位置"""
+        while True:
+            if self._depth == 0:
+                match = _CONTAINER_START.search(buffer, pos)
+                if not match:
+                    pos = len(buffer)
+                    break
+                pos = match.end()
+                self._kind = match.group()
+                self._start = pos
+                self._index = 0
+                self._depth = 1
+                continue
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if not match:
+                    pos = len(buffer)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(buffer):
+                        # 转义字符在片段末尾，等下一段到达后再判断
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                continue
+            match = _STRUCTURAL.search(buffer, pos)
+            if not match:
+                pos = len(buffer)
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    # 成员的值（对象或数组）已经闭合，不必等到后面的逗号
+                    members.extend(self._parse_member(buffer[self._start:pos]))
+                    self._start = pos
+                elif self._depth == 0:
+                    members.extend(self._parse_member(buffer[self._start:match.start()]))
+                    self._start = None
+            elif self._depth == 1:
+                members.extend(self._parse_member(buffer[self._start:match.start()]))
+                self._start = pos
+        return pos
+
+    def _resynchronize(self, buffer: str, pos: int, members: List[JSONMember]) -> bool:
+        """
+        当前成员的值中已经扫描过下一个成员的开头时，在该处结束当前成员
+
+        Returns:
+            是否重新同步；为True时扫描状态已重置到下一个成员的开头
+        """
+        if self.resync is None or self._start is None or not (self._depth > 1 or self._in_string):
+            return False
+        # 只在当前成员的值开始之后查找，成员自己的键不算分界
+        value = _CONTAINER_START.search(buffer, self._start, pos)
+        if not value:
+            return False
+        match = self.resync.search(buffer, value.end(), pos)
+        if not match:
+            return False
+        if self.logging:
+            self.log.append({"text": "The member did not close before the next member started, "
+                                     "resynchronizing the scanner at the next member",
+                             "context": buffer[max(match.start() - 10, 0):match.end() + 10]})
+        members.extend(self._parse_member(buffer[self._start:match.start()].rstrip().rstrip(","),
+                                          closed=False))
+        self._depth = 1
+        self._in_string = False
+        self._start = match.end()
+        return True
+
+    def close(self) -> List[JSONMember]:
+        """输入结束：修复并返回未闭合的最后一个成员"""
+        members: List[JSONMember] = []
+        if self._depth > 0 and self._start is not None:
+            members = self._parse_member(self._buffer[self._start:], closed=False)
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._start = None
+        return members
+
+    def _parse_member(self, text: str, closed: bool = True) -> List[JSONMember]:
+        """
+        解析一个成员（可能因为缺少逗号而包含多个），失败时按 JSONParser 的规则修复
+
+        Args:
+            closed: 顶层容器是否在成员之后闭合；为False时不补顶层的右括号，
+                由 JSONParser 补齐缺少的括号和引号
+        """
+        if not text.strip():
+            return []
+        wrapped = self._kind + text
+        if closed:
+            wrapped += "}" if self._kind == "{" else "]"
+        try:
+            value = json.loads(wrapped)
+        except json.JSONDecodeError:
+            value = JSONParser(wrapped, None, self.logging).parse()
+            if self.logging:
+                value, log = value
+                self.log.extend(log)
+        if self._kind == "{":
+            return list(value.items()) if isinstance(value, dict) else []
+        if not isinstance(value, list):
+            value = [value]
+        members = [(self._index + i, element) for i, element in enumerate(value)]
+        self._index += len(members)
+        return members
+
+
+def iter_json_members(fd: TextIO, chunk_size: int = 1 << 16):
+    """分块读取 JSON 文件，逐个返回顶层对象的 (键, 值) 或顶层数组的 (下标, 值)，不整体载入文件"""
+    parser = IncrementalJSONParser()
+    while True:
+        chunk = fd.read(chunk_size)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def strip_llm_wrapper(response: str) -> str:
+    """去掉LLM响应开头和结尾的三引号、引号和换行符，不改动其中的内容"""
+    cleaned = response.strip('"\n ')
+    if cleaned.startswith('"""') and cleaned.endswith('"""'):
+        cleaned = cleaned[3:-3]
+    return cleaned.strip()
+
+
 def clean_llm_response(response: str) -> str:
     """清理LLM返回的JSON字符串
     
@@ -760,13 +996,12 @@ def clean_llm_response(response: str) -> str:
         清理后的JSON字符串
     """
     # 移除开头和结尾的三引号和换行符
-    cleaned = response.strip('"\n ')
-    if cleaned.startswith('"""') and cleaned.endswith('"""'):
-        cleaned = cleaned[3:-3]
+    cleaned = strip_llm_wrapper(response)
     # 移除可能的转义字符
     cleaned = cleaned.replace('\\"', '"')
     return cleaned.strip()
 
+@traced("parse_llm_response", cat="parse")
 def parse_llm_response(response: str) -> Dict:
     """解析LLM返回的JSON响应
     
@@ -805,3 +1040,127 @@ def parse_llm_response(response: str) -> Dict:
                 logger.error(error_msg)
                 logger.warning("返回空字典作为备选方案，请检查原始响应")
                 return {}
+
+
+# 批次响应中一条记录的开头："12": {
+_RECORD_START = re.compile(r'"(\d+)"\s*:\s*\{')
+_decoder = json.JSONDecoder()
+
+
+def extract_complete_records(response: str) -> Dict[str, Dict]:
+    """从损坏或被截断的批次响应中取出所有完整的 "ID": {...} 记录
+
+    每条记录单独解码，只有对象完整闭合的记录才会被保留；被截断的最后一条记录
+    和无法解码的记录被跳过，由调用方重新请求。
+
+    Args:
+        response: LLM返回的响应字符串
+
+    Returns:
+        字幕ID -> 记录，没有完整记录时返回空字典
+    """
+    records = {}
+    pos = 0
+    while True:
+        match = _RECORD_START.search(response, pos)
+        if not match:
+            break
+        try:
+            value, end = _decoder.raw_decode(response, match.end() - 1)
+        except json.JSONDecodeError:
+            pos = match.end()
+            continue
+        if isinstance(value, dict):
+            records[match.group(1)] = value
+        pos = end
+    return records
+
+
+@traced("parse_llm_records", cat="parse")
+def parse_llm_records(response: str) -> Dict:
+    """解析按字幕ID组织的批次响应 {"ID": {...}, ...}
+
+    完整的 JSON 直接解析；损坏或被截断时只取出其中完整的记录，而不是修复整个文档，
+    避免把被截断的译文当作完整结果。一条完整记录都没有时退回 parse_llm_response。
+
+    译文中正常转义的引号（\\"）保持原样；只有按原文无法解码的记录，才在把 \\" 还原为 "
+    之后再取一次（有的模型把整个响应多转义了一层）。
+    """
+    text = strip_llm_wrapper(response)
+    try:
+        result = json.loads(text)
+        if isinstance(result, dict):
+            return result
+    except json.JSONDecodeError:
+        pass
+    records = extract_complete_records(text)
+    if '\\"' in text:
+        for key, value in extract_complete_records(text.replace('\\"', '"')).items():
+            records.setdefault(key, value)
+    if records:
+        logger.info(f"响应不是完整的JSON，取出其中{len(records)}条完整记录")
+        return records
+    return parse_llm_response(response)
+
+
+# 流式响应开头这么多字符内还没有出现 "{" 时视为偏离格式
+STREAM_PREAMBLE_CHARS = 200
+# 距上一条完成的记录累计这么多字符仍没有新记录闭合时视为偏离格式
+STREAM_STALL_CHARS = 4000
+# 无法解码或不属于本批次的记录达到该数量时视为偏离格式
+STREAM_BROKEN_LIMIT = 2
+# 两条记录之间的分界："}," 或换行之后紧跟下一条记录的 "ID": {，匹配结束处为下一条记录的键
+_RECORD_BOUNDARY = re.compile(r'(?:(?<=\})\s*,|\n)\s*(?="\d+"\s*:\s*\{)')
+
+
+class StreamingRecordParser:
+    """增量解析流式返回的批次响应 {"ID": {...}, ...}
+
+    每次 feed 一段新输出，返回其中新完成的记录。记录由 IncrementalJSONParser 在闭合时
+    立即解析（按 JSONParser 的规则修复未转义的引号、缺少的逗号等），未闭合的最后一条
+    记录等待后续输出。译文中未转义的引号使扫描错位时，在下一条记录的 "ID": { 处重新同步，
+    错位的记录按 JSONParser 的规则修复后返回，之后的记录不受影响。输出明显偏离格式时 off_format 给出原因（之后的输出不再解析），
+    调用方可以据此提前中止生成。
+    """
+
+    def __init__(self, expected_ids: Optional[List[str]] = None) -> None:
+        """
+        Args:
+            expected_ids: 本批次请求的字幕ID，为None时不检查ID
+        """
+        self.text = ""
+        self.records: Dict[str, Dict] = {}
+        self.broken = 0
+        self.off_format: Optional[str] = None
+        self._expected = set(map(str, expected_ids)) if expected_ids is not None else None
+        self._parser = IncrementalJSONParser(resync=_RECORD_BOUNDARY)
+        # 最近一条记录完成时的输出长度
+        self._progress_at = 0
+
+    def feed(self, chunk: str) -> Dict[str, Dict]:
+        """追加一段输出，返回新完成的记录（字幕ID -> 记录）"""
+        self.text += chunk
+        if self.off_format:
+            return {}
+        new = {}
+        for key, value in self._parser.feed(chunk):
+            key = str(key)
+            if not isinstance(value, dict) or (self._expected is not None and key not in self._expected):
+                self.broken += 1
+                continue
+            new[key] = value
+        if new:
+            self.records.update(new)
+            self._progress_at = len(self.text)
+        self.off_format = self._check_format()
+        return new
+
+    def _check_format(self) -> Optional[str]:
+        if self.broken >= STREAM_BROKEN_LIMIT:
+            return f"{self.broken}条记录无法解析或不属于本批次"
+        if not self.records and len(self.text) > STREAM_PREAMBLE_CHARS \
+                and "{" not in self.text[:STREAM_PREAMBLE_CHARS]:
+            return f"前{STREAM_PREAMBLE_CHARS}个字符中没有JSON对象"
+        if len(self.text) - self._progress_at > STREAM_STALL_CHARS:
+            return f"连续{STREAM_STALL_CHARS}个字符没有完整的记录"
+        return None
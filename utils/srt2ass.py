@@ -80,8 +80,7 @@ def srt2ass(input_file, pos):
 
 # Style: Secondary,STSongti-SC-Black,11,&H0000FF00,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,0,0,1,2,0,2,1,1,7,1
 
-if len(sys.argv) > 1:
-    head_str = '''[Script Info]
+head_str = '''[Script Info]
 ; This is an Advanced Sub Station Alpha v4+ script.
 Title:
 ScriptType: v4.00+
@@ -97,35 +96,39 @@ Style: Secondary,宋体-简 黑体,11,&H0000FF00,&H000000FF,&H00000000,&H0000000
 Format: Layer, Start, End, Style, Actor, MarginL, MarginR, MarginV, Effect, Text'''
 
 
-    if 'zh' in sys.argv[1] and 'en' in sys.argv[2]:
-        subLines1 = srt2ass(sys.argv[1], 'Secondary')
-        subLines2 = srt2ass(sys.argv[2], 'Default')
-    elif 'en' in sys.argv[1] and 'zh' in sys.argv[2]:
-        subLines1 = srt2ass(sys.argv[2], 'Secondary')
-        subLines2 = srt2ass(sys.argv[1], 'Default')
+def merge_srt_to_ass(first_file, second_file):
+    """
+    将中英文两个srt字幕合并为一个双语ass字幕
+
+    参数:
+    first_file (str): 第一个字幕文件路径
+    second_file (str): 第二个字幕文件路径，两者中必须一个包含 'zh'，另一个包含 'en'
+
+    返回:
+    str: 生成的ass文件路径
+    """
+    if 'zh' in first_file and 'en' in second_file:
+        zh_file, en_file = first_file, second_file
+    elif 'en' in first_file and 'zh' in second_file:
+        zh_file, en_file = second_file, first_file
     else:
         raise ValueError("输入文件名必须包含 'zh' 和 'en' 字符")
-    
-    src = fileopen(sys.argv[1])
-    tmp = src[0]
+
+    subLines1 = srt2ass(zh_file, 'Secondary')
+    subLines2 = srt2ass(en_file, 'Default')
+
+    src = fileopen(zh_file)
     encoding = src[1]
-    src = ''
-    utf8bom = ''
 
-    if u'\ufeff' in tmp:
-        tmp = tmp.replace(u'\ufeff', '')
-        utf8bom = u'\ufeff'
-    
-    tmp = tmp.replace("\r", "")
-    lines = [x.strip() for x in tmp.split("\n") if x.strip()]
-    subLines = ''
-    tmpLines = ''
-    lineCount = 0
-    output_file = '.'.join(sys.argv[1].split('_zh')[:-1])
+    output_file = '.'.join(zh_file.split('_zh')[:-1])
     output_file += '.ass'
     output_str = head_str + '\n' + subLines1 + subLines2
     output_str = output_str.encode(encoding)
 
     with open(output_file, 'wb') as output:
         output.write(output_str)
-    
+    return output_file
+
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    merge_srt_to_ass(sys.argv[1], sys.argv[2])
@@ -3,21 +3,26 @@ import openai
 import ast
 
 
-def test_openai(base_url, api_key, model):
+def test_openai(base_url, api_key, model, client=None):
     """
     这是一个测试OpenAI API的函数。
     它使用指定的API设置与OpenAI的GPT模型进行对话。
 
     参数:
-    user_message (str): 用户输入的消息
+    base_url (str): API地址
+    api_key (str): API密钥
+    model (str): 模型名称
+    client (openai.OpenAI): 可选，复用已有的客户端及其连接池
 
     返回:
     bool: 是否成功
     str: 错误信息或者AI助手的回复
     """
     try:
-        # 创建OpenAI客户端并发送请求到OpenAI API
-        response = openai.OpenAI(base_url=base_url, api_key=api_key, timeout=15).chat.completions.create(
+        # 优先复用传入的客户端，否则创建OpenAI客户端，然后发送请求到OpenAI API
+        if client is None:
+            client = openai.OpenAI(base_url=base_url, api_key=api_key, timeout=15)
+        response = client.chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
@@ -0,0 +1,194 @@
+"""
+Chrome trace-event 格式的时间线记录
+
+启用后，各阶段通过 span() 记录带线程ID的完整事件（ph="X"），保存为 JSON 后
+可以直接在 Perfetto (ui.perfetto.dev) 或 chrome://tracing 中打开。
+未启用时 span() 返回空上下文，开销可以忽略。
+
+任务提交到线程池时用 queued() 包装，可以额外记录从提交到开始执行之间的排队等待。
+"""
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.logger import setup_logger
+
+logger = setup_logger("tracing")
+
+
+class Tracer:
+    """收集 trace 事件，线程安全"""
+
+    def __init__(self):
+        self._events: List[Dict[str, Any]] = []
+        self._thread_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._async_ids = itertools.count(1)
+
+    def now_us(self) -> float:
+        """相对于开始记录时刻的微秒数"""
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def add_complete(self, name: str, cat: str, start_us: float, end_us: float,
+                     args: Optional[Dict[str, Any]] = None) -> None:
+        """记录一个完整事件，归属于当前线程"""
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": start_us,
+            "dur": max(end_us - start_us, 0.0),
+            "pid": self._pid,
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+            self._thread_names.setdefault(thread.ident, thread.name)
+
+    def add_async(self, name: str, cat: str, start_us: float, end_us: float,
+                  args: Optional[Dict[str, Any]] = None) -> None:
+        """记录一个异步事件（b/e 成对），单独成轨，不与线程上的事件嵌套"""
+        event_id = next(self._async_ids)
+        begin = {"name": name, "cat": cat, "ph": "b", "id": event_id, "ts": start_us,
+                 "pid": self._pid, "tid": threading.get_ident()}
+        if args:
+            begin["args"] = args
+        end = {"name": name, "cat": cat, "ph": "e", "id": event_id, "ts": end_us,
+               "pid": self._pid, "tid": threading.get_ident()}
+        with self._lock:
+            self._events.extend((begin, end))
+
+    @contextmanager
+    def span(self, name: str, cat: str = "pipeline", **args):
+        start = self.now_us()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.add_complete(name, cat, start, self.now_us(), args)
+
+    @contextmanager
+    def async_span(self, name: str, cat: str = "pipeline", **args):
+        start = self.now_us()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.add_async(name, cat, start, self.now_us(), args)
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            events = list(self._events)
+            names = dict(self._thread_names)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+            for tid, name in names.items()
+        ]
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    def save(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, ensure_ascii=False)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable_tracing() -> Tracer:
+    """开始记录，已启用时返回现有的记录器"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def save_trace(path: str) -> None:
+    """保存已记录的事件并停止记录"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return
+    tracer.save(path)
+    logger.info(f"时间线已保存到: {path}（可在 https://ui.perfetto.dev 打开）")
+
+
+def span(name: str, cat: str = "pipeline", **args):
+    """记录一个时间段；未启用记录时不做任何事"""
+    tracer = _tracer
+    if tracer is None:
+        return nullcontext()
+    return tracer.span(name, cat, **args)
+
+
+def async_span(name: str, cat: str = "pipeline", **args):
+    """记录协程中的一个时间段；同一事件循环中并发的协程共用线程，记录为异步事件以免相互嵌套"""
+    tracer = _tracer
+    if tracer is None:
+        return nullcontext()
+    return tracer.async_span(name, cat, **args)
+
+
+def traced(name: Optional[str] = None, cat: str = "pipeline"):
+    """把整个函数调用记录为一个时间段的装饰器；用于协程函数时记录为异步事件"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                tracer = _tracer
+                if tracer is None:
+                    return await func(*args, **kwargs)
+                with tracer.async_span(span_name, cat):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name, cat):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def queued(func: Callable, name: str, cat: str = "queue") -> Callable:
+    """
+    包装提交到线程池的任务，记录从提交到开始执行的排队时间
+
+    排队时间记录为异步事件，参数中带有执行任务的线程名
+    """
+    tracer = _tracer
+    if tracer is None:
+        return func
+    submitted = tracer.now_us()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        tracer.add_async(f"queue_wait:{name}", cat, submitted, tracer.now_us(),
+                         {"worker": threading.current_thread().name})
+        return func(*args, **kwargs)
+    return wrapper